@@ -1,15 +1,39 @@
-from flask import Flask, render_template, request, jsonify, send_file, session
+from flask import Flask, render_template, request, jsonify, send_file, session, Response, stream_with_context, redirect, g
+from flask.json.provider import DefaultJSONProvider
 from flask_session import Session
 import os
+import hmac
+import threading
 import uuid
-import base64
+import codecs
 from werkzeug.utils import secure_filename
+from werkzeug.http import http_date
+from werkzeug.datastructures import Range
+from werkzeug.exceptions import HTTPException
 from config import ConfigManager
-from s3_client import S3ClientManager
+from s3_client import InvalidRangeError, InvalidCursorError, NotModifiedError, ObjectNotFoundError, DEFAULT_TRANSPORT
+from client_registry import S3ClientRegistry
+from listing_cache import ListingCache
+from metadata_index import MetadataIndex
+from folder_usage import walk_usage
+from sync import sync as sync_directory, summarize_plan
+from jobs import JobManager, JobCancelled, JobQueueFull
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_RESPONSES, HTTP_IN_FLIGHT
+from request_timing import begin_request, end_request, phase
+from profiler import SamplingProfiler, profile_filename, write_profile
+from zip_stream import stream_zip
+from object_cache import ObjectCache
+from thumbnails import (
+    ThumbnailCache, THUMBNAIL_SIZES, THUMBNAIL_EXTENSIONS, THUMBNAIL_MIMETYPES,
+    thumbnails_available, webp_supported, render_thumbnail
+)
 import tempfile
 import json
+import shutil
+import time
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import quote
 
 app = Flask(__name__)
 
@@ -18,6 +42,56 @@ app.config['SECRET_KEY'] = os.urandom(24)
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024 * 1024  # 1GB
+app.config['DOWNLOAD_CHUNK_SIZE'] = 256 * 1024  # 流式下载每次读取的块大小
+app.config['DOWNLOAD_CACHE_MAX_AGE'] = 60  # 浏览器缓存下载/预览内容的时间（秒），过期后用ETag重新验证
+app.config['UPLOAD_PART_SIZE'] = 8 * 1024 * 1024  # 流式上传分片大小
+app.config['UPLOAD_CONCURRENCY'] = 4  # 流式上传同时在途的分片数
+app.config['ZIP_READ_AHEAD'] = 4  # ZIP打包时同时预读的对象数
+app.config['DELETE_CONCURRENCY'] = 8  # 批量删除并行的 delete_objects 请求数
+app.config['COPY_CONCURRENCY'] = 16  # 复制/移动时并行的 copy_object 请求数
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') not in ('0', 'false')  # 是否开放 /metrics
+app.config['SERVER_TIMING_ENABLED'] = os.environ.get('SERVER_TIMING_ENABLED', '1') not in ('0', 'false')  # 是否输出 Server-Timing 响应头
+app.config['PROFILER_TOKEN'] = os.environ.get('PROFILER_TOKEN')  # 管理员开启单请求采样分析的口令，未设置时关闭
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')  # 采样分析结果目录
+app.config['PROFILER_INTERVAL'] = 0.005  # 采样间隔（秒）
+app.config['PROFILE_MAX_FILES'] = 200  # 最多保留的分析结果文件数
+app.config['SYNC_ROOT'] = os.environ.get('SYNC_ROOT')  # 同步接口可访问的本地根目录，未设置时关闭同步接口
+app.config['SYNC_CONCURRENCY'] = 8  # 同步时并行传输的文件数
+app.config['JOBS_DB_PATH'] = os.environ.get('JOBS_DB_PATH', 'jobs.db')  # 后台任务数据库
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 4))  # 同时运行的后台任务数
+app.config['JOB_QUEUE_LIMIT'] = int(os.environ.get('JOB_QUEUE_LIMIT', 100))  # 最多排队的后台任务数，超出时拒绝提交
+app.config['JOB_RESULT_DIR'] = os.environ.get('JOB_RESULT_DIR', 'job_results')  # 后台任务结果文件（如打包的ZIP）目录
+app.config['JOB_RETENTION'] = int(os.environ.get('JOB_RETENTION', 7 * 86400))  # 已结束任务的保留时间（秒），0 表示不清理
+app.config['PRESIGNED_URL_EXPIRES'] = 3600  # 浏览器直连模式下预签名地址有效期（秒）
+app.config['S3_MAX_POOL_CONNECTIONS'] = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', DEFAULT_TRANSPORT['max_pool_connections']))
+app.config['S3_CONNECT_TIMEOUT'] = int(os.environ.get('S3_CONNECT_TIMEOUT', DEFAULT_TRANSPORT['connect_timeout']))
+app.config['S3_READ_TIMEOUT'] = int(os.environ.get('S3_READ_TIMEOUT', DEFAULT_TRANSPORT['read_timeout']))
+app.config['S3_RETRY_MODE'] = os.environ.get('S3_RETRY_MODE', DEFAULT_TRANSPORT['retry_mode'])  # legacy/standard/adaptive
+app.config['S3_MAX_ATTEMPTS'] = int(os.environ.get('S3_MAX_ATTEMPTS', DEFAULT_TRANSPORT['max_attempts']))
+app.config['S3_CLIENT_IDLE_TIMEOUT'] = int(os.environ.get('S3_CLIENT_IDLE_TIMEOUT', 1800))  # 空闲客户端淘汰时间（秒）
+app.config['ASYNC_S3_MAX_POOL_CONNECTIONS'] = int(os.environ.get('ASYNC_S3_MAX_POOL_CONNECTIONS', 1000))  # ASGI模式下每个服务器的最大并发S3连接数
+app.config['PREVIEW_MAX_SIZE'] = 10 * 1024 * 1024  # 非流媒体文件预览上限 10MB
+app.config['PREVIEW_TEXT_BYTES'] = 64 * 1024  # 文本/CSV预览只读取开头 64KB
+app.config['LISTING_CACHE_TTL'] = int(os.environ.get('LISTING_CACHE_TTL', 30))  # 秒，0 表示关闭
+app.config['LISTING_CACHE_MAX_BYTES'] = int(os.environ.get('LISTING_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64MB
+app.config['FOLDER_USAGE_CACHE_TTL'] = int(os.environ.get('FOLDER_USAGE_CACHE_TTL', 3600))  # 文件夹大小缓存（秒），写操作会使其提前失效
+app.config['FOLDER_USAGE_WORKERS'] = 8  # 统计文件夹大小时并行列出的子前缀数
+app.config['METADATA_INDEX_PATH'] = os.environ.get('METADATA_INDEX_PATH', 'metadata_index.db')  # 元数据索引数据库
+app.config['METADATA_INDEX_REFRESH_INTERVAL'] = 30  # 写操作涉及的前缀多久后重新列出（秒）
+app.config['METADATA_INDEX_RECRAWL_INTERVAL'] = int(os.environ.get('METADATA_INDEX_RECRAWL_INTERVAL', 6 * 3600))  # 全量重新爬取间隔（秒），0 表示关闭
+app.config['THUMBNAIL_CACHE_DIR'] = os.environ.get('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+app.config['THUMBNAIL_CACHE_MAX_BYTES'] = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
+app.config['THUMBNAIL_MAX_SOURCE_SIZE'] = 30 * 1024 * 1024  # 超过此大小的原图不生成缩略图
+app.config['OBJECT_CACHE_DIR'] = os.environ.get('OBJECT_CACHE_DIR', 'object_cache')
+app.config['OBJECT_CACHE_MAX_BYTES'] = int(os.environ.get('OBJECT_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 512MB，0 表示关闭
+app.config['OBJECT_CACHE_MAX_OBJECT_SIZE'] = int(os.environ.get('OBJECT_CACHE_MAX_OBJECT_SIZE', 32 * 1024 * 1024))  # 超过此大小的对象不缓存
+app.config['OBJECT_CACHE_FRESH_FOR'] = int(os.environ.get('OBJECT_CACHE_FRESH_FOR', 30))  # 秒，超过后用ETag向S3重新验证
+
+# 单个请求允许的最大Range段数（合并后），超出则返回完整对象
+MAX_BYTE_RANGES = 16
+
+# 列表接口的输出格式：records 逐个对象的字典（默认），columnar 列式
+LISTING_FORMATS = ('records', 'columnar')
 
 # 确保上传目录存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -29,24 +103,188 @@ Session(app)
 # 初始化配置管理器
 config_manager = ConfigManager()
 
-# S3客户端缓存
-s3_clients = {}
+# 对象列表缓存（所有服务器共享同一内存预算）
+listing_cache = ListingCache(
+    ttl=app.config['LISTING_CACHE_TTL'],
+    max_bytes=app.config['LISTING_CACHE_MAX_BYTES']
+)
+
+# 文件夹大小缓存：按前缀保存子树合计，写操作经由客户端使祖先前缀失效
+usage_cache = ListingCache(
+    ttl=app.config['FOLDER_USAGE_CACHE_TTL'],
+    max_bytes=16 * 1024 * 1024
+)
+
+# 存储桶元数据索引（按需为存储桶建立，用于搜索和排序）
+metadata_index = MetadataIndex(
+    app.config['METADATA_INDEX_PATH'],
+    refresh_interval=app.config['METADATA_INDEX_REFRESH_INTERVAL'],
+    recrawl_interval=app.config['METADATA_INDEX_RECRAWL_INTERVAL']
+)
+
+# 缩略图磁盘缓存
+thumbnail_cache = ThumbnailCache(
+    app.config['THUMBNAIL_CACHE_DIR'],
+    max_bytes=app.config['THUMBNAIL_CACHE_MAX_BYTES']
+)
+
+# 热点对象的磁盘缓存（下载、预览共用），写操作经由客户端使对应对象失效
+object_cache = ObjectCache(
+    app.config['OBJECT_CACHE_DIR'],
+    max_bytes=app.config['OBJECT_CACHE_MAX_BYTES'],
+    max_object_bytes=app.config['OBJECT_CACHE_MAX_OBJECT_SIZE'],
+    fresh_for=app.config['OBJECT_CACHE_FRESH_FOR']
+)
+
+# 后台任务（任务处理函数在下方注册）
+job_manager = JobManager(
+    app.config['JOBS_DB_PATH'],
+    max_workers=app.config['JOB_WORKERS'],
+    max_queued=app.config['JOB_QUEUE_LIMIT'],
+    result_dir=app.config['JOB_RESULT_DIR'],
+    retention=app.config['JOB_RETENTION']
+)
+
+# S3客户端注册表（服务器配置中的 transport 可覆盖这里的默认连接参数）
+s3_clients = S3ClientRegistry(
+    config_manager,
+    listing_cache=listing_cache,
+    default_transport={
+        'max_pool_connections': app.config['S3_MAX_POOL_CONNECTIONS'],
+        'connect_timeout': app.config['S3_CONNECT_TIMEOUT'],
+        'read_timeout': app.config['S3_READ_TIMEOUT'],
+        'retry_mode': app.config['S3_RETRY_MODE'],
+        'max_attempts': app.config['S3_MAX_ATTEMPTS']
+    },
+    idle_timeout=app.config['S3_CLIENT_IDLE_TIMEOUT'],
+    metadata_index=metadata_index,
+    usage_cache=usage_cache,
+    object_cache=object_cache
+)
+s3_clients.prewarm_async()
 
 def get_s3_client(server_id):
     """获取S3客户端实例"""
-    if server_id not in s3_clients:
-        server_config = config_manager.get_server(server_id)
-        if not server_config:
-            raise Exception(f"服务器配置不存在: {server_id}")
-
-        s3_clients[server_id] = S3ClientManager(
-            server_config['access_key'],
-            server_config['secret_key'],
-            server_config['endpoint_url'],
-            server_config['region']
-        )
-
-    return s3_clients[server_id]
+    return s3_clients.get(server_id)
+
+def listing_payload(listing, listing_format='records'):
+    """按请求的格式输出列表结果"""
+    if listing_format == 'columnar':
+        return {'format': 'columnar', 'columns': listing.to_columns()}
+    return {'objects': listing.to_records()}
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON序列化耗时计入 Server-Timing 的 serialize"""
+
+    def dumps(self, obj, **kwargs):
+        with phase('serialize'):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def profile_requested():
+    """请求头 X-Profile 或参数 profile 等于 PROFILER_TOKEN 时对本请求采样分析"""
+    token = app.config['PROFILER_TOKEN']
+    if not token:
+        return False
+    supplied = request.headers.get('X-Profile') or request.args.get('profile') or ''
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+# 请求计时与计数（/metrics、Server-Timing、采样分析）
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+    g.request_timings = begin_request()
+    HTTP_IN_FLIGHT.inc()
+
+    if profile_requested():
+        g.profile_file = profile_filename(f"{request.method}-{request.endpoint or 'unmatched'}")
+        g.profiler = SamplingProfiler(threading.get_ident(), app.config['PROFILER_INTERVAL'])
+        g.profiler.start()
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    timings = g.get('request_timings')
+    if timings is not None and app.config['SERVER_TIMING_ENABLED']:
+        # 流式响应只统计到响应头发出为止
+        response.headers['Server-Timing'] = timings.header_value()
+    if g.get('profiler') is not None:
+        # 分析在请求结束（流式响应传输完）后写入此文件
+        response.headers['X-Profile-File'] = g.profile_file
+    return response
+
+@app.teardown_request
+def record_request_metrics(error):
+    started_at = g.pop('request_started_at', None)
+    if started_at is None:
+        return
+    end_request()
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        try:
+            write_profile(profiler, app.config['PROFILE_DIR'], g.profile_file, app.config['PROFILE_MAX_FILES'])
+        except OSError:
+            app.logger.exception('写入采样分析结果失败')
+    HTTP_IN_FLIGHT.dec()
+    # 按路由模板统计（如 /api/servers/<int:server_id>/objects），避免标签数量随参数增长
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = 500 if error else g.get('response_status', 500)
+    HTTP_REQUEST_SECONDS.observe((request.method, route), time.perf_counter() - started_at)
+    HTTP_RESPONSES.inc((request.method, route, str(status)))
+
+@REGISTRY.register_collector
+def collect_app_metrics():
+    """抓取时读取的状态：临时目录占用、磁盘剩余空间、各缓存统计、S3客户端数量、后台任务数"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    thumbnails = thumbnail_cache.stats()
+    objects = object_cache.stats()
+    caches = {
+        'listing': listing_cache.stats(),
+        'folder_usage': usage_cache.stats(),
+        'thumbnail': thumbnails,
+        'object': objects
+    }
+    return [
+        ('s3finder_temp_disk_bytes', 'gauge', '临时目录占用的字节数', [
+            ({'directory': 'uploads'}, directory_size(upload_folder)),
+            ({'directory': 'thumbnail_cache'}, thumbnails['bytes']),
+            ({'directory': 'object_cache'}, objects['bytes'])
+        ]),
+        ('s3finder_disk_free_bytes', 'gauge', '临时目录所在磁盘的剩余空间', [
+            ({'directory': 'uploads'}, shutil.disk_usage(upload_folder).free)
+        ]),
+        ('s3finder_cache_hits_total', 'counter', '缓存命中次数',
+            [({'cache': name}, stats['hits']) for name, stats in caches.items()]),
+        ('s3finder_cache_misses_total', 'counter', '缓存未命中次数',
+            [({'cache': name}, stats['misses']) for name, stats in caches.items()]),
+        ('s3finder_cache_evictions_total', 'counter', '缓存淘汰次数',
+            [({'cache': name}, stats['evictions']) for name, stats in caches.items()]),
+        ('s3finder_cache_bytes', 'gauge', '缓存占用的字节数',
+            [({'cache': name}, stats['bytes']) for name, stats in caches.items()]),
+        ('s3finder_s3_clients', 'gauge', '已创建的S3客户端数', [({}, s3_clients.stats()['clients'])]),
+        ('s3finder_jobs', 'gauge', '本进程中排队和运行的后台任务数',
+            [({'status': status}, count) for status, count in job_manager.stats().items()])
+    ]
+
+def directory_size(path):
+    """目录下所有文件的总大小"""
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                continue
+    return total
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 格式的运行指标"""
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'error': '指标接口已关闭'}), 404
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/')
 def index():
@@ -82,7 +320,8 @@ def add_server():
             data['access_key'],
             data['secret_key'],
             data['endpoint_url'],
-            data.get('region', 'us-east-1')
+            data.get('region', 'us-east-1'),
+            bool(data.get('direct_transfer', False))
         )
 
         return jsonify({'server': server})
@@ -112,7 +351,8 @@ def update_server(server_id):
             'access_key': data['access_key'],
             'secret_key': data['secret_key'],
             'endpoint_url': data['endpoint_url'],
-            'region': data.get('region', 'us-east-1')
+            'region': data.get('region', 'us-east-1'),
+            'direct_transfer': bool(data.get('direct_transfer', False))
         }
 
         success = config_manager.update_server(server_id, **update_data)
@@ -120,8 +360,7 @@ def update_server(server_id):
             return jsonify({'error': '更新服务器配置失败'}), 500
 
         # 清理客户端缓存以重新连接
-        if server_id in s3_clients:
-            del s3_clients[server_id]
+        s3_clients.invalidate(server_id)
 
         # 返回更新后的配置
         updated_server = config_manager.get_server(server_id)
@@ -139,8 +378,7 @@ def delete_server(server_id):
             return jsonify({'error': '服务器不存在'}), 404
 
         # 清理客户端缓存
-        if server_id in s3_clients:
-            del s3_clients[server_id]
+        s3_clients.invalidate(server_id)
 
         return jsonify({'success': True})
     except Exception as e:
@@ -158,29 +396,61 @@ def list_buckets(server_id):
 
 @app.route('/api/servers/<int:server_id>/objects', methods=['GET'])
 def list_objects(server_id):
-    """列出S3对象"""
+    """列出S3对象
+
+    默认使用游标分页：每页只发起一次S3请求，返回不透明的 next_cursor。
+    传入 page 参数时使用旧的页码模式（全量列出后切片，仅适合小目录）。
+    format=columnar 时以列式返回原始大小和修改时间，由前端格式化。
+    """
     try:
         bucket = request.args.get('bucket')
         prefix = request.args.get('prefix', '')
-        page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 100))
+        use_cache = request.args.get('refresh') not in ('1', 'true')
+        listing_format = request.args.get('format', 'records')
 
         if not bucket:
             return jsonify({'error': '缺少存储桶名称'}), 400
 
+        if listing_format not in LISTING_FORMATS:
+            return jsonify({'error': 'format 必须是 records 或 columnar'}), 400
+
+        if per_page < 1 or per_page > 1000:
+            return jsonify({'error': 'per_page 必须在 1 到 1000 之间'}), 400
+
         client = get_s3_client(server_id)
-        objects = client.list_objects(bucket, prefix)
+
+        if 'page' not in request.args:
+            cursor = request.args.get('cursor') or None
+            start_after = request.args.get('start_after') or None
+            listing, next_cursor = client.list_objects_page(
+                bucket, prefix, max_keys=per_page, cursor=cursor,
+                start_after=start_after, use_cache=use_cache
+            )
+
+            return jsonify(dict(listing_payload(listing, listing_format), **{
+                'pagination': {
+                    'mode': 'cursor',
+                    'per_page': per_page,
+                    'cursor': cursor,
+                    'next_cursor': next_cursor,
+                    'has_next': next_cursor is not None
+                }
+            }))
+
+        page = int(request.args.get('page', 1))
+        listing = client.list_objects(bucket, prefix, use_cache=use_cache)
 
         # 实现简单的分页
-        total_objects = len(objects)
+        total_objects = len(listing)
         total_pages = (total_objects + per_page - 1) // per_page
         start_index = (page - 1) * per_page
         end_index = start_index + per_page
-        paginated_objects = objects[start_index:end_index]
+        paginated_listing = listing.slice(start_index, end_index)
 
-        return jsonify({
-            'objects': paginated_objects,
+        return jsonify(dict(listing_payload(paginated_listing, listing_format), **{
             'pagination': {
+                'mode': 'page',
                 'page': page,
                 'per_page': per_page,
                 'total': total_objects,
@@ -188,10 +458,202 @@ def list_objects(server_id):
                 'has_next': page < total_pages,
                 'has_prev': page > 1
             }
+        }))
+    except InvalidCursorError:
+        return jsonify({'error': '无效的分页游标'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/clients', methods=['GET'])
+def get_client_stats():
+    """获取S3客户端及连接池使用情况"""
+    try:
+        return jsonify(s3_clients.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/listing-cache', methods=['GET'])
+def get_listing_cache_stats():
+    """获取对象列表缓存统计"""
+    try:
+        return jsonify(listing_cache.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/listing-cache', methods=['DELETE'])
+def clear_listing_cache():
+    """清空对象列表缓存"""
+    try:
+        listing_cache.clear()
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/object-cache', methods=['GET'])
+def get_object_cache_stats():
+    """获取对象缓存统计信息"""
+    try:
+        return jsonify(object_cache.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/object-cache', methods=['DELETE'])
+def clear_object_cache():
+    """清空对象缓存"""
+    try:
+        removed = object_cache.clear()
+        return jsonify({'success': True, 'removed': removed})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/index', methods=['GET'])
+def get_index_status(server_id):
+    """获取存储桶元数据索引状态"""
+    try:
+        bucket = request.args.get('bucket')
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        client = get_s3_client(server_id)
+        status = metadata_index.status(client.cache_scope, bucket)
+        return jsonify({'indexed': status is not None, 'index': status})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/index', methods=['POST'])
+def build_index(server_id):
+    """为存储桶建立（或重建）元数据索引，在后台全量爬取"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        client = get_s3_client(server_id)
+        status = metadata_index.start_crawl(client, bucket)
+        return jsonify({'indexed': True, 'index': status}), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/index', methods=['DELETE'])
+def drop_index(server_id):
+    """删除存储桶的元数据索引"""
+    try:
+        bucket = request.args.get('bucket')
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        client = get_s3_client(server_id)
+        metadata_index.drop(client.cache_scope, bucket)
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/search', methods=['GET'])
+def search_objects(server_id):
+    """在存储桶元数据索引中搜索、排序和筛选对象
+
+    q 为文件路径子串，glob 为通配符（如 *.log），ext 为扩展名，prefix 限定范围；
+    sort 可选 key/size/last_modified，order 可选 asc/desc。
+    """
+    try:
+        bucket = request.args.get('bucket')
+        limit = int(request.args.get('limit', 100))
+        offset = int(request.args.get('offset', 0))
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        if limit < 1 or limit > 1000 or offset < 0:
+            return jsonify({'error': 'limit 必须在 1 到 1000 之间'}), 400
+
+        client = get_s3_client(server_id)
+        status = metadata_index.status(client.cache_scope, bucket)
+        if status is None:
+            return jsonify({'error': '存储桶尚未建立索引', 'indexed': False}), 409
+        metadata_index.attach(client, bucket)
+
+        rows, has_more = metadata_index.search(
+            client.cache_scope,
+            bucket,
+            query=request.args.get('q') or None,
+            glob=request.args.get('glob') or None,
+            ext=request.args.get('ext') or None,
+            prefix=request.args.get('prefix') or None,
+            sort=request.args.get('sort', 'key'),
+            order=request.args.get('order', 'asc'),
+            limit=limit,
+            offset=offset
+        )
+
+        objects = [
+            {
+                'name': row['key'].split('/')[-1],
+                'key': row['key'],
+                'size': client._format_size(row['size']),
+                'size_bytes': row['size'],
+                'last_modified': row['last_modified'],
+                'etag': row['etag'],
+                'storage_class': row['storage_class'],
+                'type': 'file'
+            }
+            for row in rows
+        ]
+
+        return jsonify({
+            'objects': objects,
+            'index': status,
+            'pagination': {
+                'limit': limit,
+                'offset': offset,
+                'has_next': has_more,
+                'next_offset': offset + limit if has_more else None
+            }
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/servers/<int:server_id>/usage', methods=['GET'])
+def get_folder_usage(server_id):
+    """统计文件夹（前缀）下所有对象的总大小和数量
+
+    以 NDJSON 流式返回：统计过程中每隔约0.5秒输出一行 progress（已统计的部分合计），
+    最后输出一行 result（总计及各直接子文件夹的合计）。refresh=1 忽略缓存重新统计。
+    """
+    try:
+        bucket = request.args.get('bucket')
+        prefix = request.args.get('prefix', '')
+        use_cache = request.args.get('refresh') not in ('1', 'true')
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        client = get_s3_client(server_id)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        try:
+            for event in walk_usage(
+                client, bucket, prefix,
+                usage_cache=usage_cache,
+                use_cache=use_cache,
+                max_workers=app.config['FOLDER_USAGE_WORKERS']
+            ):
+                if event['type'] == 'result':
+                    event['size'] = client._format_size(event['bytes'])
+                    for child in event['children']:
+                        child['size'] = client._format_size(child['bytes'])
+                yield json.dumps(event, ensure_ascii=False) + '\n'
+        except Exception as e:
+            yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/servers/<int:server_id>/buckets/<bucket_name>/cdn', methods=['GET'])
 def get_bucket_cdn_config(server_id, bucket_name):
     """获取指定桶的CDN配置"""
@@ -239,7 +701,7 @@ def get_server_bucket_cdn_configs(server_id):
 
 @app.route('/api/servers/<int:server_id>/upload', methods=['POST'])
 def upload_file(server_id):
-    """上传文件到S3"""
+    """上传文件到S3；表单字段 background 为真时先保存到服务器，再由后台任务上传"""
     try:
         bucket = request.form.get('bucket')
         prefix = request.form.get('prefix', '')
@@ -258,15 +720,36 @@ def upload_file(server_id):
         filename = secure_filename(file.filename)
         object_name = prefix + filename if prefix else filename
 
+        if request.form.get('background') in ('1', 'true'):
+            # 保存到上传目录后由后台任务上传，任务进度为已上传到S3的字节数
+            upload_name = f"{uuid.uuid4()}_{filename}"
+            upload_path = os.path.join(app.config['UPLOAD_FOLDER'], upload_name)
+            with phase('disk'):
+                file.save(upload_path)
+            response = None
+            try:
+                response = submit_job(server_id, 'upload', {
+                    'bucket': bucket,
+                    'key': object_name,
+                    'upload_name': upload_name
+                })
+            finally:
+                # 任务未提交成功时由这里清理，否则由任务清理
+                if response is None or response[1] != 202:
+                    os.remove(upload_path)
+            return response
+
         # 保存临时文件
         temp_dir = tempfile.gettempdir()
         temp_path = os.path.join(temp_dir, f"{uuid.uuid4()}_{filename}")
-        file.save(temp_path)
+        with phase('disk'):
+            file.save(temp_path)
 
         try:
-            # 上传到S3
+            # 上传到S3（在传输线程中进行，整体计入S3耗时）
             client = get_s3_client(server_id)
-            success = client.upload_file(bucket, temp_path, object_name)
+            with phase('s3'):
+                success = client.upload_file(bucket, temp_path, object_name)
 
             if success:
                 return jsonify({'success': True, 'object_name': object_name})
@@ -281,9 +764,232 @@ def upload_file(server_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/servers/<int:server_id>/upload-stream', methods=['PUT'])
+def upload_file_stream(server_id):
+    """流式上传文件到S3
+
+    请求体即文件内容，边接收边以分片上传写入S3，不落本地磁盘。
+    """
+    try:
+        bucket = request.args.get('bucket')
+        prefix = request.args.get('prefix', '')
+        filename = request.args.get('filename', '')
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        if not filename:
+            return jsonify({'error': '文件名为空'}), 400
+
+        # 安全处理文件名
+        filename = secure_filename(filename)
+        object_name = prefix + filename if prefix else filename
+
+        client = get_s3_client(server_id)
+        size = client.upload_stream(
+            bucket,
+            object_name,
+            request.stream,
+            part_size=app.config['UPLOAD_PART_SIZE'],
+            max_concurrency=app.config['UPLOAD_CONCURRENCY']
+        )
+
+        return jsonify({'success': True, 'object_name': object_name, 'size': size})
+
+    except HTTPException:
+        # 超出 MAX_CONTENT_LENGTH 等错误交给对应的错误处理器
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart', methods=['GET'])
+def list_multipart_uploads(server_id):
+    """列出未完成的分片上传"""
+    try:
+        bucket = request.args.get('bucket')
+        prefix = request.args.get('prefix', '')
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        client = get_s3_client(server_id)
+        uploads = client.list_multipart_uploads(bucket, prefix)
+        return jsonify({'uploads': uploads})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart', methods=['POST'])
+def create_multipart_upload(server_id):
+    """创建分片上传"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        prefix = data.get('prefix', '')
+        filename = data.get('filename', '')
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        if not filename:
+            return jsonify({'error': '文件名为空'}), 400
+
+        # 安全处理文件名
+        filename = secure_filename(filename)
+        object_name = prefix + filename if prefix else filename
+
+        client = get_s3_client(server_id)
+        upload_id = client.create_multipart_upload(bucket, object_name)
+        return jsonify({'upload_id': upload_id, 'key': object_name})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart', methods=['DELETE'])
+def abort_multipart_upload(server_id):
+    """中止分片上传"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        key = data.get('key')
+        upload_id = data.get('upload_id')
+
+        if not bucket or not key or not upload_id:
+            return jsonify({'error': '缺少存储桶名称、对象键或上传ID'}), 400
+
+        client = get_s3_client(server_id)
+        client.abort_multipart_upload(bucket, key, upload_id)
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart/parts', methods=['GET'])
+def list_multipart_parts(server_id):
+    """列出S3已收到的分片，用于断点续传"""
+    try:
+        bucket = request.args.get('bucket')
+        key = request.args.get('key')
+        upload_id = request.args.get('upload_id')
+
+        if not bucket or not key or not upload_id:
+            return jsonify({'error': '缺少存储桶名称、对象键或上传ID'}), 400
+
+        client = get_s3_client(server_id)
+        parts = client.list_parts(bucket, key, upload_id)
+        return jsonify({'parts': parts})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart/parts', methods=['PUT'])
+def upload_multipart_part(server_id):
+    """上传单个分片，请求体即分片内容"""
+    try:
+        bucket = request.args.get('bucket')
+        key = request.args.get('key')
+        upload_id = request.args.get('upload_id')
+        part_number = int(request.args.get('part_number', 0))
+
+        if not bucket or not key or not upload_id:
+            return jsonify({'error': '缺少存储桶名称、对象键或上传ID'}), 400
+
+        client = get_s3_client(server_id)
+        etag = client.upload_part(bucket, key, upload_id, part_number, request.get_data(cache=False))
+        return jsonify({'part_number': part_number, 'etag': etag})
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart/complete', methods=['POST'])
+def complete_multipart_upload(server_id):
+    """完成分片上传"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        key = data.get('key')
+        upload_id = data.get('upload_id')
+        parts = data.get('parts')
+
+        if not bucket or not key or not upload_id:
+            return jsonify({'error': '缺少存储桶名称、对象键或上传ID'}), 400
+
+        client = get_s3_client(server_id)
+        client.complete_multipart_upload(bucket, key, upload_id, parts)
+        return jsonify({'success': True, 'object_name': key})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/presign/download', methods=['GET'])
+def presign_download(server_id):
+    """获取预签名下载地址（需启用浏览器直连）"""
+    try:
+        bucket = request.args.get('bucket')
+        key = request.args.get('key')
+        disposition = request.args.get('disposition', 'attachment')
+
+        if not bucket or not key:
+            return jsonify({'error': '缺少存储桶名称或对象键'}), 400
+
+        url = generate_presigned_download_url(server_id, bucket, key, disposition)
+        if not url:
+            return jsonify({'error': '该服务器未启用浏览器直连'}), 400
+
+        return jsonify({'url': url, 'expires_in': app.config['PRESIGNED_URL_EXPIRES']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/presign/upload', methods=['POST'])
+def presign_upload(server_id):
+    """获取预签名上传地址（需启用浏览器直连）"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        prefix = data.get('prefix', '')
+        filename = data.get('filename', '')
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        if not filename:
+            return jsonify({'error': '文件名为空'}), 400
+
+        if not is_direct_transfer(server_id):
+            return jsonify({'error': '该服务器未启用浏览器直连'}), 400
+
+        # 安全处理文件名
+        filename = secure_filename(filename)
+        object_name = prefix + filename if prefix else filename
+
+        client = get_s3_client(server_id)
+        url = client.generate_presigned_upload_url(bucket, object_name, app.config['PRESIGNED_URL_EXPIRES'])
+        return jsonify({'url': url, 'key': object_name, 'expires_in': app.config['PRESIGNED_URL_EXPIRES']})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/multipart/presign', methods=['GET'])
+def presign_multipart_part(server_id):
+    """获取分片的预签名上传地址（需启用浏览器直连）"""
+    try:
+        bucket = request.args.get('bucket')
+        key = request.args.get('key')
+        upload_id = request.args.get('upload_id')
+        part_number = int(request.args.get('part_number', 0))
+
+        if not bucket or not key or not upload_id:
+            return jsonify({'error': '缺少存储桶名称、对象键或上传ID'}), 400
+
+        if not is_direct_transfer(server_id):
+            return jsonify({'error': '该服务器未启用浏览器直连'}), 400
+
+        client = get_s3_client(server_id)
+        url = client.generate_presigned_part_url(
+            bucket, key, upload_id, part_number, app.config['PRESIGNED_URL_EXPIRES']
+        )
+        return jsonify({'url': url, 'part_number': part_number})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/servers/<int:server_id>/download', methods=['GET'])
 def download_file(server_id):
-    """从S3下载文件"""
+    """从S3下载文件（流式转发，支持Range请求以便媒体拖动和断点续传）"""
     try:
         bucket = request.args.get('bucket')
         key = request.args.get('key')
@@ -292,44 +998,356 @@ def download_file(server_id):
             return jsonify({'error': '缺少存储桶名称或对象键'}), 400
 
         client = get_s3_client(server_id)
-
-        # 创建临时文件
-        temp_dir = tempfile.gettempdir()
         filename = key.split('/')[-1]
-        temp_path = os.path.join(temp_dir, f"{uuid.uuid4()}_{filename}")
 
-        try:
-            # 下载文件
-            success = client.download_file(bucket, key, temp_path)
-
-            if success and os.path.exists(temp_path):
-                return send_file(
-                    temp_path,
-                    as_attachment=True,
-                    download_name=filename
-                )
+        # 支持 response-content-disposition=inline 以便浏览器内嵌播放/预览
+        disposition = request.args.get('response-content-disposition', '').split(';')[0].strip().lower()
+        if disposition != 'inline':
+            disposition = 'attachment'
+
+        # 浏览器直连模式：重定向到预签名地址，数据不经过本服务；proxy=1 强制走代理
+        if request.args.get('proxy') != '1':
+            presigned_url = generate_presigned_download_url(server_id, bucket, key, disposition)
+            if presigned_url:
+                return redirect(presigned_url)
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': build_content_disposition(disposition, filename)
+        }
+
+        byte_range = request.range if request.range and request.range.units == 'bytes' else None
+
+        # 已缓存的对象直接从本地磁盘返回（多段范围仍按下面的方式处理）
+        if not (byte_range and len(byte_range.ranges) > 1):
+            entry = cached_object(client, bucket, key)
+            if entry is not None:
+                return cached_object_response(entry, byte_range, headers, filename)
+
+        # If-Range 与当前对象不匹配时忽略Range，返回完整对象
+        if byte_range and request.headers.get('If-Range'):
+            head = client.head_object(bucket, key)
+            if not if_range_matches(request.if_range, head):
+                byte_range = None
+
+        # 多段范围：先取对象大小，再逐段请求S3并拼成 multipart/byteranges
+        if byte_range and len(byte_range.ranges) > 1:
+            head = client.head_object(bucket, key)
+            size = head['ContentLength']
+            ranges = resolve_byte_ranges(byte_range.ranges, size)
+            if not ranges:
+                return range_not_satisfiable(size)
+            if len(ranges) > MAX_BYTE_RANGES:
+                byte_range = None
+            elif len(ranges) == 1:
+                byte_range = Range('bytes', ranges)
             else:
-                return jsonify({'error': '下载失败'}), 500
+                content_type = resolve_content_type(head.get('ContentType'), filename)
+                return multipart_range_response(client, bucket, key, ranges, size, content_type, headers)
 
-        finally:
-            # 清理临时文件（延迟清理，确保文件传输完成）
-            import threading
-            def cleanup():
-                import time
-                time.sleep(5)  # 等待5秒后清理
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+        # 条件请求交给S3判断，对象未变化时不传输内容
+        try:
+            s3_response = client.get_object(
+                bucket,
+                key,
+                byte_range.to_header() if byte_range else None,
+                if_none_match=request.headers.get('If-None-Match'),
+                if_modified_since=request.if_modified_since
+            )
+        except InvalidRangeError:
+            head = client.head_object(bucket, key)
+            return range_not_satisfiable(head['ContentLength'])
+        except NotModifiedError as e:
+            return not_modified(e.etag)
+
+        body = s3_response['Body']
+        content_type = resolve_content_type(s3_response.get('ContentType'), filename)
+
+        # 部分S3兼容服务会忽略Range并返回完整对象，此时按200处理
+        status = 200
+        if byte_range and s3_response.get('ContentRange'):
+            status = 206
+            headers['Content-Range'] = s3_response['ContentRange']
+
+        if s3_response.get('ContentLength') is not None:
+            headers['Content-Length'] = str(s3_response['ContentLength'])
+        if s3_response.get('ETag'):
+            headers['ETag'] = s3_response['ETag']
+        if s3_response.get('LastModified'):
+            headers['Last-Modified'] = http_date(s3_response['LastModified'])
+        headers['Cache-Control'] = download_cache_control()
+
+        # 完整对象边转发边写入缓存，传输中断时放弃
+        chunks = iter_s3_body(body, app.config['DOWNLOAD_CHUNK_SIZE'])
+        if status == 200:
+            chunks = object_cache.tee(client.cache_scope, bucket, key, s3_response, chunks)
+
+        response = Response(
+            stream_with_context(chunks),
+            status=status,
+            headers=headers,
+            content_type=content_type,
+            direct_passthrough=True
+        )
+        # 响应体没有被读取时（如HEAD请求）生成器不会运行，由这里释放S3连接
+        response.call_on_close(body.close)
+        return response
+
+    except ObjectNotFoundError:
+        return jsonify({'error': '文件不存在'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def cached_object(client, bucket, key):
+    """从对象缓存中打开对象，返回的对象需由调用方关闭；未缓存时返回None
 
-            cleanup_thread = threading.Thread(target=cleanup)
-            cleanup_thread.daemon = True
-            cleanup_thread.start()
+    超过新鲜期的对象用 If-None-Match 向S3重新验证：未变化时继续使用，已变化时读取新内容重新缓存，
+    已被删除时移出缓存并抛出 ObjectNotFoundError。
+    """
+    entry = object_cache.get(client.cache_scope, bucket, key)
+    if entry is None or object_cache.is_fresh(entry):
+        return entry
+
+    try:
+        s3_response = client.get_object(bucket, key, if_none_match=entry.etag)
+    except NotModifiedError:
+        object_cache.mark_validated(entry)
+        return entry
+    except Exception:
+        # 对象可能已被其他客户端删除
+        entry.close()
+        object_cache.invalidate_key(client.cache_scope, bucket, key)
+        raise
+    entry.close()
+    return fill_object_cache(client, bucket, key, s3_response)
+
+def fill_object_cache(client, bucket, key, s3_response):
+    """读取 get_object 的完整响应写入缓存，返回打开的缓存对象；对象过大不能缓存时返回None"""
+    body = s3_response['Body']
+    try:
+        writer = object_cache.writer(client.cache_scope, bucket, key, s3_response)
+        if writer is None:
+            object_cache.invalidate_key(client.cache_scope, bucket, key)
+            return None
+        try:
+            with phase('s3'):
+                for chunk in body.iter_chunks(app.config['DOWNLOAD_CHUNK_SIZE']):
+                    writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+    finally:
+        body.close()
+
+def cached_object_response(entry, byte_range, headers, filename):
+    """用缓存的对象响应下载请求，条件请求和单段Range都在本地判断，不访问S3"""
+    head = entry.head()
+    headers = dict(headers)
+    headers['Cache-Control'] = download_cache_control()
+    if entry.etag:
+        headers['ETag'] = entry.etag
+    if head['LastModified']:
+        headers['Last-Modified'] = http_date(head['LastModified'])
+
+    # 与S3的判断一致：有 If-None-Match 时忽略 If-Modified-Since
+    if request.if_none_match:
+        if entry.etag and request.if_none_match.contains_weak(entry.etag.strip('"')):
+            entry.close()
+            return not_modified(entry.etag)
+    elif request.if_modified_since and head['LastModified']:
+        if head['LastModified'].replace(microsecond=0) <= request.if_modified_since:
+            entry.close()
+            return not_modified(entry.etag)
+
+    if byte_range and request.headers.get('If-Range') and not if_range_matches(request.if_range, head):
+        byte_range = None
+
+    status = 200
+    start, length = 0, entry.size
+    if byte_range:
+        ranges = resolve_byte_ranges(byte_range.ranges, entry.size)
+        if not ranges:
+            entry.close()
+            return range_not_satisfiable(entry.size)
+        start, end = ranges[0]
+        length = end - start
+        status = 206
+        headers['Content-Range'] = f"bytes {start}-{end - 1}/{entry.size}"
+    headers['Content-Length'] = str(length)
+
+    return Response(
+        iter_cached_object(entry, start, length, app.config['DOWNLOAD_CHUNK_SIZE']),
+        status=status,
+        headers=headers,
+        content_type=resolve_content_type(entry.content_type, filename),
+        direct_passthrough=True
+    )
+
+def iter_cached_object(entry, start, length, chunk_size):
+    """按块读取缓存对象的 [start, start+length) 部分，结束或客户端断开时关闭文件"""
+    try:
+        entry.file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = entry.file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        entry.close()
+
+def resolve_content_type(s3_content_type, filename):
+    """优先使用S3记录的类型，未设置时按扩展名推断"""
+    if not s3_content_type or s3_content_type in ('binary/octet-stream', 'application/octet-stream'):
+        return get_content_type(os.path.splitext(filename)[1].lower())
+    return s3_content_type
+
+def if_range_matches(if_range, head):
+    """判断If-Range条件是否与当前对象一致"""
+    if if_range.etag:
+        return head.get('ETag', '').strip('"') == if_range.etag
+    if if_range.date and head.get('LastModified'):
+        return head['LastModified'].replace(microsecond=0) == if_range.date.replace(microsecond=0)
+    return False
+
+def resolve_byte_ranges(ranges, size):
+    """将Range头中的各段换算为 [start, end) 绝对范围，丢弃无法满足的段并合并重叠段"""
+    resolved = []
+    for begin, end in ranges:
+        if begin < 0:
+            # 后缀范围：最后 N 个字节
+            begin, end = max(size + begin, 0), size
+        else:
+            end = size if end is None else min(end, size)
+        if begin < end:
+            resolved.append([begin, end])
+
+    merged = []
+    for begin, end in sorted(resolved):
+        if merged and begin <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([begin, end])
+    return [tuple(r) for r in merged]
+
+def download_cache_control():
+    """下载/预览内容的Cache-Control：只允许浏览器缓存，过期后按ETag重新验证"""
+    return f"private, max-age={app.config['DOWNLOAD_CACHE_MAX_AGE']}"
+
+def not_modified(etag=None):
+    """返回304响应"""
+    response = Response(status=304)
+    if etag:
+        response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = download_cache_control()
+    return response
+
+def range_not_satisfiable(size):
+    """返回416响应"""
+    response = jsonify({'error': '请求范围无效'})
+    response.status_code = 416
+    response.headers['Content-Range'] = f"bytes */{size}"
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+def multipart_range_response(client, bucket, key, ranges, size, content_type, headers):
+    """以 multipart/byteranges 返回多段范围，每段单独发起一次S3范围请求"""
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {begin}-{end - 1}/{size}\r\n\r\n"
+        ).encode('utf-8')
+        for begin, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode('utf-8')
+    content_length = sum(len(h) for h in part_headers) + sum(end - begin for begin, end in ranges) + len(closing)
+
+    def generate():
+        for part_header, (begin, end) in zip(part_headers, ranges):
+            yield part_header
+            s3_response = client.get_object(bucket, key, f"bytes={begin}-{end - 1}")
+            yield from iter_s3_body(s3_response['Body'], app.config['DOWNLOAD_CHUNK_SIZE'])
+        yield closing
+
+    headers = dict(headers, **{'Content-Length': str(content_length)})
+    return Response(
+        stream_with_context(generate()),
+        status=206,
+        headers=headers,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+        direct_passthrough=True
+    )
+
+@app.route('/api/servers/<int:server_id>/zip', methods=['POST'])
+def download_zip(server_id):
+    """将多个文件和/或文件夹流式打包为ZIP下载
+
+    参数可以是JSON请求体，也可以是表单字段 payload（JSON字符串，便于浏览器直接下载）：
+    bucket、keys（以/结尾的视为文件夹）、base_prefix（归档内路径相对于该前缀）、name、compress，
+    background 为真时作为后台任务打包。
+    """
+    try:
+        data = request.get_json(silent=True) or json.loads(request.form.get('payload') or '{}')
+        bucket = data.get('bucket')
+        keys = data.get('keys', [])
+        base_prefix = data.get('base_prefix', '')
+        archive_name = data.get('name') or 'download.zip'
+
+        if not bucket or not keys:
+            return jsonify({'error': '缺少存储桶名称或对象键'}), 400
+
+        if not archive_name.endswith('.zip'):
+            archive_name += '.zip'
+
+        if data.get('background'):
+            # 打包到服务器上的文件，完成后通过 /api/jobs/<id>/result 下载
+            return submit_job(server_id, 'zip', dict(data, name=archive_name))
+
+        client = get_s3_client(server_id)
+        archive = stream_zip(
+            client,
+            bucket,
+            zip_entries(client, bucket, keys, base_prefix),
+            chunk_size=app.config['DOWNLOAD_CHUNK_SIZE'],
+            read_ahead=app.config['ZIP_READ_AHEAD'],
+            compress=bool(data.get('compress', False))
+        )
+
+        return Response(
+            stream_with_context(archive),
+            status=200,
+            headers={'Content-Disposition': build_content_disposition('attachment', archive_name)},
+            content_type='application/zip',
+            direct_passthrough=True
+        )
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def zip_entries(client, bucket, keys, base_prefix):
+    """展开文件夹，产生 (对象键, ZIP中的路径)"""
+    for key in keys:
+        if key.endswith('/'):
+            for obj in client.iter_objects(bucket, key):
+                # 跳过文件夹占位对象
+                if not obj['Key'].endswith('/'):
+                    yield obj['Key'], zip_arcname(obj['Key'], base_prefix)
+        else:
+            yield key, zip_arcname(key, base_prefix)
+
+def zip_arcname(key, base_prefix):
+    """计算对象在ZIP中的路径"""
+    if base_prefix and key.startswith(base_prefix):
+        return key[len(base_prefix):]
+    return key
+
 @app.route('/api/servers/<int:server_id>/delete', methods=['DELETE'])
 def delete_objects(server_id):
-    """删除S3对象"""
+    """删除S3对象（文件按批并行删除，文件夹边列出边删除）；background 为真时作为后台任务执行"""
     try:
         data = request.get_json()
         bucket = data.get('bucket')
@@ -338,24 +1356,246 @@ def delete_objects(server_id):
         if not bucket or not keys:
             return jsonify({'error': '缺少存储桶名称或对象键'}), 400
 
+        if data.get('background'):
+            return submit_job(server_id, 'delete', data)
+
         client = get_s3_client(server_id)
-        errors = []
+        deleted, errors = delete_items(client, bucket, keys)
 
-        for key in keys:
-            try:
-                if key.endswith('/'):
-                    # 删除文件夹
-                    client.delete_folder(bucket, key)
-                else:
-                    # 删除文件
-                    client.delete_object(bucket, key)
-            except Exception as e:
-                errors.append(f"删除 {key} 失败: {str(e)}")
+        if errors:
+            # 错误可能多达数十万条，只返回前100条
+            return jsonify({
+                'error': '; '.join(errors[:100]),
+                'error_count': len(errors),
+                'deleted': deleted
+            }), 500
+        else:
+            return jsonify({'success': True, 'deleted': deleted})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def delete_items(client, bucket, keys, progress=None):
+    """删除文件和文件夹（以/结尾），返回 (删除数量, 错误信息列表)
+
+    progress(deleted, error_count) 在每批删除完成后以累计数量调用。
+    """
+    max_workers = app.config['DELETE_CONCURRENCY']
+    errors = []
+    deleted = 0
+
+    def report(step):
+        if progress:
+            progress(deleted + step['deleted'], len(errors) + len(step['errors']))
+
+    # 普通文件合并为批量删除
+    file_keys = [key for key in keys if not key.endswith('/')]
+    if file_keys:
+        try:
+            result = client.delete_keys(bucket, file_keys, max_workers, report)
+            deleted += result['deleted']
+            errors.extend(f"删除 {e['key']} 失败: {e['code']} {e['message']}".rstrip() for e in result['errors'])
+        except JobCancelled:
+            raise
+        except Exception as e:
+            errors.append(f"删除文件失败: {str(e)}")
+
+    for key in keys:
+        if not key.endswith('/'):
+            continue
+        try:
+            # 删除文件夹
+            result = client.delete_folder(bucket, key, max_workers, report)
+            deleted += result['deleted']
+            errors.extend(f"删除 {e['key']} 失败: {e['code']} {e['message']}".rstrip() for e in result['errors'])
+        except JobCancelled:
+            raise
+        except Exception as e:
+            errors.append(f"删除 {key} 失败: {str(e)}")
+
+    return deleted, errors
+
+@app.route('/api/servers/<int:server_id>/copy', methods=['POST'])
+def copy_objects(server_id):
+    """在服务端复制文件/文件夹到目标文件夹（可跨存储桶），同名对象会被覆盖"""
+    return transfer_objects(server_id, move=False)
+
+@app.route('/api/servers/<int:server_id>/move', methods=['POST'])
+def move_objects(server_id):
+    """在服务端移动文件/文件夹到目标文件夹：复制成功后再批量删除源对象"""
+    return transfer_objects(server_id, move=True)
+
+def transfer_objects(server_id, move):
+    """复制或移动 keys 到 dest_bucket（默认同一存储桶）的 dest_prefix 下；background 为真时作为后台任务执行"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        keys = data.get('keys', [])
+
+        if not bucket or not keys:
+            return jsonify({'error': '缺少存储桶名称或对象键'}), 400
+
+        if data.get('background'):
+            return submit_job(server_id, 'move' if move else 'copy', data)
+
+        client = get_s3_client(server_id)
+        copied, errors = transfer_items(
+            client, bucket, keys, data.get('dest_bucket') or bucket, data.get('dest_prefix', ''), move
+        )
 
         if errors:
-            return jsonify({'error': '; '.join(errors)}), 500
+            # 错误可能多达数十万条，只返回前100条
+            return jsonify({
+                'error': '; '.join(errors[:100]),
+                'error_count': len(errors),
+                'copied': copied
+            }), 500
         else:
-            return jsonify({'success': True})
+            return jsonify({'success': True, 'copied': copied})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def transfer_items(client, bucket, keys, dest_bucket, dest_prefix, move, progress=None):
+    """复制或移动文件和文件夹（以/结尾）到 dest_prefix 下，返回 (复制数量, 错误信息列表)
+
+    progress(copied, error_count) 在每个对象完成后以累计数量调用。
+    """
+    if dest_prefix and not dest_prefix.endswith('/'):
+        dest_prefix += '/'
+
+    max_workers = app.config['COPY_CONCURRENCY']
+    action = '移动' if move else '复制'
+    errors = []
+    copied = 0
+
+    def report(step):
+        if progress:
+            progress(copied + step['copied'], len(errors) + len(step['errors']))
+
+    # 普通文件合并为一次并行复制
+    file_pairs = [(key, dest_prefix + key.split('/')[-1]) for key in keys if not key.endswith('/')]
+    if file_pairs:
+        try:
+            result = client.copy_keys(bucket, file_pairs, dest_bucket, move, max_workers, report)
+            copied += result['copied']
+            errors.extend(f"{action} {e['key']} 失败: {e['code']} {e['message']}".rstrip() for e in result['errors'])
+        except JobCancelled:
+            raise
+        except Exception as e:
+            errors.append(f"{action}文件失败: {str(e)}")
+
+    for key in keys:
+        if not key.endswith('/'):
+            continue
+        try:
+            folder_name = key.rstrip('/').split('/')[-1]
+            result = client.copy_prefix(
+                bucket, key, dest_bucket, dest_prefix + folder_name + '/', move, max_workers, report
+            )
+            copied += result['copied']
+            errors.extend(f"{action} {e['key']} 失败: {e['code']} {e['message']}".rstrip() for e in result['errors'])
+        except JobCancelled:
+            raise
+        except Exception as e:
+            errors.append(f"{action} {key} 失败: {str(e)}")
+
+    return copied, errors
+
+@app.route('/api/servers/<int:server_id>/rename', methods=['POST'])
+def rename_object(server_id):
+    """重命名文件或文件夹（服务端复制后删除源对象）"""
+    try:
+        data = request.get_json()
+        bucket = data.get('bucket')
+        key = data.get('key')
+        new_name = (data.get('new_name') or '').strip()
+
+        if not bucket or not key or not new_name:
+            return jsonify({'error': '缺少存储桶名称、对象键或新名称'}), 400
+
+        if '/' in new_name:
+            return jsonify({'error': '名称不能包含 /'}), 400
+
+        client = get_s3_client(server_id)
+        is_folder = key.endswith('/')
+        parent = key.rstrip('/')[:key.rstrip('/').rfind('/') + 1]
+        new_key = parent + new_name + ('/' if is_folder else '')
+
+        if new_key == key:
+            return jsonify({'success': True, 'key': key, 'copied': 0})
+
+        # S3复制会直接覆盖，目标已存在时拒绝
+        exists = client.prefix_exists(bucket, new_key) if is_folder else client.object_exists(bucket, new_key)
+        if exists:
+            return jsonify({'error': f'已存在同名{"文件夹" if is_folder else "文件"}: {new_name}'}), 409
+
+        max_workers = app.config['COPY_CONCURRENCY']
+        if is_folder:
+            result = client.copy_prefix(bucket, key, bucket, new_key, move=True, max_workers=max_workers)
+        else:
+            result = client.copy_keys(bucket, [(key, new_key)], move=True, max_workers=max_workers)
+
+        if result['errors']:
+            errors = [f"重命名 {e['key']} 失败: {e['code']} {e['message']}".rstrip() for e in result['errors']]
+            return jsonify({
+                'error': '; '.join(errors[:100]),
+                'error_count': len(errors),
+                'copied': result['copied']
+            }), 500
+        return jsonify({'success': True, 'key': new_key, 'copied': result['copied']})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/sync', methods=['POST'])
+def sync_objects(server_id):
+    """在 SYNC_ROOT 下的本地目录和存储桶前缀之间同步
+
+    direction 为 push（上传）或 pull（下载），compare 为 size-mtime 或 checksum，
+    delete 为 true 时删除目标中多余的文件，dry_run 为 true 时只返回传输计划。
+    """
+    try:
+        sync_root = app.config['SYNC_ROOT']
+        if not sync_root:
+            return jsonify({'error': '未配置 SYNC_ROOT，同步接口已关闭'}), 403
+
+        data = request.get_json()
+        bucket = data.get('bucket')
+        local_path = data.get('local_path', '')
+
+        if not bucket:
+            return jsonify({'error': '缺少存储桶名称'}), 400
+
+        # 本地路径相对于 SYNC_ROOT，不允许跳出该目录
+        root = os.path.realpath(sync_root)
+        local_root = os.path.realpath(os.path.join(root, local_path.lstrip('/\\')))
+        if os.path.commonpath([root, local_root]) != root:
+            return jsonify({'error': '本地路径必须位于 SYNC_ROOT 之内'}), 400
+
+        client = get_s3_client(server_id)
+        plan, result = sync_directory(
+            client,
+            bucket,
+            data.get('prefix', ''),
+            local_root,
+            direction=data.get('direction', 'push'),
+            compare=data.get('compare', 'size-mtime'),
+            delete=bool(data.get('delete')),
+            dry_run=bool(data.get('dry_run')),
+            max_workers=app.config['SYNC_CONCURRENCY']
+        )
+
+        response = {'plan': summarize_plan(plan), 'dry_run': result is None}
+        if result is None:
+            return jsonify(response)
+
+        response['result'] = dict(result, errors=result['errors'][:100], error_count=len(result['errors']))
+        if result['errors']:
+            response['error'] = '; '.join(f"{e['path']}: {e['message']}" for e in result['errors'][:100])
+            return jsonify(response), 500
+        response['success'] = True
+        return jsonify(response)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -384,7 +1624,11 @@ def create_folder(server_id):
 
 @app.route('/api/servers/<int:server_id>/preview', methods=['GET'])
 def preview_file(server_id):
-    """获取文件预览内容"""
+    """获取文件预览内容
+
+    先用 head_object 获取元数据：图片、流媒体和PDF只返回地址，不读取任何内容，超限文件在传输前拒绝，
+    文本类文件只按范围读取开头部分。
+    """
     try:
         bucket = request.args.get('bucket')
         key = request.args.get('key')
@@ -397,89 +1641,498 @@ def preview_file(server_id):
         # 获取桶级别的CDN配置
         cdn_base_url = config_manager.get_bucket_cdn_config(server_id, bucket)
 
-        # 创建临时文件
-        temp_dir = tempfile.gettempdir()
         filename = key.split('/')[-1]
-        temp_path = os.path.join(temp_dir, f"preview_{uuid.uuid4()}_{filename}")
 
         try:
-            # 下载文件
-            success = client.download_file(bucket, key, temp_path)
-
-            if not success or not os.path.exists(temp_path):
-                return jsonify({'error': '文件不存在或下载失败'}), 404
-
-            # 获取文件信息
-            file_size = os.path.getsize(temp_path)
-            file_ext = os.path.splitext(filename)[1].lower()
-
-            # 生成CDN URL和API下载URL
-            cdn_url = generate_cdn_url(cdn_base_url, key)
-            api_download_url = f"/api/servers/{server_id}/download?bucket={bucket}&key={key}"
-            download_url = cdn_url or api_download_url
-
-            # 根据文件类型判断是否可以预览（流媒体和PDF无大小限制）
-            content_type = get_content_type(file_ext)
-            is_streamable = (
-                content_type.startswith('video/') or
-                content_type.startswith('audio/') or
-                content_type == 'application/pdf'
-            )
+            head = client.head_object(bucket, key)
+        except Exception:
+            return jsonify({'error': '文件不存在或下载失败'}), 404
+
+        # 获取文件信息
+        file_size = head['ContentLength']
+        file_ext = os.path.splitext(filename)[1].lower()
+
+        # 生成CDN URL和API下载URL
+        cdn_url = generate_cdn_url(cdn_base_url, key)
+        api_download_url = f"/api/servers/{server_id}/download?bucket={quote(bucket)}&key={quote(key)}"
+        download_url = cdn_url or generate_presigned_download_url(server_id, bucket, key) or api_download_url
+
+        # 根据文件类型判断是否可以预览（图片、流媒体和PDF由浏览器按地址加载，无大小限制）
+        content_type = get_content_type(file_ext)
+        is_streamable = (
+            content_type.startswith('image/') or
+            content_type.startswith('video/') or
+            content_type.startswith('audio/') or
+            content_type == 'application/pdf'
+        )
 
-            # 非流媒体文件限制预览文件大小 (10MB)
-            if not is_streamable and file_size > 10 * 1024 * 1024:
-                os.remove(temp_path)
-                return jsonify({
-                    'error': '文件太大，无法预览',
-                    'download_url': download_url,
-                    'cdn_url': cdn_url
-                }), 413
-
-            # 根据文件类型处理
-            content_type = get_content_type(file_ext)
-            preview_data = process_file_preview(temp_path, file_ext, content_type, server_id, bucket, key)
-
-            # 处理PDF预览的字典返回
-            if isinstance(preview_data, dict) and preview_data.get('type') == 'pdf_embed':
-                return jsonify({
-                    'filename': filename,
-                    'size': file_size,
-                    'content_type': content_type,
-                    'preview_type': 'pdf_embed',
-                    'preview_url': preview_data.get('url'),
-                    'download_url': cdn_url or preview_data.get('download_url'),
-                    'cdn_url': cdn_url
-                })
+        # 非流媒体文件限制预览文件大小，超限时不传输任何内容
+        if not is_streamable and file_size > app.config['PREVIEW_MAX_SIZE']:
+            return jsonify({
+                'error': '文件太大，无法预览',
+                'download_url': download_url,
+                'cdn_url': cdn_url
+            }), 413
 
-            # 处理媒体文件预览的字典返回
-            if isinstance(preview_data, dict) and preview_data.get('type') == 'media_embed':
-                return jsonify({
-                    'filename': filename,
-                    'size': file_size,
-                    'content_type': preview_data.get('content_type'),
-                    'preview_type': 'media_embed',
-                    'preview_url': preview_data.get('url'),
-                    'download_url': cdn_url or preview_data.get('download_url'),
-                    'cdn_url': cdn_url
-                })
+        # 根据文件类型处理
+        preview_data = process_file_preview(client, file_ext, content_type, file_size, server_id, bucket, key)
 
+        # 处理PDF预览的字典返回
+        if isinstance(preview_data, dict) and preview_data.get('type') == 'pdf_embed':
             return jsonify({
                 'filename': filename,
                 'size': file_size,
                 'content_type': content_type,
-                'preview': preview_data,
-                'download_url': download_url,
+                'preview_type': 'pdf_embed',
+                'preview_url': preview_data.get('url'),
+                'download_url': cdn_url or preview_data.get('download_url'),
                 'cdn_url': cdn_url
             })
 
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        # 处理媒体文件预览的字典返回
+        if isinstance(preview_data, dict) and preview_data.get('type') == 'media_embed':
+            return jsonify({
+                'filename': filename,
+                'size': file_size,
+                'content_type': preview_data.get('content_type'),
+                'preview_type': 'media_embed',
+                'preview_url': preview_data.get('url'),
+                'download_url': cdn_url or preview_data.get('download_url'),
+                'cdn_url': cdn_url
+            })
+
+        # 图片附带缩略图地址，侧边预览无需加载原图
+        thumbnail_url = None
+        if thumbnails_available() and file_ext in THUMBNAIL_EXTENSIONS:
+            thumbnail_url = (f"/api/servers/{server_id}/thumbnail?bucket={quote(bucket)}"
+                             f"&key={quote(key)}&size={THUMBNAIL_SIZES[-1]}")
+
+        return jsonify({
+            'filename': filename,
+            'size': file_size,
+            'content_type': content_type,
+            'preview': preview_data,
+            'thumbnail_url': thumbnail_url,
+            'download_url': download_url,
+            'cdn_url': cdn_url
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/servers/<int:server_id>/thumbnail', methods=['GET'])
+def get_thumbnail(server_id):
+    """获取图片缩略图（WebP/JPEG），按对象ETag缓存在本地磁盘"""
+    try:
+        bucket = request.args.get('bucket')
+        key = request.args.get('key')
+        size = int(request.args.get('size', THUMBNAIL_SIZES[0]))
+
+        if not bucket or not key:
+            return jsonify({'error': '缺少存储桶名称或对象键'}), 400
+
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({'error': f"size 必须是 {', '.join(map(str, THUMBNAIL_SIZES))} 之一"}), 400
+
+        if not thumbnails_available():
+            return jsonify({'error': '缩略图功能需要安装 Pillow'}), 501
+
+        if os.path.splitext(key)[1].lower() not in THUMBNAIL_EXTENSIONS:
+            return jsonify({'error': '此文件类型不支持缩略图'}), 415
+
+        client = get_s3_client(server_id)
 
+        try:
+            head = client.head_object(bucket, key)
+        except Exception:
+            return jsonify({'error': '文件不存在或下载失败'}), 404
+
+        # 浏览器支持时优先WebP，体积更小
+        fmt = 'webp' if webp_supported() and 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+        object_etag = head.get('ETag', '').strip('"')
+        etag = f"{object_etag}-{size}-{fmt}"
+        cache_key = (client.cache_scope, bucket, key, object_etag, size, fmt)
+
+        with phase('disk'):
+            data = thumbnail_cache.get(cache_key)
+        if data is None:
+            if head['ContentLength'] > app.config['THUMBNAIL_MAX_SOURCE_SIZE']:
+                return jsonify({'error': '图片太大，无法生成缩略图'}), 413
+
+            try:
+                data = render_thumbnail(read_object_bytes(client, bucket, key, store=False), size, fmt)
+            except (OSError, ValueError, SyntaxError):
+                # Pillow 无法识别或解码的图片
+                return jsonify({'error': '无法生成缩略图'}), 415
+            with phase('disk'):
+                thumbnail_cache.put(cache_key, data)
+
+        response = Response(data, mimetype=THUMBNAIL_MIMETYPES[fmt])
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept'
+        # 地址不含ETag，缓存较短时间后用ETag重新验证
+        response.cache_control.private = True
+        response.cache_control.max_age = 300
+        return response.make_conditional(request)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/thumbnail-cache', methods=['GET'])
+def get_thumbnail_cache_stats():
+    """获取缩略图缓存统计信息"""
+    try:
+        return jsonify(dict(thumbnail_cache.stats(), available=thumbnails_available()))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# 后台任务
+
+@app.route('/api/servers/<int:server_id>/jobs', methods=['POST'])
+def create_job(server_id):
+    """提交后台任务：kind 为 delete、copy、move、usage 或 zip，其余参数与对应的接口相同"""
+    try:
+        data = request.get_json() or {}
+        kind = data.get('kind')
+        if kind not in JOB_KINDS:
+            return jsonify({'error': f"不支持的任务类型: {kind}"}), 400
+        return submit_job(server_id, kind, data)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """按创建时间倒序列出后台任务，active=1 只列出未结束的任务"""
+    try:
+        jobs = job_manager.list(
+            kind=request.args.get('kind'),
+            active=request.args.get('active') in ('1', 'true'),
+            limit=min(request.args.get('limit', 50, type=int), 500)
+        )
+        return jsonify({'jobs': jobs, 'stats': job_manager.stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """获取后台任务状态"""
+    try:
+        job = job_manager.get(job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify({'job': job})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消后台任务：已完成的部分不会回滚"""
+    try:
+        job = job_manager.cancel(job_id)
+        if job is None:
+            return jsonify({'error': '任务不存在'}), 404
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """删除已结束的后台任务及其结果文件"""
+    try:
+        if not job_manager.delete(job_id):
+            return jsonify({'error': '任务尚未结束，请先取消'}), 409
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def download_job_result(job_id):
+    """下载后台任务的结果文件（如打包好的ZIP）"""
+    try:
+        path = job_manager.result_file(job_id)
+        if path is None:
+            return jsonify({'error': '任务没有可下载的结果'}), 404
+        return send_file(path, as_attachment=True, download_name=os.path.basename(path), conditional=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/events', methods=['GET'])
+def all_job_events():
+    """以SSE推送所有后台任务的状态变化"""
+    return job_event_stream()
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以SSE推送单个后台任务的状态变化，任务结束后关闭"""
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return job_event_stream(job_id)
+
+def job_event_stream(job_id=None):
+    """把任务状态变化转为 text/event-stream：每次变化一条 job 事件，空闲时发送注释行保持连接"""
+    def generate():
+        for job in job_manager.events(job_id):
+            if job is None:
+                yield ': keepalive\n\n'
+            else:
+                yield f"event: job\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def submit_job(server_id, kind, data):
+    """校验参数并提交后台任务，返回 202 和任务状态"""
+    params, title, error = job_params(kind, data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    # 服务器不存在时直接报错，而不是在任务中失败
+    get_s3_client(server_id)
+    try:
+        job = job_manager.submit(kind, dict(params, server_id=server_id), server_id=server_id, title=title)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify({'success': True, 'job': job}), 202
+
+def job_params(kind, data):
+    """提取任务参数，返回 (参数, 标题, 错误信息)"""
+    bucket = data.get('bucket')
+    if not bucket:
+        return None, None, '缺少存储桶名称'
+
+    if kind == 'usage':
+        prefix = data.get('prefix', '')
+        params = {'bucket': bucket, 'prefix': prefix, 'refresh': bool(data.get('refresh'))}
+        return params, f"统计 {bucket}/{prefix} 的大小", None
+
+    if kind == 'upload':
+        return data, f"上传 {data['key']}", None
+
+    keys = data.get('keys', [])
+    if not keys:
+        return None, None, '缺少对象键'
+
+    if kind == 'delete':
+        return {'bucket': bucket, 'keys': keys}, f"删除 {describe_keys(keys)}", None
+
+    if kind in ('copy', 'move'):
+        dest_bucket = data.get('dest_bucket') or bucket
+        dest_prefix = data.get('dest_prefix', '')
+        params = {'bucket': bucket, 'keys': keys, 'dest_bucket': dest_bucket, 'dest_prefix': dest_prefix}
+        action = '移动' if kind == 'move' else '复制'
+        return params, f"{action} {describe_keys(keys)} 到 {dest_bucket}/{dest_prefix}", None
+
+    # 结果文件保存在任务目录下，只保留文件名部分
+    name = (data.get('name') or '').replace('\\', '/').split('/')[-1].strip() or 'download.zip'
+    if not name.endswith('.zip'):
+        name += '.zip'
+    params = {
+        'bucket': bucket,
+        'keys': keys,
+        'base_prefix': data.get('base_prefix', ''),
+        'name': name,
+        'compress': bool(data.get('compress', False))
+    }
+    return params, f"打包 {name}", None
+
+def describe_keys(keys):
+    """任务标题中的对象描述：单个对象显示名称，多个对象显示数量"""
+    if len(keys) == 1:
+        return keys[0].rstrip('/').split('/')[-1] or keys[0]
+    return f"{len(keys)} 个项目"
+
+def check_job_errors(errors):
+    """有对象处理失败时让任务失败，错误信息只保留前100条"""
+    if errors:
+        raise Exception(f"{len(errors)} 个对象处理失败: " + '; '.join(errors[:100]))
+
+def run_delete_job(context, params):
+    client = get_s3_client(params['server_id'])
+    deleted, errors = delete_items(
+        client, params['bucket'], params['keys'],
+        lambda deleted, error_count: context.progress(deleted=deleted, errors=error_count)
+    )
+    check_job_errors(errors)
+    return {'deleted': deleted}
+
+def run_transfer_job(context, params, move):
+    client = get_s3_client(params['server_id'])
+    copied, errors = transfer_items(
+        client, params['bucket'], params['keys'], params['dest_bucket'], params['dest_prefix'], move,
+        lambda copied, error_count: context.progress(copied=copied, errors=error_count)
+    )
+    check_job_errors(errors)
+    return {'copied': copied}
+
+def run_usage_job(context, params):
+    client = get_s3_client(params['server_id'])
+    events = walk_usage(
+        client, params['bucket'], params['prefix'],
+        usage_cache=usage_cache,
+        use_cache=not params['refresh'],
+        max_workers=app.config['FOLDER_USAGE_WORKERS']
+    )
+    result = None
+    try:
+        for event in events:
+            if event['type'] == 'progress':
+                context.progress(bytes=event['bytes'], objects=event['objects'])
+            else:
+                result = event
+    finally:
+        events.close()
+
+    # 统计在给出结果前结束（如取消请求在最后一次进度之后到达），不返回不完整的结果
+    if result is None:
+        context.check_cancelled()
+        raise Exception("统计文件夹大小失败: 统计未完成")
+
+    result.pop('type', None)
+    result['size'] = client._format_size(result['bytes'])
+    for child in result['children']:
+        child['size'] = client._format_size(child['bytes'])
+    return result
+
+def run_zip_job(context, params):
+    client = get_s3_client(params['server_id'])
+    counts = {'files': 0, 'bytes': 0}
+
+    def entries():
+        for entry in zip_entries(client, params['bucket'], params['keys'], params['base_prefix']):
+            counts['files'] += 1
+            yield entry
+
+    archive = stream_zip(
+        client,
+        params['bucket'],
+        entries(),
+        chunk_size=app.config['DOWNLOAD_CHUNK_SIZE'],
+        read_ahead=app.config['ZIP_READ_AHEAD'],
+        compress=params['compress']
+    )
+    try:
+        with open(context.result_path(params['name']), 'wb') as f:
+            for chunk in archive:
+                f.write(chunk)
+                counts['bytes'] += len(chunk)
+                context.progress(**counts)
+    finally:
+        archive.close()
+    return {'name': params['name'], 'files': counts['files'], 'bytes': counts['bytes']}
+
+def run_upload_job(context, params):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], params['upload_name'])
+    try:
+        total = os.path.getsize(path)
+        uploaded = 0
+        lock = threading.Lock()
+
+        def callback(bytes_amount):
+            nonlocal uploaded
+            # 分片上传时回调来自多个传输线程
+            with lock:
+                uploaded += bytes_amount
+                current = uploaded
+            context.progress(bytes=current, total=total)
+
+        context.progress(bytes=0, total=total)
+        client = get_s3_client(params['server_id'])
+        client.upload_file(params['bucket'], path, params['key'], callback)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return {'key': params['key'], 'bytes': total}
+
+# 可通过 /api/servers/<id>/jobs 提交的任务类型（上传任务只能由 /upload 提交）
+JOB_KINDS = ('delete', 'copy', 'move', 'usage', 'zip')
+
+job_manager.register('delete', run_delete_job)
+job_manager.register('copy', lambda context, params: run_transfer_job(context, params, move=False))
+job_manager.register('move', lambda context, params: run_transfer_job(context, params, move=True))
+job_manager.register('usage', run_usage_job)
+job_manager.register('zip', run_zip_job)
+job_manager.register('upload', run_upload_job)
+
+def read_object_bytes(client, bucket, key, max_bytes=None, store=True):
+    """读取对象内容，指定 max_bytes 时只按范围读取开头部分
+
+    已缓存的对象从本地磁盘读取；读到完整对象时（范围读取覆盖了整个小文件也算）写入缓存，
+    store 为假时只读取缓存、不写入（如生成缩略图时读取的原图）。
+    """
+    entry = cached_object(client, bucket, key)
+    if entry is not None:
+        with entry, phase('disk'):
+            return entry.file.read(max_bytes) if max_bytes else entry.file.read()
+
+    byte_range = f"bytes=0-{max_bytes - 1}" if max_bytes else None
+    s3_response = client.get_object(bucket, key, byte_range)
+    body = s3_response['Body']
+    try:
+        # 响应体在 get_object 返回后才读取，单独计入S3耗时
+        with phase('s3'):
+            data = body.read(max_bytes) if max_bytes else body.read()
+    finally:
+        body.close()
+
+    if store and object_size(s3_response) == len(data):
+        with phase('disk'):
+            object_cache.put(client.cache_scope, bucket, key, dict(s3_response, ContentLength=len(data)), data)
+    return data
+
+def object_size(s3_response):
+    """get_object 响应对应的对象总大小（范围请求时取自 Content-Range）"""
+    content_range = s3_response.get('ContentRange')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    return s3_response.get('ContentLength')
+
+def decode_text_preview(data, truncated):
+    """增量解码文本（先utf-8后gbk），截断时丢弃末尾不完整的多字节字符"""
+    for encoding in ('utf-8', 'gbk'):
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            return decoder.decode(data, final=not truncated)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+def iter_s3_body(body, chunk_size):
+    """按固定块大小读取S3响应体，结束或客户端断开时关闭连接"""
+    try:
+        for chunk in body.iter_chunks(chunk_size):
+            if chunk:
+                yield chunk
+    finally:
+        body.close()
+
+def build_content_disposition(disposition, filename):
+    """生成兼容非ASCII文件名的Content-Disposition头"""
+    ascii_name = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'download'
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+def is_direct_transfer(server_id):
+    """服务器是否启用浏览器直连S3"""
+    server_config = config_manager.get_server(server_id)
+    return bool(server_config and server_config.get('direct_transfer'))
+
+def generate_presigned_download_url(server_id, bucket, key, disposition='attachment'):
+    """启用浏览器直连时生成预签名下载地址，否则返回None"""
+    if not is_direct_transfer(server_id):
+        return None
+
+    filename = key.split('/')[-1]
+    client = get_s3_client(server_id)
+    return client.generate_presigned_download_url(
+        bucket,
+        key,
+        app.config['PRESIGNED_URL_EXPIRES'],
+        build_content_disposition(disposition, filename)
+    )
+
 def generate_cdn_url(cdn_base_url, key):
     """生成CDN访问URL"""
     if not cdn_base_url:
@@ -539,36 +2192,30 @@ def get_content_type(file_ext):
     }
     return content_types.get(file_ext, 'application/octet-stream')
 
-def process_file_preview(file_path, file_ext, content_type, server_id=None, bucket=None, key=None):
-    """处理文件预览内容"""
+def process_file_preview(client, file_ext, content_type, file_size, server_id=None, bucket=None, key=None):
+    """处理文件预览内容（只读取预览所需的字节）"""
     try:
         if content_type.startswith('image/'):
-            # 图片文件 - 返回base64
-            with open(file_path, 'rb') as f:
-                image_data = f.read()
-                return f"data:{content_type};base64,{base64.b64encode(image_data).decode()}"
+            # 图片文件 - 返回内嵌显示地址，由浏览器直接流式加载并缓存，不经过JSON
+            api_url = f"/api/servers/{server_id}/download?bucket={quote(bucket)}&key={quote(key)}"
+            return (generate_presigned_download_url(server_id, bucket, key, 'inline') or
+                    f"{api_url}&response-content-disposition=inline")
 
         elif content_type.startswith('text/') or content_type in ['application/json', 'application/javascript', 'application/xml']:
-            # 文本文件 - 读取内容
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    # 限制预览长度
-                    if len(content) > 50000:  # 50KB限制
-                        return content[:50000] + "\n\n... (内容过长，仅显示前50KB)"
-                    return content
-            except UnicodeDecodeError:
-                try:
-                    with open(file_path, 'r', encoding='gbk') as f:
-                        content = f.read()
-                        if len(content) > 50000:
-                            return content[:50000] + "\n\n... (内容过长，仅显示前50KB)"
-                        return content
-                except:
-                    return "二进制文件，无法预览内容"
+            # 文本文件 - 只读取开头部分
+            max_bytes = app.config['PREVIEW_TEXT_BYTES']
+            data = read_object_bytes(client, bucket, key, max_bytes) if file_size else b''
+            truncated = file_size > len(data)
+            content = decode_text_preview(data, truncated)
+            if content is None:
+                return "二进制文件，无法预览内容"
+            # 读取长度已受 PREVIEW_TEXT_BYTES 限制，只有对象比读到的内容长时才提示
+            if truncated:
+                return content + f"\n\n... (内容过长，仅显示前{max_bytes // 1024}KB)"
+            return content
 
         elif content_type == 'application/pdf':
-            # PDF文件 - 优先使用CDN，否则使用API预览URL
+            # PDF文件 - 优先使用CDN，其次预签名直连地址，否则使用API预览URL
             if server_id and bucket and key:
                 # 获取桶级别的CDN配置
                 cdn_base_url = config_manager.get_bucket_cdn_config(server_id, bucket)
@@ -579,21 +2226,22 @@ def process_file_preview(file_path, file_ext, content_type, server_id=None, buck
                     return {
                         'type': 'pdf_embed',
                         'url': cdn_url,
-                        'download_url': f"/api/servers/{server_id}/download?bucket={bucket}&key={key}"
+                        'download_url': f"/api/servers/{server_id}/download?bucket={quote(bucket)}&key={quote(key)}"
                     }
                 else:
-                    # 使用API预览URL
-                    preview_url = f"/api/servers/{server_id}/download?bucket={bucket}&key={key}&response-content-disposition=inline"
+                    # 使用预签名地址或API预览URL
+                    api_url = f"/api/servers/{server_id}/download?bucket={quote(bucket)}&key={quote(key)}"
                     return {
                         'type': 'pdf_embed',
-                        'url': preview_url,
-                        'download_url': f"/api/servers/{server_id}/download?bucket={bucket}&key={key}"
+                        'url': (generate_presigned_download_url(server_id, bucket, key, 'inline') or
+                                f"{api_url}&response-content-disposition=inline"),
+                        'download_url': generate_presigned_download_url(server_id, bucket, key) or api_url
                     }
             else:
                 return "PDF文档预览不可用"
 
         elif content_type.startswith('video/') or content_type.startswith('audio/'):
-            # 视频和音频文件 - 优先使用CDN，否则使用API URL
+            # 视频和音频文件 - 优先使用CDN，其次预签名直连地址，否则使用API URL
             if server_id and bucket and key:
                 # 获取桶级别的CDN配置
                 cdn_base_url = config_manager.get_bucket_cdn_config(server_id, bucket)
@@ -605,27 +2253,29 @@ def process_file_preview(file_path, file_ext, content_type, server_id=None, buck
                         'type': 'media_embed',
                         'url': cdn_url,
                         'content_type': content_type,
-                        'download_url': f"/api/servers/{server_id}/download?bucket={bucket}&key={key}"
+                        'download_url': f"/api/servers/{server_id}/download?bucket={quote(bucket)}&key={quote(key)}"
                     }
                 else:
-                    # 使用API URL
-                    api_url = f"/api/servers/{server_id}/download?bucket={bucket}&key={key}"
+                    # 使用预签名地址或API URL（内嵌播放，下载接口支持Range以便拖动进度）
+                    api_url = f"/api/servers/{server_id}/download?bucket={quote(bucket)}&key={quote(key)}"
                     return {
                         'type': 'media_embed',
-                        'url': api_url,
+                        'url': (generate_presigned_download_url(server_id, bucket, key, 'inline') or
+                                f"{api_url}&response-content-disposition=inline"),
                         'content_type': content_type,
-                        'download_url': api_url
+                        'download_url': generate_presigned_download_url(server_id, bucket, key) or api_url
                     }
             else:
                 return f"{content_type.split('/')[0].capitalize()}文件预览不可用"
 
         elif file_ext in ['.db', '.sqlite', '.sqlite3']:
-            # 数据库文件
-            return get_database_info(file_path)
+            # 数据库文件 - SQLite需要完整文件，大小已在调用前限制
+            return get_database_info(client, bucket, key, file_size)
 
         elif file_ext in ['.csv', '.tsv']:
-            # CSV文件
-            return get_csv_preview(file_path)
+            # CSV文件 - 只读取开头部分
+            data = read_object_bytes(client, bucket, key, app.config['PREVIEW_TEXT_BYTES']) if file_size else b''
+            return get_csv_preview(data, file_size > len(data))
 
         elif content_type.startswith('audio/'):
             # 音频文件
@@ -641,41 +2291,68 @@ def process_file_preview(file_path, file_ext, content_type, server_id=None, buck
     except Exception as e:
         return f"预览处理失败: {str(e)}"
 
-def get_database_info(db_path):
-    """获取数据库文件基本信息"""
+def get_database_info(client, bucket, key, file_size=None):
+    """获取数据库文件基本信息（可以缓存的文件下载到对象缓存并以只读方式打开，否则下载到临时文件）"""
+    temp_path = os.path.join(tempfile.gettempdir(), f"preview_{uuid.uuid4()}.db")
+    entry = None
     try:
         import sqlite3
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        entry = cached_object(client, bucket, key)
+        if entry is None and object_cache.admits(file_size):
+            entry = fill_object_cache(client, bucket, key, client.get_object(bucket, key))
 
-        # 获取表列表
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-
-        info = f"SQLite数据库\n\n表列表:\n"
-        for table in tables:
-            table_name = table[0]
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            count = cursor.fetchone()[0]
-            info += f"- {table_name} ({count} 条记录)\n"
-
-        conn.close()
+        if entry is not None:
+            database = f"file:{quote(entry.path)}?mode=ro&immutable=1"
+        else:
+            with phase('s3'):
+                client.download_file(bucket, key, temp_path)
+            database = f"file:{quote(temp_path)}?mode=ro"
+
+        with phase('disk'):
+            conn = sqlite3.connect(database, uri=True)
+            cursor = conn.cursor()
+
+            # 获取表列表
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+            tables = cursor.fetchall()
+
+            info = f"SQLite数据库\n\n表列表:\n"
+            for table in tables:
+                table_name = table[0]
+                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+                count = cursor.fetchone()[0]
+                info += f"- {table_name} ({count} 条记录)\n"
+
+            conn.close()
         return info
 
     except Exception as e:
         return f"数据库文件，读取失败: {str(e)}"
+    finally:
+        if entry is not None:
+            entry.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
-def get_csv_preview(csv_path):
+def get_csv_preview(data, truncated=False):
     """获取CSV文件预览"""
     try:
         import csv
-        with open(csv_path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            rows = []
-            for i, row in enumerate(reader):
-                if i >= 10:  # 只显示前10行
-                    break
-                rows.append(row)
+        content = decode_text_preview(data, truncated)
+        if content is None:
+            return "CSV文件，读取失败: 无法识别的编码"
+
+        lines = content.splitlines()
+        # 截断读取时最后一行可能不完整
+        if truncated and lines:
+            lines.pop()
+
+        reader = csv.reader(lines)
+        rows = []
+        for i, row in enumerate(reader):
+            if i >= 10:  # 只显示前10行
+                break
+            rows.append(row)
 
         # 转换为表格格式
         if not rows:
@@ -0,0 +1,415 @@
+"""ASGI入口：高并发的列表、下载、上传接口由异步S3客户端处理，其余接口交给Flask应用
+
+运行方式：uvicorn asgi:application --host 0.0.0.0 --port 8080
+依赖的 aiobotocore、asgiref 和 uvicorn 已列在 requirements.txt 中。
+"""
+import asyncio
+import hmac
+import json
+import re
+import time
+from contextlib import AsyncExitStack
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import http_date, parse_date, parse_range_header, parse_if_range_header
+from werkzeug.utils import secure_filename
+
+import app as web
+from async_s3_client import AsyncS3ClientRegistry
+from metrics import HTTP_REQUEST_SECONDS, HTTP_RESPONSES, HTTP_IN_FLIGHT
+from request_timing import begin_request, end_request, phase
+from s3_client import InvalidRangeError, InvalidCursorError, NotModifiedError, ObjectNotFoundError
+
+async_clients = AsyncS3ClientRegistry(
+    web.s3_clients,
+    max_pool_connections=web.app.config['ASYNC_S3_MAX_POOL_CONNECTIONS']
+)
+
+wsgi_application = WsgiToAsgi(web.app)
+
+
+class RequestTooLarge(Exception):
+    """请求体超过 MAX_CONTENT_LENGTH"""
+
+
+class ClientDisconnected(Exception):
+    """客户端在请求体传完之前断开"""
+
+
+async def application(scope, receive, send):
+    """ASGI应用"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    # 采样分析按线程进行，需要分析的请求交给Flask处理
+    if scope['type'] == 'http' and not profile_requested(scope):
+        for method, rule, pattern, handler in ROUTES:
+            match = pattern.match(scope['path'])
+            if match and scope['method'] == method:
+                await instrumented(handler, rule, scope, receive, send, int(match.group(1)))
+                return
+
+    await wsgi_application(scope, receive, send)
+
+
+async def instrumented(handler, rule, scope, receive, send, server_id):
+    """记录异步路由的耗时和响应状态并添加 Server-Timing 响应头（交给Flask处理的请求由Flask自己统计）"""
+    started_at = time.perf_counter()
+    status = 500
+    timings = begin_request()
+
+    async def send_with_status(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            if web.app.config['SERVER_TIMING_ENABLED'] and not scope.get('s3finder.delegated'):
+                message = dict(message, headers=list(message.get('headers', [])) + [
+                    (b'server-timing', timings.header_value().encode('latin-1'))
+                ])
+        await send(message)
+
+    HTTP_IN_FLIGHT.inc()
+    try:
+        await handler(scope, receive, send_with_status, server_id)
+    finally:
+        end_request()
+        HTTP_IN_FLIGHT.dec()
+        if not scope.get('s3finder.delegated'):
+            HTTP_REQUEST_SECONDS.observe((scope['method'], rule), time.perf_counter() - started_at)
+            HTTP_RESPONSES.inc((scope['method'], rule, str(status)))
+
+
+async def delegate_to_flask(scope, receive, send):
+    """交给Flask应用处理（Flask自己记录指标）"""
+    scope['s3finder.delegated'] = True
+    await wsgi_application(scope, receive, send)
+
+
+def profile_requested(scope):
+    """与 app.profile_requested 相同的判断：请求头 X-Profile 或参数 profile 等于 PROFILER_TOKEN"""
+    token = web.app.config['PROFILER_TOKEN']
+    if not token:
+        return False
+    supplied = request_headers(scope).get('x-profile') or query_args(scope).get('profile', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+
+async def lifespan(receive, send):
+    """启动/关闭时管理异步客户端"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_clients.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def list_objects(scope, receive, send, server_id):
+    """列出S3对象（游标分页）；页码模式交给Flask处理"""
+    args = query_args(scope)
+    if 'page' in args:
+        await delegate_to_flask(scope, receive, send)
+        return
+
+    try:
+        bucket = args.get('bucket')
+        prefix = args.get('prefix', '')
+        per_page = int(args.get('per_page', 100))
+        use_cache = args.get('refresh') not in ('1', 'true')
+        listing_format = args.get('format', 'records')
+
+        if not bucket:
+            await send_json(send, {'error': '缺少存储桶名称'}, 400)
+            return
+
+        if listing_format not in web.LISTING_FORMATS:
+            await send_json(send, {'error': 'format 必须是 records 或 columnar'}, 400)
+            return
+
+        if per_page < 1 or per_page > 1000:
+            await send_json(send, {'error': 'per_page 必须在 1 到 1000 之间'}, 400)
+            return
+
+        cursor = args.get('cursor') or None
+        start_after = args.get('start_after') or None
+        async with async_clients.lease(server_id) as client:
+            listing, next_cursor = await client.list_objects_page(
+                bucket, prefix, max_keys=per_page, cursor=cursor,
+                start_after=start_after, use_cache=use_cache
+            )
+
+        await send_json(send, dict(web.listing_payload(listing, listing_format), **{
+            'pagination': {
+                'mode': 'cursor',
+                'per_page': per_page,
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+        }))
+    except InvalidCursorError:
+        await send_json(send, {'error': '无效的分页游标'}, 400)
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def download_file(scope, receive, send, server_id):
+    """从S3下载文件（流式转发，支持单段Range）；多段Range和已缓存的对象交给Flask处理"""
+    # 响应体转发完之前一直持有异步客户端，配置变更时不会被中途关闭
+    async with AsyncExitStack() as resources:
+        await proxy_download(scope, receive, send, server_id, resources)
+
+
+async def proxy_download(scope, receive, send, server_id, resources):
+    """download_file 的实现，需要的异步客户端登记在 resources 中"""
+    args = query_args(scope)
+    headers_in = request_headers(scope)
+
+    byte_range = parse_range_header(headers_in.get('range'))
+    if byte_range and byte_range.units != 'bytes':
+        byte_range = None
+    if byte_range and len(byte_range.ranges) > 1:
+        await delegate_to_flask(scope, receive, send)
+        return
+
+    try:
+        bucket = args.get('bucket')
+        key = args.get('key')
+
+        if not bucket or not key:
+            await send_json(send, {'error': '缺少存储桶名称或对象键'}, 400)
+            return
+
+        filename = key.split('/')[-1]
+
+        disposition = args.get('response-content-disposition', '').split(';')[0].strip().lower()
+        if disposition != 'inline':
+            disposition = 'attachment'
+
+        # 浏览器直连模式：重定向到预签名地址；proxy=1 强制走代理
+        if args.get('proxy') != '1':
+            presigned_url = await asyncio.to_thread(
+                web.generate_presigned_download_url, server_id, bucket, key, disposition
+            )
+            if presigned_url:
+                await send_response(send, 302, b'', {'Location': presigned_url})
+                return
+
+        client = await resources.enter_async_context(async_clients.lease(server_id))
+
+        # 已缓存的对象交给Flask从本地磁盘返回（包括过期后的重新验证）
+        if await asyncio.to_thread(web.object_cache.contains, client.cache_scope, bucket, key):
+            await delegate_to_flask(scope, receive, send)
+            return
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': web.build_content_disposition(disposition, filename)
+        }
+
+        # If-Range 与当前对象不匹配时忽略Range，返回完整对象
+        if byte_range and headers_in.get('if-range'):
+            head = await client.head_object(bucket, key)
+            if not web.if_range_matches(parse_if_range_header(headers_in['if-range']), head):
+                byte_range = None
+
+        try:
+            s3_response = await client.get_object(
+                bucket,
+                key,
+                byte_range.to_header() if byte_range else None,
+                if_none_match=headers_in.get('if-none-match'),
+                if_modified_since=parse_date(headers_in.get('if-modified-since'))
+            )
+        except NotModifiedError as e:
+            not_modified_headers = {'Cache-Control': web.download_cache_control()}
+            if e.etag:
+                not_modified_headers['ETag'] = e.etag
+            await send({'type': 'http.response.start', 'status': 304, 'headers': encode_headers(not_modified_headers)})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        except InvalidRangeError:
+            head = await client.head_object(bucket, key)
+            await send_json(send, {'error': '请求范围无效'}, 416, {
+                'Content-Range': f"bytes */{head['ContentLength']}",
+                'Accept-Ranges': 'bytes'
+            })
+            return
+    except ObjectNotFoundError:
+        await send_json(send, {'error': '文件不存在'}, 404)
+        return
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+        return
+
+    body = s3_response['Body']
+    writer = None
+    try:
+        status = 200
+        if byte_range and s3_response.get('ContentRange'):
+            status = 206
+            headers['Content-Range'] = s3_response['ContentRange']
+
+        if s3_response.get('ContentLength') is not None:
+            headers['Content-Length'] = str(s3_response['ContentLength'])
+        if s3_response.get('ETag'):
+            headers['ETag'] = s3_response['ETag']
+        if s3_response.get('LastModified'):
+            headers['Last-Modified'] = http_date(s3_response['LastModified'])
+        headers['Cache-Control'] = web.download_cache_control()
+        headers['Content-Type'] = web.resolve_content_type(s3_response.get('ContentType'), filename)
+
+        # 完整对象边转发边写入对象缓存，传输中断时放弃；磁盘读写都放到线程中，不阻塞事件循环
+        if status == 200 and web.object_cache.admits(s3_response.get('ContentLength')):
+            writer = await asyncio.to_thread(web.object_cache.writer, client.cache_scope, bucket, key, s3_response)
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers)})
+        # send 在客户端接收缓慢时等待，S3 读取随之暂停，内存占用只有一个块
+        async for chunk in body.iter_chunks(web.app.config['DOWNLOAD_CHUNK_SIZE']):
+            if writer is not None:
+                await asyncio.to_thread(writer.write, chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+        if writer is not None:
+            entry, writer = await asyncio.to_thread(writer.commit), None
+            if entry is not None:
+                entry.close()
+    finally:
+        if writer is not None:
+            await asyncio.to_thread(writer.abort)
+        body.close()
+
+
+async def upload_file_stream(scope, receive, send, server_id):
+    """流式上传文件到S3，边接收边分片上传"""
+    args = query_args(scope)
+    try:
+        bucket = args.get('bucket')
+        prefix = args.get('prefix', '')
+        filename = args.get('filename', '')
+
+        if not bucket:
+            await send_json(send, {'error': '缺少存储桶名称'}, 400)
+            return
+
+        if not filename:
+            await send_json(send, {'error': '文件名为空'}, 400)
+            return
+
+        filename = secure_filename(filename)
+        object_name = prefix + filename if prefix else filename
+
+        async with async_clients.lease(server_id) as client:
+            size = await client.upload_stream(
+                bucket,
+                object_name,
+                iter_request_body(scope, receive),
+                part_size=web.app.config['UPLOAD_PART_SIZE'],
+                max_concurrency=web.app.config['UPLOAD_CONCURRENCY']
+            )
+
+        await send_json(send, {'success': True, 'object_name': object_name, 'size': size})
+    except RequestTooLarge:
+        await send_json(send, {'error': '文件太大，最大支持1GB'}, 413)
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def upload_multipart_part(scope, receive, send, server_id):
+    """上传单个分片，请求体即分片内容"""
+    args = query_args(scope)
+    try:
+        bucket = args.get('bucket')
+        key = args.get('key')
+        upload_id = args.get('upload_id')
+        part_number = int(args.get('part_number', 0))
+
+        if not bucket or not key or not upload_id:
+            await send_json(send, {'error': '缺少存储桶名称、对象键或上传ID'}, 400)
+            return
+
+        data = bytearray()
+        async for chunk in iter_request_body(scope, receive):
+            data += chunk
+        async with async_clients.lease(server_id) as client:
+            etag = await client.upload_part(bucket, key, upload_id, part_number, bytes(data))
+        await send_json(send, {'part_number': part_number, 'etag': etag})
+    except RequestTooLarge:
+        await send_json(send, {'error': '文件太大，最大支持1GB'}, 413)
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def iter_request_body(scope, receive):
+    """逐块读取请求体；只在调用方需要数据时才接收，ASGI服务器据此对客户端施加背压"""
+    max_length = web.app.config['MAX_CONTENT_LENGTH']
+    content_length = request_headers(scope).get('content-length')
+    if max_length and content_length and content_length.isdigit() and int(content_length) > max_length:
+        raise RequestTooLarge()
+
+    received = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+
+        chunk = message.get('body', b'')
+        received += len(chunk)
+        if max_length and received > max_length:
+            raise RequestTooLarge()
+        if chunk:
+            yield chunk
+        if not message.get('more_body'):
+            return
+
+
+def query_args(scope):
+    """解析查询参数（同名参数取第一个，与 request.args.get 一致）"""
+    args = {}
+    for name, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+        args.setdefault(name, value)
+    return args
+
+
+def request_headers(scope):
+    """请求头（名称小写）"""
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+
+def encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+
+
+async def send_response(send, status, body, headers):
+    headers = dict(headers, **{'Content-Length': str(len(body))})
+    await send({'type': 'http.response.start', 'status': status, 'headers': encode_headers(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, data, status=200, headers=None):
+    with phase('serialize'):
+        body = json.dumps(data).encode('utf-8')
+    await send_response(send, status, body, dict(headers or {}, **{'Content-Type': 'application/json'}))
+
+
+def route(method, rule, handler):
+    """按Flask的路由规则注册异步路由，指标中的路由标签与Flask处理同一接口时相同"""
+    pattern = re.escape(rule).replace(re.escape('<int:server_id>'), r'(\d+)')
+    return method, rule, re.compile(f"^{pattern}$"), handler
+
+
+ROUTES = [
+    route('GET', '/api/servers/<int:server_id>/objects', list_objects),
+    route('GET', '/api/servers/<int:server_id>/download', download_file),
+    route('PUT', '/api/servers/<int:server_id>/upload-stream', upload_file_stream),
+    route('PUT', '/api/servers/<int:server_id>/multipart/parts', upload_multipart_part),
+]
@@ -0,0 +1,307 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from botocore.exceptions import ClientError
+from metrics import instrument_s3_client
+from s3_client import MIN_PART_SIZE, MAX_PARTS, raise_for_get_object_error, raise_for_head_object_error
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:  # 异步模式为可选功能，未安装 aiobotocore 时同步模式不受影响
+    AioConfig = None
+    get_session = None
+
+
+class AsyncS3ClientManager:
+    """S3ClientManager 的异步版本，基于 aiobotocore，与同步客户端共享凭据、连接参数和列表缓存
+
+    单个进程内可同时保持上千个在途S3请求而不占用线程。
+    """
+
+    def __init__(self, manager, max_pool_connections=1000):
+        if get_session is None:
+            raise Exception("异步模式需要安装 aiobotocore")
+        self.manager = manager
+        self.max_pool_connections = max_pool_connections
+        self.listing_cache = manager.listing_cache
+        self.cache_scope = manager.cache_scope
+        self.client = None
+        self._client_context = None
+        # 正在使用该客户端的请求数；配置变更后旧客户端等这些请求结束再关闭
+        self._leases = 0
+        self._retired = False
+
+    async def start(self):
+        """创建底层异步客户端（必须在事件循环中调用）"""
+        transport = self.manager.transport
+        config = AioConfig(
+            max_pool_connections=self.max_pool_connections,
+            connect_timeout=transport['connect_timeout'],
+            read_timeout=transport['read_timeout'],
+            retries={
+                'mode': transport['retry_mode'],
+                'max_attempts': transport['max_attempts']
+            },
+            tcp_keepalive=transport['tcp_keepalive']
+        )
+        try:
+            self._client_context = get_session().create_client(
+                's3',
+                aws_access_key_id=self.manager.access_key,
+                aws_secret_access_key=self.manager.secret_key,
+                endpoint_url=self.manager.endpoint_url,
+                region_name=self.manager.region,
+                config=config
+            )
+            self.client = instrument_s3_client(await self._client_context.__aenter__())
+            return self
+        except Exception as e:
+            raise Exception(f"创建S3客户端失败: {str(e)}")
+
+    async def close(self):
+        """关闭客户端及其连接池"""
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client_context = None
+            self.client = None
+
+    async def retire(self):
+        """不再分配给新请求，在途请求（包括正在转发的响应体）全部结束后关闭"""
+        self._retired = True
+        if self._leases == 0:
+            await self.close()
+
+    async def _release(self):
+        self._leases -= 1
+        if self._retired and self._leases == 0:
+            await self.close()
+
+    async def list_objects_page(self, bucket_name, prefix='', delimiter='/', max_keys=100, cursor=None,
+                                start_after=None, use_cache=True):
+        """按游标分页列出对象，每页只请求一次S3"""
+        cache_key = (self.cache_scope, bucket_name, prefix, 'page', delimiter, max_keys, cursor, start_after)
+        if use_cache and self.listing_cache:
+            cached = self.listing_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            params = self.manager._page_params(bucket_name, prefix, delimiter, max_keys, cursor, start_after)
+            page = await self.client.list_objects_v2(**params)
+            result = self.manager._parse_page(page, prefix)
+            if self.listing_cache:
+                self.listing_cache.set(cache_key, result, result[0].estimated_size())
+            return result
+        except ClientError as e:
+            raise Exception(f"列出对象失败: {str(e)}")
+
+    async def head_object(self, bucket_name, object_name):
+        """获取对象元数据"""
+        try:
+            return await self.client.head_object(Bucket=bucket_name, Key=object_name)
+        except ClientError as e:
+            raise_for_head_object_error(e)
+
+    async def get_object(self, bucket_name, object_name, byte_range=None, if_none_match=None, if_modified_since=None):
+        """获取对象（流式），返回的 Body 需由调用方关闭"""
+        try:
+            params = {'Bucket': bucket_name, 'Key': object_name}
+            if byte_range:
+                params['Range'] = byte_range
+            if if_none_match:
+                params['IfNoneMatch'] = if_none_match
+            elif if_modified_since:
+                params['IfModifiedSince'] = if_modified_since
+            return await self.client.get_object(**params)
+        except ClientError as e:
+            raise_for_get_object_error(e, byte_range)
+
+    async def put_object(self, bucket_name, object_name, data):
+        """上传小文件"""
+        try:
+            await self.client.put_object(Bucket=bucket_name, Key=object_name, Body=data)
+            self.manager._invalidate_listing(bucket_name, object_name)
+            return True
+        except ClientError as e:
+            raise Exception(f"上传文件失败: {str(e)}")
+
+    async def upload_stream(self, bucket_name, object_name, chunks, part_size=8 * 1024 * 1024, max_concurrency=4):
+        """从异步数据块迭代器边读边分片上传，在途分片满时暂停读取，对客户端形成背压"""
+        part_size = max(part_size, MIN_PART_SIZE)
+        chunks = chunks.__aiter__()
+        buffer = bytearray()
+        finished = False
+
+        async def next_part():
+            nonlocal finished
+            while not finished and len(buffer) < part_size:
+                try:
+                    buffer.extend(await chunks.__anext__())
+                except StopAsyncIteration:
+                    finished = True
+            data = bytes(buffer[:part_size])
+            del buffer[:part_size]
+            return data
+
+        chunk = await next_part()
+
+        # 不足一个分片的小文件直接 put_object
+        if len(chunk) < part_size:
+            await self.put_object(bucket_name, object_name, chunk)
+            return len(chunk)
+
+        try:
+            response = await self.client.create_multipart_upload(Bucket=bucket_name, Key=object_name)
+            upload_id = response['UploadId']
+        except ClientError as e:
+            raise Exception(f"上传文件失败: {str(e)}")
+
+        total_size = 0
+        tasks = []
+        pending = set()
+        try:
+            part_number = 1
+            while chunk:
+                if part_number > MAX_PARTS:
+                    raise Exception(f"分片数量超过上限 {MAX_PARTS}")
+
+                if len(pending) >= max_concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+
+                task = asyncio.ensure_future(
+                    self._upload_part(bucket_name, object_name, upload_id, part_number, chunk)
+                )
+                pending.add(task)
+                tasks.append(task)
+                total_size += len(chunk)
+                part_number += 1
+                chunk = await next_part()
+
+            parts = await asyncio.gather(*tasks)
+            await self.client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=object_name,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            self.manager._invalidate_listing(bucket_name, object_name)
+            return total_size
+        except BaseException as e:
+            # 任何失败（包括客户端断开、任务取消）都中止分片上传，避免残留分片产生费用
+            for task in pending:
+                task.cancel()
+            try:
+                await asyncio.shield(
+                    self.client.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+                )
+            except ClientError:
+                pass
+            if isinstance(e, ClientError):
+                raise Exception(f"上传文件失败: {str(e)}")
+            raise
+
+    async def _upload_part(self, bucket_name, object_name, upload_id, part_number, data):
+        """上传单个分片，返回 complete_multipart_upload 所需的分片信息"""
+        response = await self.client.upload_part(
+            Bucket=bucket_name,
+            Key=object_name,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    async def create_multipart_upload(self, bucket_name, object_name):
+        """创建分片上传，返回 upload_id"""
+        try:
+            response = await self.client.create_multipart_upload(Bucket=bucket_name, Key=object_name)
+            return response['UploadId']
+        except ClientError as e:
+            raise Exception(f"创建分片上传失败: {str(e)}")
+
+    async def upload_part(self, bucket_name, object_name, upload_id, part_number, data):
+        """上传分片，返回分片ETag"""
+        if part_number < 1 or part_number > MAX_PARTS:
+            raise Exception(f"分片编号必须在 1 到 {MAX_PARTS} 之间")
+        try:
+            return (await self._upload_part(bucket_name, object_name, upload_id, part_number, data))['ETag']
+        except ClientError as e:
+            raise Exception(f"上传分片失败: {str(e)}")
+
+    async def complete_multipart_upload(self, bucket_name, object_name, upload_id, parts):
+        """完成分片上传"""
+        try:
+            await self.client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=object_name,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': [
+                    {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda p: p['part_number'])
+                ]}
+            )
+            self.manager._invalidate_listing(bucket_name, object_name)
+            return True
+        except ClientError as e:
+            raise Exception(f"完成分片上传失败: {str(e)}")
+
+    async def abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        """中止分片上传并清理已上传的分片"""
+        try:
+            await self.client.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+            return True
+        except ClientError as e:
+            raise Exception(f"中止分片上传失败: {str(e)}")
+
+
+class AsyncS3ClientRegistry:
+    """按服务器复用异步客户端；同步注册表重建客户端（配置变更）时随之重建"""
+
+    def __init__(self, registry, max_pool_connections=1000):
+        self.registry = registry
+        self.max_pool_connections = max_pool_connections
+        self._clients = {}
+        self._build_locks = {}
+
+    @asynccontextmanager
+    async def lease(self, server_id):
+        """在 async with 块内使用服务器的异步S3客户端
+
+        配置变更重建客户端时，旧客户端要等所有未结束的 lease 退出后才关闭，不会中断在途的流式传输。
+        """
+        client = await self._current(server_id)
+        client._leases += 1
+        try:
+            yield client
+        finally:
+            await client._release()
+
+    async def _current(self, server_id):
+        """获取服务器当前的异步S3客户端，配置已变更时重建"""
+        # 同步注册表会加锁、检查配置文件，必要时创建客户端，放到线程中执行以免阻塞事件循环
+        manager = await asyncio.to_thread(self.registry.get, server_id)
+        client = self._clients.get(server_id)
+        if client is not None and client.manager is manager:
+            return client
+
+        build_lock = self._build_locks.setdefault(server_id, asyncio.Lock())
+        async with build_lock:
+            client = self._clients.get(server_id)
+            if client is not None and client.manager is manager:
+                return client
+
+            new_client = await AsyncS3ClientManager(manager, self.max_pool_connections).start()
+            self._clients[server_id] = new_client
+            if client is not None:
+                await client.retire()
+            return new_client
+
+    async def close(self):
+        """关闭全部异步客户端（仍在使用的客户端在请求结束后关闭）"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.retire()
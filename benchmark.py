@@ -0,0 +1,790 @@
+"""性能基准测试
+
+启动本地S3替身（moto server），按几种形态灌入数据，通过真实的Flask接口（本进程内的HTTP服务）
+测量列表、分页、上传、下载、预览和批量删除的吞吐、延迟分位数（p50/p90/p99）和应用进程的内存峰值，
+结果以JSON输出，便于比较两次运行。
+
+用法：
+    python benchmark.py --output before.json
+    python benchmark.py --preset full --output full.json
+    python benchmark.py --scenarios list_flat_first_page,download_large --repeat 50
+    python benchmark.py --endpoint http://127.0.0.1:9000 --access-key minio --secret-key minio123
+    python benchmark.py --compare before.json after.json
+
+数据形态（每种一个存储桶）：
+    flat   一个前缀下的大量对象（full 预设为100万个）
+    deep   多层目录树
+    large  大对象（full 预设为4GB，moto 合并分片时会把整个对象读入内存，数GB的对象建议用 MinIO 等）
+    small  大量小文本文件
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from listing import format_size
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# 预设的数据规模，命令行参数可以逐项覆盖
+PRESETS = {
+    'quick': {
+        'flat_keys': 20000,
+        'deep_depth': 3,
+        'deep_fanout': 4,
+        'deep_files': 20,
+        'large_count': 1,
+        'large_size': 256 * MB,
+        'small_files': 2000,
+        'upload_size': 32 * MB,
+        'upload_count': 4,
+        'repeat': 20
+    },
+    'full': {
+        'flat_keys': 1000000,
+        'deep_depth': 5,
+        'deep_fanout': 4,
+        'deep_files': 20,
+        'large_count': 2,
+        'large_size': 4 * GB,
+        'small_files': 50000,
+        'upload_size': 512 * MB,
+        'upload_count': 8,
+        'repeat': 100
+    }
+}
+
+SHAPES = ('flat', 'deep', 'large', 'small')
+
+# 存储桶中记录灌入参数的对象；参数一致时跳过灌入（使用外部S3服务时可重复运行）
+SEED_MARKER = '.benchmark-seed.json'
+
+SEED_PART_SIZE = 64 * MB
+LIST_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 1024 * 1024
+RSS_SAMPLE_INTERVAL = 0.02
+
+# 重复的字节模式，用于生成对象内容和上传请求体（不占用与对象大小相当的内存）
+PATTERN = bytes(range(256)) * (SEED_PART_SIZE // 256)
+
+
+class BenchmarkError(Exception):
+    """接口返回了非预期的状态码"""
+
+
+class AppClient:
+    """到被测应用的 HTTP/1.1 长连接，每个并发线程一个"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """发送请求并读完响应；返回 (状态码, 响应头, 响应体)，下载类响应只计字节数不保存内容"""
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=600, blocksize=READ_CHUNK_SIZE)
+            try:
+                self._connection.request(method, path, body=body, headers=headers or {})
+                response = self._connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionError):
+                # 服务端关闭了空闲连接，重新连接后重试一次（请求体是流时无法重发）
+                self.close()
+                if attempt or (body is not None and not isinstance(body, bytes)):
+                    raise
+                continue
+
+            if response.getheader('Content-Type', '').startswith('application/json'):
+                content = response.read()
+            else:
+                content = _drain(response)
+            if response.will_close:
+                self.close()
+            return response.status, response, content
+
+    def request_json(self, method, path, body=None, expect=(200,)):
+        headers = {}
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        status, _, content = self.request(method, path, body, headers)
+        if status not in expect:
+            raise BenchmarkError(f"{method} {path} 返回 {status}: {content[:200]!r}")
+        return json.loads(content)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class PatternReader:
+    """产生指定长度重复字节的只读文件对象，用作上传请求体"""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        size = min(size, len(PATTERN))
+        self.remaining -= size
+        return PATTERN[:size]
+
+
+class RssSampler:
+    """在后台按固定间隔采样本进程的常驻内存，记录场景期间的峰值
+
+    没有 /proc 的系统上退化为进程生命周期内的峰值（ru_maxrss）。
+    """
+
+    def __init__(self):
+        self.start = current_rss()
+        self.peak = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, current_rss())
+
+
+def current_rss():
+    """当前常驻内存（字节）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 以字节为单位，Linux 以KB为单位
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_scenario(name, description, tasks, app_address, concurrency=1):
+    """执行一个场景
+
+    tasks 是可迭代的任务，每个任务是 fn(client) -> (字节数, 条目数)；迭代是惰性的，
+    顺序场景（如按游标翻页）可以在上一个任务完成后再产生下一个任务。
+    """
+    iterator = iter(tasks)
+    lock = threading.Lock()
+    latencies = []
+    totals = {'bytes': 0, 'items': 0, 'errors': 0}
+    first_error = []
+
+    def worker():
+        client = AppClient(*app_address)
+        try:
+            while True:
+                with lock:
+                    task = next(iterator, None)
+                if task is None:
+                    return
+                started_at = time.perf_counter()
+                try:
+                    transferred, items = task(client)
+                except Exception as e:
+                    with lock:
+                        totals['errors'] += 1
+                        if not first_error:
+                            first_error.append(str(e))
+                    client.close()
+                    continue
+                elapsed = time.perf_counter() - started_at
+                with lock:
+                    latencies.append(elapsed)
+                    totals['bytes'] += transferred
+                    totals['items'] += items
+        finally:
+            client.close()
+
+    print(f"运行 {name} ...", file=sys.stderr, flush=True)
+    with RssSampler() as rss:
+        started_at = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started_at
+
+    latencies.sort()
+    requests = len(latencies)
+    result = {
+        'name': name,
+        'description': description,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': totals['errors'],
+        'seconds': round(seconds, 4),
+        'requests_per_second': round(requests / seconds, 2) if seconds else None,
+        'bytes': totals['bytes'],
+        'megabytes_per_second': round(totals['bytes'] / MB / seconds, 2) if seconds else None,
+        'items': totals['items'],
+        'items_per_second': round(totals['items'] / seconds, 1) if seconds else None,
+        'latency_ms': {
+            'p50': _ms(percentile(latencies, 50)),
+            'p90': _ms(percentile(latencies, 90)),
+            'p99': _ms(percentile(latencies, 99)),
+            'max': _ms(latencies[-1] if latencies else None),
+            'mean': _ms(sum(latencies) / requests if requests else None)
+        },
+        'rss_start_mb': round(rss.start / MB, 1),
+        'peak_rss_mb': round(rss.peak / MB, 1)
+    }
+    if first_error:
+        result['first_error'] = first_error[0]
+    return result
+
+
+# 数据灌入
+
+def bucket_names(bucket_prefix):
+    return {shape: f"{bucket_prefix}{shape}" for shape in SHAPES}
+
+
+def deep_directories(depth, fanout):
+    """目录树中的所有目录前缀（根目录为 deep/，每层 fanout 个子目录）"""
+    directories = ['deep/']
+    level = ['deep/']
+    for _ in range(depth):
+        level = [f"{parent}d{i}/" for parent in level for i in range(fanout)]
+        directories.extend(level)
+    return directories
+
+
+def small_file_key(index):
+    return f"small/{index:06d}.txt"
+
+
+def small_file_body(index):
+    # 1KB 到 16KB 的文本，预览接口按文本读取
+    line = f"line {index:06d} of the benchmark text file\n".encode('ascii')
+    return line * ((1024 + (index % 16) * 1024) // len(line))
+
+
+def large_object_key(index):
+    return f"large/video-{index}.mp4"
+
+
+def seed_buckets(s3, buckets, params, workers):
+    """按参数灌入各形态的数据；存储桶中的参数记录一致时跳过"""
+    seeders = {
+        'flat': (_seed_flat, {'flat_keys': params['flat_keys']}),
+        'deep': (_seed_deep, {key: params[key] for key in ('deep_depth', 'deep_fanout', 'deep_files')}),
+        'large': (_seed_large, {key: params[key] for key in ('large_count', 'large_size')}),
+        'small': (_seed_small, {'small_files': params['small_files']})
+    }
+    existing = {bucket['Name'] for bucket in s3.list_buckets().get('Buckets', [])}
+    report = {}
+
+    for shape, bucket in buckets.items():
+        seeder, shape_params = seeders[shape]
+        marker = json.dumps(shape_params, sort_keys=True)
+        if bucket not in existing:
+            s3.create_bucket(Bucket=bucket)
+        elif _read_marker(s3, bucket) == marker:
+            report[shape] = {'bucket': bucket, 'skipped': True}
+            continue
+        else:
+            _empty_bucket(s3, bucket)
+
+        print(f"灌入 {bucket} {marker} ...", file=sys.stderr, flush=True)
+        started_at = time.perf_counter()
+        objects, size = seeder(s3, bucket, shape_params, workers)
+        s3.put_object(Bucket=bucket, Key=SEED_MARKER, Body=marker.encode('utf-8'))
+        report[shape] = {
+            'bucket': bucket,
+            'objects': objects,
+            'bytes': size,
+            'seconds': round(time.perf_counter() - started_at, 2)
+        }
+    return report
+
+
+def _seed_flat(s3, bucket, params, workers):
+    count = params['flat_keys']
+
+    def put(index):
+        size = index % 4096
+        s3.put_object(Bucket=bucket, Key=f"flat/{index:08d}.dat", Body=PATTERN[:size])
+        return size
+
+    return count, _parallel_sum(put, range(count), workers)
+
+
+def _seed_deep(s3, bucket, params, workers):
+    keys = [
+        f"{directory}f{index:03d}.dat"
+        for directory in deep_directories(params['deep_depth'], params['deep_fanout'])
+        for index in range(params['deep_files'])
+    ]
+
+    def put(key):
+        s3.put_object(Bucket=bucket, Key=key, Body=PATTERN[:1024])
+        return 1024
+
+    return len(keys), _parallel_sum(put, keys, workers)
+
+
+def _seed_large(s3, bucket, params, workers):
+    size = params['large_size']
+    for index in range(params['large_count']):
+        key = large_object_key(index)
+        upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, ContentType='video/mp4')['UploadId']
+        part_count = max(1, math.ceil(size / SEED_PART_SIZE))
+
+        def put_part(number):
+            length = min(SEED_PART_SIZE, size - (number - 1) * SEED_PART_SIZE)
+            response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id,
+                                      PartNumber=number, Body=PATTERN[:length])
+            return {'PartNumber': number, 'ETag': response['ETag']}
+
+        with ThreadPoolExecutor(max_workers=min(workers, 4)) as executor:
+            parts = list(executor.map(put_part, range(1, part_count + 1)))
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                     MultipartUpload={'Parts': parts})
+    return params['large_count'], size * params['large_count']
+
+
+def _seed_small(s3, bucket, params, workers):
+    def put(index):
+        body = small_file_body(index)
+        s3.put_object(Bucket=bucket, Key=small_file_key(index), Body=body, ContentType='text/plain')
+        return len(body)
+
+    return params['small_files'], _parallel_sum(put, range(params['small_files']), workers)
+
+
+def _parallel_sum(fn, items, workers):
+    # 分块提交，避免一百万个 Future 同时存在
+    items = list(items)
+    chunk = max(1, len(items) // (workers * 16) or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        chunks = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+        return sum(executor.map(lambda part: sum(fn(item) for item in part), chunks))
+
+
+def _read_marker(s3, bucket):
+    try:
+        return s3.get_object(Bucket=bucket, Key=SEED_MARKER)['Body'].read().decode('utf-8')
+    except Exception:
+        return None
+
+
+def _empty_bucket(s3, bucket):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket):
+        keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if keys:
+            s3.delete_objects(Bucket=bucket, Delete={'Objects': keys, 'Quiet': True})
+
+
+# 场景
+
+def build_scenarios(server_id, buckets, params, concurrency):
+    """返回 [(名称, 说明, 任务, 并发数)]；任务按需生成，删除类场景放在最后"""
+    repeat = params['repeat']
+    api = f"/api/servers/{server_id}"
+
+    def list_page(bucket, prefix, **query):
+        path = f"{api}/objects?" + urlencode(dict(bucket=bucket, prefix=prefix, per_page=LIST_PAGE_SIZE, **query))
+
+        def task(client):
+            data = client.request_json('GET', path)
+            return 0, _listing_count(data)
+        return task
+
+    def cursor_walk(bucket, prefix):
+        # 顺序任务：每个任务取一页，下一页的游标由上一个任务写入 state
+        state = {'cursor': None, 'done': False}
+
+        def task(client):
+            # 请求失败时结束翻页
+            state['done'] = True
+            query = {'bucket': bucket, 'prefix': prefix, 'per_page': LIST_PAGE_SIZE, 'refresh': 1, 'format': 'columnar'}
+            if state['cursor']:
+                query['cursor'] = state['cursor']
+            data = client.request_json('GET', f"{api}/objects?{urlencode(query)}")
+            state['cursor'] = data['pagination']['next_cursor']
+            state['done'] = state['cursor'] is None
+            return 0, _listing_count(data)
+
+        while not state['done']:
+            yield task
+
+    def page_mode(bucket, prefix, count):
+        pages = max(1, math.ceil(count / LIST_PAGE_SIZE))
+        # 第一页重新列出整个前缀（之后使用列表缓存），其余页码在全范围内均匀抽样
+        numbers = sorted({1 + (pages - 1) * i // max(1, repeat - 1) for i in range(repeat)})
+        for number in numbers:
+            query = {'page': number}
+            if number == 1:
+                query['refresh'] = 1
+            yield list_page(bucket, prefix, **query)
+
+    def download(bucket, key, byte_range=None):
+        path = f"{api}/download?" + urlencode({'bucket': bucket, 'key': key, 'proxy': 1})
+        headers = {'Range': byte_range} if byte_range else {}
+
+        def task(client):
+            status, _, content = client.request('GET', path, headers=headers)
+            if status not in (200, 206):
+                raise BenchmarkError(f"GET {path} 返回 {status}")
+            return content, 1
+        return task
+
+    def preview(bucket, key):
+        path = f"{api}/preview?" + urlencode({'bucket': bucket, 'key': key})
+
+        def task(client):
+            client.request_json('GET', path)
+            return 0, 1
+        return task
+
+    def upload_stream(index):
+        size = params['upload_size']
+        path = f"{api}/upload-stream?" + urlencode({
+            'bucket': buckets['small'], 'prefix': 'uploads/', 'filename': f"stream-{index}.bin"
+        })
+
+        def task(client):
+            status, _, content = client.request('PUT', path, PatternReader(size), {'Content-Length': str(size)})
+            if status != 200:
+                raise BenchmarkError(f"PUT {path} 返回 {status}: {content[:200]!r}")
+            return size, 1
+        return task
+
+    def upload_form(index):
+        boundary = uuid.uuid4().hex
+        content = small_file_body(index)
+        body = b''.join([
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"bucket\"\r\n\r\n{buckets['small']}\r\n".encode(),
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"prefix\"\r\n\r\nuploads/\r\n".encode(),
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"form-{index}.txt\"\r\n"
+            f"Content-Type: text/plain\r\n\r\n".encode(),
+            content,
+            f"\r\n--{boundary}--\r\n".encode()
+        ])
+        headers = {'Content-Type': f"multipart/form-data; boundary={boundary}"}
+
+        def task(client):
+            status, _, response = client.request('POST', f"{api}/upload", body, headers)
+            if status != 200:
+                raise BenchmarkError(f"POST {api}/upload 返回 {status}: {response[:200]!r}")
+            return len(content), 1
+        return task
+
+    def delete(bucket, keys):
+        def task(client):
+            data = client.request_json('DELETE', f"{api}/delete", {'bucket': bucket, 'keys': keys})
+            return 0, data.get('deleted', 0)
+        return task
+
+    flat, deep, large, small = (buckets[shape] for shape in SHAPES)
+    directories = deep_directories(params['deep_depth'], params['deep_fanout'])
+    large_keys = [large_object_key(i) for i in range(params['large_count'])]
+    small_keys = [small_file_key(i) for i in range(params['small_files'])]
+    range_size = min(MB, params['large_size'])
+
+    def byte_range(i):
+        start = (i * 7919 * MB) % max(1, params['large_size'] - range_size + 1)
+        return f"bytes={start}-{start + range_size - 1}"
+
+    return [
+        ('list_flat_first_page', f"大目录首页（{LIST_PAGE_SIZE}条，跳过缓存）",
+            [list_page(flat, 'flat/', refresh=1) for _ in range(repeat)], concurrency),
+        ('list_flat_first_page_columnar', '大目录首页，列式格式',
+            [list_page(flat, 'flat/', refresh=1, format='columnar') for _ in range(repeat)], concurrency),
+        ('list_flat_cached', '大目录首页，命中列表缓存',
+            [list_page(flat, 'flat/') for _ in range(repeat)], concurrency),
+        ('paging_flat_cursor', '按游标翻完整个大目录（每页一次S3请求）',
+            cursor_walk(flat, 'flat/'), 1),
+        ('paging_flat_page_mode', '页码模式（首次全量列出，之后使用缓存切片）',
+            page_mode(flat, 'flat/', params['flat_keys']), 1),
+        ('list_deep_tree', '逐个列出目录树中的每个目录',
+            [list_page(deep, directory, refresh=1) for directory in directories], concurrency),
+        ('upload_stream', f"流式上传 {format_size(params['upload_size'])} 文件",
+            [upload_stream(i) for i in range(params['upload_count'])], min(concurrency, params['upload_count'])),
+        ('upload_form_small', '表单上传小文件',
+            [upload_form(i) for i in range(repeat)], concurrency),
+        ('download_large', f"下载 {format_size(params['large_size'])} 大对象",
+            [download(large, key) for key in large_keys], min(concurrency, len(large_keys))),
+        ('download_range', f"大对象随机Range读取（{format_size(range_size)}）",
+            [download(large, large_keys[i % len(large_keys)], byte_range(i)) for i in range(repeat)], concurrency),
+        ('download_small', '下载小文件',
+            [download(small, small_keys[i % len(small_keys)]) for i in range(repeat * 5)], concurrency),
+        ('preview_text', '预览文本文件（只读取开头部分）',
+            [preview(small, small_keys[i % len(small_keys)]) for i in range(repeat)], concurrency),
+        ('preview_large', '预览大视频对象（只返回地址）',
+            [preview(large, large_keys[i % len(large_keys)]) for i in range(repeat)], concurrency),
+        ('delete_bulk_files', f"批量删除小文件（每次请求{DELETE_BATCH_SIZE}个）",
+            [delete(small, small_keys[i:i + DELETE_BATCH_SIZE]) for i in range(0, len(small_keys), DELETE_BATCH_SIZE)],
+            concurrency),
+        ('delete_folder_tree', '删除整个目录树',
+            [delete(deep, ['deep/'])], 1)
+    ]
+
+
+def _listing_count(data):
+    if 'columns' in data:
+        return len(data['columns']['names'])
+    return len(data.get('objects', []))
+
+
+def _drain(response):
+    total = 0
+    while True:
+        chunk = response.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return total
+        total += len(chunk)
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+# 运行环境
+
+def start_moto_server():
+    """在子进程中启动 moto server，返回 (进程, 地址)"""
+    if importlib.util.find_spec('moto') is None:
+        raise BenchmarkError("未安装 moto，请执行 pip install 'moto[server]'，或用 --endpoint 指定S3兼容服务")
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'moto.server', '-H', '127.0.0.1', '-p', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    endpoint = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise BenchmarkError('moto server 启动失败')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return process, endpoint
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise BenchmarkError('moto server 启动超时')
+
+
+def start_app(endpoint, access_key, secret_key, region):
+    """在临时工作目录中加载应用并以多线程HTTP服务运行，返回 (服务, 服务器ID)"""
+    import logging
+    from werkzeug.serving import make_server
+
+    # 应用在导入时会在当前目录创建配置文件、上传目录和索引数据库
+    os.chdir(tempfile.mkdtemp(prefix='s3finder-bench-'))
+    import app as web
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server_config = web.config_manager.add_server('benchmark', access_key, secret_key, endpoint, region)
+    server = make_server('127.0.0.1', 0, web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server_config['id']
+
+
+def environment_info(endpoint_kind):
+    import boto3
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'boto3': boto3.__version__,
+        'git_commit': commit,
+        's3_endpoint': endpoint_kind
+    }
+
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# 结果比较
+
+def compare_results(baseline, current):
+    """逐场景比较两次运行，返回文本表格的各行"""
+    baseline_results = {result['name']: result for result in baseline['results']}
+    lines = [f"{'场景':<32}{'p50(ms)':>28}{'p99(ms)':>28}{'请求/秒':>28}"]
+    for result in current['results']:
+        base = baseline_results.get(result['name'])
+        if base is None:
+            continue
+        lines.append(f"{result['name']:<32}"
+                     f"{_delta(base['latency_ms']['p50'], result['latency_ms']['p50']):>28}"
+                     f"{_delta(base['latency_ms']['p99'], result['latency_ms']['p99']):>28}"
+                     f"{_delta(base['requests_per_second'], result['requests_per_second']):>28}")
+    return lines
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return '-'
+    if not before:
+        return f"{before} -> {after}"
+    return f"{before} -> {after} ({(after - before) / before * 100:+.0f}%)"
+
+
+def _parse_size(value):
+    units = {'K': 1024, 'M': MB, 'G': GB}
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='通过真实接口测量列表、分页、上传、下载、预览和删除的性能')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick', help='数据规模预设')
+    parser.add_argument('--flat-keys', type=int, help='大目录中的对象数')
+    parser.add_argument('--deep-depth', type=int, help='目录树深度')
+    parser.add_argument('--deep-fanout', type=int, help='每个目录的子目录数')
+    parser.add_argument('--deep-files', type=int, help='每个目录中的文件数')
+    parser.add_argument('--large-count', type=int, help='大对象个数')
+    parser.add_argument('--large-size', type=_parse_size, help='大对象大小（如 512M、4G）')
+    parser.add_argument('--small-files', type=int, help='小文件个数')
+    parser.add_argument('--upload-size', type=_parse_size, help='流式上传的文件大小')
+    parser.add_argument('--upload-count', type=int, help='流式上传的文件个数')
+    parser.add_argument('--repeat', type=int, help='每个重复型场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发请求数')
+    parser.add_argument('--scenarios', help='只运行这些场景（逗号分隔）')
+    parser.add_argument('--seed-workers', type=int, default=32, help='灌入数据的并发数')
+    parser.add_argument('--endpoint', help='使用已有的S3兼容服务（默认启动 moto server）')
+    parser.add_argument('--access-key', default='benchmark')
+    parser.add_argument('--secret-key', default='benchmark')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--bucket-prefix', default='s3finder-bench-', help='测试存储桶名称前缀')
+    parser.add_argument('--output', help='结果JSON文件（默认输出到标准输出）')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='比较两个结果文件')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        print('\n'.join(compare_results(baseline, current)))
+        return 0
+
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    selected = set(args.scenarios.split(',')) if args.scenarios else None
+    # 应用在临时目录中运行，先把输出路径转为绝对路径
+    output_path = os.path.abspath(args.output) if args.output else None
+    started_at = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+    import boto3
+    from botocore.config import Config
+
+    moto_process = None
+    try:
+        if args.endpoint:
+            endpoint = args.endpoint
+        else:
+            moto_process, endpoint = start_moto_server()
+
+        s3 = boto3.client(
+            's3', endpoint_url=endpoint, region_name=args.region,
+            aws_access_key_id=args.access_key, aws_secret_access_key=args.secret_key,
+            config=Config(max_pool_connections=args.seed_workers)
+        )
+        buckets = bucket_names(args.bucket_prefix)
+        seed = seed_buckets(s3, buckets, params, args.seed_workers)
+
+        server, server_id = start_app(endpoint, args.access_key, args.secret_key, args.region)
+        app_address = ('127.0.0.1', server.server_port)
+
+        results = []
+        for name, description, tasks, concurrency in build_scenarios(server_id, buckets, params, args.concurrency):
+            if selected is not None and name not in selected:
+                continue
+            if name.startswith('delete_'):
+                # 删除后下次运行需要重新灌入
+                for bucket in (buckets['small'], buckets['deep']):
+                    s3.delete_object(Bucket=bucket, Key=SEED_MARKER)
+            results.append(run_scenario(name, description, tasks, app_address, concurrency))
+        server.shutdown()
+    except BenchmarkError as e:
+        print(f"基准测试失败: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if moto_process is not None:
+            moto_process.terminate()
+            moto_process.wait()
+
+    report = {
+        'version': 1,
+        'started_at': started_at,
+        'preset': args.preset,
+        'parameters': dict(params, concurrency=args.concurrency),
+        'environment': environment_info(args.endpoint or 'moto'),
+        'seed': seed,
+        'results': results
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for result in results:
+        latency = result['latency_ms']
+        print(f"{result['name']:<32} p50 {latency['p50']}ms  p99 {latency['p99']}ms  "
+              f"{result['requests_per_second']} 请求/秒  峰值内存 {result['peak_rss_mb']}MB"
+              + (f"  错误 {result['errors']}" if result['errors'] else ''), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import threading
+import time
+
+from s3_client import S3ClientManager
+
+
+class S3ClientRegistry:
+    """线程安全的S3客户端注册表：按服务器复用客户端，支持预热、空闲淘汰和连接池统计"""
+
+    def __init__(self, config_manager, listing_cache=None, default_transport=None,
+                 idle_timeout=1800, sweep_interval=60, metadata_index=None, usage_cache=None, object_cache=None):
+        self.config_manager = config_manager
+        self.listing_cache = listing_cache
+        self.metadata_index = metadata_index
+        self.usage_cache = usage_cache
+        self.object_cache = object_cache
+        self.default_transport = default_transport or {}
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._clients = {}
+        self._configs = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._last_sweep = time.monotonic()
+
+    def get(self, server_id):
+        """获取服务器的S3客户端，并发的首次请求只会创建一个客户端"""
+        self._maybe_evict_idle()
+
+        # 配置被其他进程修改并重新加载后，服务器配置对象会变化，需要重建客户端
+        server_config = self.config_manager.get_server(server_id)
+        if not server_config:
+            self.invalidate(server_id)
+            raise Exception(f"服务器配置不存在: {server_id}")
+
+        with self._lock:
+            client = self._current(server_id, server_config)
+            if client is not None:
+                return client
+            build_lock = self._build_locks.setdefault(server_id, threading.Lock())
+
+        # 创建客户端较慢，只锁住当前服务器，不阻塞其他服务器的请求
+        with build_lock:
+            with self._lock:
+                client = self._current(server_id, server_config)
+                if client is not None:
+                    return client
+                stale = self._clients.pop(server_id, None)
+
+            if stale is not None:
+                self._invalidate_caches(stale)
+
+            client = self._create(server_config)
+
+            with self._lock:
+                self._clients[server_id] = client
+                self._configs[server_id] = server_config
+                self._last_used[server_id] = time.monotonic()
+            return client
+
+    def invalidate(self, server_id):
+        """移除服务器的客户端（配置变更或删除时调用），并清理其列表缓存、文件夹大小缓存和对象缓存"""
+        with self._lock:
+            client = self._clients.pop(server_id, None)
+            self._configs.pop(server_id, None)
+            self._last_used.pop(server_id, None)
+
+        if client is not None:
+            self._invalidate_caches(client)
+        return client is not None
+
+    def prewarm(self, server_ids=None):
+        """预先创建客户端，避免首个请求承担创建开销"""
+        if server_ids is None:
+            server_ids = [server['id'] for server in self.config_manager.get_servers()]
+
+        for server_id in server_ids:
+            try:
+                self.get(server_id)
+            except Exception:
+                # 预热失败不影响启动，首次请求时会重新尝试并返回错误
+                continue
+
+    def prewarm_async(self, server_ids=None):
+        """在后台线程中预热"""
+        thread = threading.Thread(target=self.prewarm, args=(server_ids,), daemon=True)
+        thread.start()
+        return thread
+
+    def evict_idle(self):
+        """淘汰超过 idle_timeout 未使用的客户端，释放其连接池"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                server_id for server_id, last_used in self._last_used.items()
+                if now - last_used > self.idle_timeout
+            ]
+            for server_id in idle:
+                self._clients.pop(server_id, None)
+                self._configs.pop(server_id, None)
+                self._last_used.pop(server_id, None)
+            self._last_sweep = now
+        return idle
+
+    def stats(self):
+        """获取各服务器客户端的连接池使用情况"""
+        now = time.monotonic()
+        with self._lock:
+            clients = list(self._clients.items())
+            last_used = dict(self._last_used)
+
+        servers = {}
+        for server_id, client in clients:
+            servers[str(server_id)] = {
+                'idle_seconds': round(now - last_used.get(server_id, now), 1),
+                'transport': client.transport,
+                'pools': client.pool_stats()
+            }
+        return {'clients': len(clients), 'servers': servers}
+
+    def _maybe_evict_idle(self):
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.evict_idle()
+
+    def _invalidate_caches(self, client):
+        for cache in (self.listing_cache, self.usage_cache, self.object_cache):
+            if cache:
+                cache.invalidate_scope(client.cache_scope)
+
+    def _current(self, server_id, server_config):
+        # 调用方需持有 self._lock
+        client = self._clients.get(server_id)
+        if client is None or self._configs.get(server_id) is not server_config:
+            return None
+        self._last_used[server_id] = time.monotonic()
+        return client
+
+    def _create(self, server_config):
+        # 服务器配置中的 transport 覆盖全局默认值
+        transport = dict(self.default_transport)
+        transport.update(server_config.get('transport') or {})
+
+        return S3ClientManager(
+            server_config['access_key'],
+            server_config['secret_key'],
+            server_config['endpoint_url'],
+            server_config['region'],
+            listing_cache=self.listing_cache,
+            transport=transport,
+            metadata_index=self.metadata_index,
+            usage_cache=self.usage_cache,
+            object_cache=self.object_cache
+        )
@@ -1,14 +1,33 @@
 import json
 import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能保证单进程内的互斥
+    fcntl = None
+
 class ConfigManager:
-    def __init__(self, config_file='s3_config.json'):
+    def __init__(self, config_file='s3_config.json', reload_interval=1.0):
         self.config_file = Path(config_file)
+        # 多个进程修改配置时用于互斥的锁文件
+        self.lock_file = self.config_file.with_name(f'.{self.config_file.name}.lock')
+        # 两次检查配置文件是否被其他进程修改之间的最小间隔（秒），0 表示每次都检查
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._servers_by_id = {}
+        self._file_signature = None
+        self._last_check = time.monotonic()
         self.config_data = self.load_config()
+        self._rebuild_index()
 
     def load_config(self):
         """加载配置文件"""
+        self._file_signature = self._stat_signature()
         if self.config_file.exists():
             try:
                 with open(self.config_file, 'r', encoding='utf-8') as f:
@@ -18,57 +37,95 @@ class ConfigManager:
         return {'servers': []}
 
     def save_config(self):
-        """保存配置文件"""
+        """保存配置文件（先写临时文件再原子替换，其他进程不会读到写了一半的文件）"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config_data, f, indent=2, ensure_ascii=False)
+            directory = self.config_file.parent
+            fd, tmp_path = tempfile.mkstemp(prefix=f'.{self.config_file.name}.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self.config_data, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_file)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._file_signature = self._stat_signature()
             return True
-        except IOError:
+        except (IOError, OSError):
+            return False
+
+    def reload_if_changed(self, force=False):
+        """配置文件被其他进程修改时重新加载（按 reload_interval 节流，平时不产生文件I/O）"""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_interval:
             return False
 
+        with self._lock:
+            self._last_check = now
+            signature = self._stat_signature()
+            if signature == self._file_signature:
+                return False
+            previous = self._servers_by_id
+            self.config_data = self.load_config()
+            self._rebuild_index(previous)
+            return True
+
     def get_servers(self):
         """获取所有S3服务器配置"""
+        self.reload_if_changed()
         return self.config_data.get('servers', [])
 
-    def add_server(self, name, access_key, secret_key, endpoint_url, region='us-east-1'):
+    def add_server(self, name, access_key, secret_key, endpoint_url, region='us-east-1', direct_transfer=False):
         """添加新的S3服务器配置"""
-        server = {
-            'id': len(self.config_data['servers']) + 1,
-            'name': name,
-            'access_key': access_key,
-            'secret_key': secret_key,
-            'endpoint_url': endpoint_url,
-            'region': region,
-            'bucket_cdn_configs': {}
-        }
-        self.config_data['servers'].append(server)
-        self.save_config()
-        return server
+        with self._lock, self._file_lock():
+            self.reload_if_changed(force=True)
+            # ID只增不减，删除服务器后也不会复用
+            server_id = self.config_data['next_id']
+            self.config_data['next_id'] = server_id + 1
+            server = {
+                'id': server_id,
+                'name': name,
+                'access_key': access_key,
+                'secret_key': secret_key,
+                'endpoint_url': endpoint_url,
+                'region': region,
+                'direct_transfer': direct_transfer,
+                'bucket_cdn_configs': {}
+            }
+            self.config_data['servers'].append(server)
+            self._servers_by_id[server_id] = server
+            self.save_config()
+            return server
 
     def update_server(self, server_id, **kwargs):
         """更新S3服务器配置"""
-        for server in self.config_data['servers']:
-            if server['id'] == server_id:
-                server.update(kwargs)
-                self.save_config()
-                return True
-        return False
+        with self._lock, self._file_lock():
+            self.reload_if_changed(force=True)
+            server = self._servers_by_id.get(server_id)
+            if not server:
+                return False
+            server.update(kwargs)
+            self.save_config()
+            return True
 
     def delete_server(self, server_id):
         """删除S3服务器配置"""
-        self.config_data['servers'] = [
-            server for server in self.config_data['servers']
-            if server['id'] != server_id
-        ]
-        self.save_config()
-        return True
+        with self._lock, self._file_lock():
+            self.reload_if_changed(force=True)
+            self.config_data['servers'] = [
+                server for server in self.config_data['servers']
+                if server['id'] != server_id
+            ]
+            self._servers_by_id.pop(server_id, None)
+            self.save_config()
+            return True
 
     def get_server(self, server_id):
         """获取指定S3服务器配置"""
-        for server in self.config_data['servers']:
-            if server['id'] == server_id:
-                return server
-        return None
+        self.reload_if_changed()
+        return self._servers_by_id.get(server_id)
 
     def get_bucket_cdn_config(self, server_id, bucket_name):
         """获取指定桶的CDN配置"""
@@ -76,29 +133,27 @@ class ConfigManager:
         if not server:
             return None
 
-        # 初始化桶CDN配置（如果不存在）
-        if 'bucket_cdn_configs' not in server:
-            server['bucket_cdn_configs'] = {}
-
-        return server['bucket_cdn_configs'].get(bucket_name)
+        return server.get('bucket_cdn_configs', {}).get(bucket_name)
 
     def set_bucket_cdn_config(self, server_id, bucket_name, cdn_url):
         """设置指定桶的CDN配置"""
-        server = self.get_server(server_id)
-        if not server:
-            return False
+        with self._lock, self._file_lock():
+            self.reload_if_changed(force=True)
+            server = self._servers_by_id.get(server_id)
+            if not server:
+                return False
 
-        # 初始化桶CDN配置（如果不存在）
-        if 'bucket_cdn_configs' not in server:
-            server['bucket_cdn_configs'] = {}
+            # 初始化桶CDN配置（如果不存在）
+            if 'bucket_cdn_configs' not in server:
+                server['bucket_cdn_configs'] = {}
 
-        if cdn_url:
-            server['bucket_cdn_configs'][bucket_name] = cdn_url
-        else:
-            # 如果CDN URL为空，则删除配置
-            server['bucket_cdn_configs'].pop(bucket_name, None)
+            if cdn_url:
+                server['bucket_cdn_configs'][bucket_name] = cdn_url
+            else:
+                # 如果CDN URL为空，则删除配置
+                server['bucket_cdn_configs'].pop(bucket_name, None)
 
-        return self.save_config()
+            return self.save_config()
 
     def delete_bucket_cdn_config(self, server_id, bucket_name):
         """删除指定桶的CDN配置"""
@@ -110,4 +165,43 @@ class ConfigManager:
         if not server:
             return {}
 
-        return server.get('bucket_cdn_configs', {})
\ No newline at end of file
+        return server.get('bucket_cdn_configs', {})
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程互斥：读取-修改-保存的整个过程持有锁文件的排他锁，避免两个进程分到同一个ID或互相覆盖"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_file, 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _rebuild_index(self, previous=None):
+        """重建 ID -> 服务器 索引，并补齐自增ID
+
+        传入重新加载前的索引时，内容未变化的服务器沿用原来的字典：
+        客户端注册表按对象身份判断配置是否变化，这样只有被修改的服务器会重建客户端、清空缓存。
+        """
+        servers = self.config_data.setdefault('servers', [])
+        if previous:
+            servers[:] = [
+                previous[server['id']] if previous.get(server['id']) == server else server
+                for server in servers
+            ]
+        self._servers_by_id = {server['id']: server for server in servers}
+        max_id = max(self._servers_by_id, default=0)
+        # 旧配置文件没有 next_id，从现有最大ID之后开始
+        if self.config_data.get('next_id', 0) <= max_id:
+            self.config_data['next_id'] = max_id + 1
+
+    def _stat_signature(self):
+        """用修改时间和文件大小判断配置文件是否变化"""
+        try:
+            stat = self.config_file.stat()
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
@@ -0,0 +1,181 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+
+class _PrefixNode:
+    """遍历中的一个前缀：直接子对象的合计加上已完成子前缀的合计"""
+
+    __slots__ = ('prefix', 'parent', 'bytes', 'objects', 'pending', 'listed', 'children')
+
+    def __init__(self, prefix, parent=None):
+        self.prefix = prefix
+        self.parent = parent
+        self.bytes = 0
+        self.objects = 0
+        self.pending = 0
+        self.listed = False
+        self.children = []
+
+
+def walk_usage(manager, bucket, prefix='', usage_cache=None, use_cache=True, max_workers=8, progress_interval=0.5):
+    """统计前缀下所有对象的总大小和数量（类似 du），以生成器形式返回进度和结果
+
+    按 '/' 逐层列出，各子前缀并行处理。每个子前缀统计完成后写入 usage_cache，
+    再次统计时未变化（缓存未失效）的子树直接使用缓存结果，不再重新列出。
+
+    依次产生的事件：
+    - {'type': 'progress', ...} 当前已统计的部分合计，每 progress_interval 秒一次
+    - {'type': 'result', ...} 最终结果，包含直接子前缀的合计
+    """
+    scope = manager.cache_scope
+    events = queue.Queue()
+    started_at = time.monotonic()
+    stats = {'bytes': 0, 'objects': 0, 'listed': 0, 'cached': 0}
+
+    def cache_key(node_prefix):
+        return (scope, bucket, node_prefix, 'usage')
+
+    if use_cache and usage_cache:
+        cached = usage_cache.get(cache_key(prefix))
+        # 缺少子前缀明细的条目不能回答这次查询，按未命中重新统计
+        if cached is not None and 'children' in cached:
+            yield _result_event(prefix, cached, cached['children'], stats, started_at, from_cache=True)
+            return
+
+    def list_level(node):
+        # 在线程池中执行：只列出一层，汇总由主循环完成
+        try:
+            direct_bytes = 0
+            direct_objects = 0
+            sub_prefixes = []
+            paginator = manager.client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=node.prefix, Delimiter='/'):
+                for obj in page.get('Contents', []):
+                    direct_bytes += obj['Size']
+                    direct_objects += 1
+                for common_prefix in page.get('CommonPrefixes', []):
+                    sub_prefixes.append(common_prefix['Prefix'])
+            events.put(('listed', node, direct_bytes, direct_objects, sub_prefixes))
+        except Exception as e:
+            events.put(('error', node, e))
+
+    def complete(node):
+        # 子树统计完成：写入缓存并向上汇总，父前缀的子树全部完成时继续向上。
+        # 每个前缀都带上直接子前缀的合计，之后单独查询任何一个子前缀都能直接从缓存返回明细
+        while node is not None:
+            computed_at = time.time()
+            aggregate = {
+                'bytes': node.bytes,
+                'objects': node.objects,
+                'computed_at': computed_at,
+                'children': node.children
+            }
+            if usage_cache:
+                usage_cache.set(cache_key(node.prefix), aggregate, 256 + 128 * len(node.children))
+
+            parent = node.parent
+            if parent is None:
+                return aggregate
+            parent.bytes += node.bytes
+            parent.objects += node.objects
+            parent.children.append(_child_summary(node.prefix, aggregate))
+            parent.pending -= 1
+            if not (parent.listed and parent.pending == 0):
+                return None
+            node = parent
+        return None
+
+    root = _PrefixNode(prefix)
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pool.submit(list_level, root)
+        in_flight = 1
+        last_progress = time.monotonic()
+        result = None
+
+        while result is None:
+            try:
+                event = events.get(timeout=progress_interval)
+            except queue.Empty:
+                event = None
+
+            if event is not None:
+                in_flight -= 1
+                if event[0] == 'error':
+                    error = event[2]
+                    if isinstance(error, ClientError):
+                        raise Exception(f"统计文件夹大小失败: {str(error)}")
+                    raise error
+
+                _, node, direct_bytes, direct_objects, sub_prefixes = event
+                node.bytes += direct_bytes
+                node.objects += direct_objects
+                node.listed = True
+                stats['bytes'] += direct_bytes
+                stats['objects'] += direct_objects
+                stats['listed'] += 1
+
+                for sub_prefix in sub_prefixes:
+                    cached = usage_cache.get(cache_key(sub_prefix)) if use_cache and usage_cache else None
+                    if cached is not None:
+                        # 未变化的子树直接使用缓存
+                        node.bytes += cached['bytes']
+                        node.objects += cached['objects']
+                        stats['bytes'] += cached['bytes']
+                        stats['objects'] += cached['objects']
+                        stats['cached'] += 1
+                        node.children.append(_child_summary(sub_prefix, cached))
+                        continue
+
+                    node.pending += 1
+                    pool.submit(list_level, _PrefixNode(sub_prefix, node))
+                    in_flight += 1
+
+                if node.pending == 0:
+                    result = complete(node)
+
+            if result is None and time.monotonic() - last_progress >= progress_interval:
+                last_progress = time.monotonic()
+                yield {
+                    'type': 'progress',
+                    'prefix': prefix,
+                    'bytes': stats['bytes'],
+                    'objects': stats['objects'],
+                    'prefixes_listed': stats['listed'],
+                    'prefixes_cached': stats['cached'],
+                    'prefixes_pending': in_flight,
+                    'elapsed': round(time.monotonic() - started_at, 3)
+                }
+
+        yield _result_event(prefix, result, result['children'], stats, started_at)
+    finally:
+        # 客户端断开或出错时不再列出尚未开始的前缀
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _child_summary(prefix, aggregate):
+    """子前缀的合计（不含其下一层的明细）"""
+    return {
+        'prefix': prefix,
+        'bytes': aggregate['bytes'],
+        'objects': aggregate['objects'],
+        'computed_at': aggregate['computed_at']
+    }
+
+
+def _result_event(prefix, aggregate, children, stats, started_at, from_cache=False):
+    return {
+        'type': 'result',
+        'prefix': prefix,
+        'bytes': aggregate['bytes'],
+        'objects': aggregate['objects'],
+        'computed_at': aggregate['computed_at'],
+        'from_cache': from_cache,
+        'children': sorted(children, key=lambda child: child['bytes'], reverse=True),
+        'prefixes_listed': stats['listed'],
+        'prefixes_cached': stats['cached'],
+        'elapsed': round(time.monotonic() - started_at, 3)
+    }
@@ -0,0 +1,467 @@
+"""后台任务：在有界线程池中执行耗时的存储桶操作（删除文件夹、递归复制、统计大小、打包下载等）
+
+任务状态保存在SQLite中，请求可以立即返回任务ID，之后查询状态、取消，或通过SSE接收进度。
+任务函数签名为 handler(context, params) -> 结果字典，通过 context.progress() 报告进度；
+取消是协作式的：context.progress() / context.check_cancelled() 在收到取消请求后抛出 JobCancelled。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from shared_db import ThreadLocalConnection, owner_gone, process_owner
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    server_id INTEGER,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    result_file TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    owner TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+"""
+
+COLUMNS = ('id', 'kind', 'server_id', 'title', 'status', 'params', 'progress', 'result', 'error',
+           'result_file', 'cancel_requested', 'owner', 'created_at', 'started_at', 'finished_at', 'updated_at')
+
+
+class JobCancelled(Exception):
+    """任务被取消"""
+
+
+class JobQueueFull(Exception):
+    """排队中的任务过多"""
+
+
+class JobContext:
+    """传给任务函数的上下文"""
+
+    def __init__(self, manager, job_id):
+        self.manager = manager
+        self.job_id = job_id
+        self.result_file = None
+
+    def progress(self, **fields):
+        """更新进度（与之前的进度合并），已请求取消时抛出 JobCancelled"""
+        self.manager._update_progress(self.job_id, fields)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self.manager._cancel_requested(self.job_id):
+            raise JobCancelled()
+
+    def result_path(self, filename):
+        """任务结果文件的路径（如打包好的ZIP），任务删除或过期时一并删除"""
+        directory = os.path.join(self.manager.result_dir, self.job_id)
+        os.makedirs(directory, exist_ok=True)
+        self.result_file = os.path.abspath(os.path.join(directory, os.path.basename(filename)))
+        return self.result_file
+
+
+class JobManager:
+    """后台任务管理器
+
+    每个进程一个线程池；任务表可以被多个进程共享，其他进程中任务的进度按 progress_interval
+    写入数据库，查询和SSE会从数据库读取。进程退出时未完成的任务在下次启动时标记为失败。
+    """
+
+    def __init__(self, db_path='jobs.db', max_workers=4, max_queued=100, result_dir='job_results',
+                 retention=7 * 86400, progress_interval=0.5):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_dir = result_dir
+        self.retention = retention
+        self.progress_interval = progress_interval
+        self._handlers = {}
+        self._db = ThreadLocalConnection(db_path)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # 本进程中未结束的任务：{任务ID: 状态字典}
+        self._live = {}
+        self._cancelled = set()
+        self._last_persist = {}
+        self._last_cleanup = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._fail_orphans(conn)
+        conn.commit()
+
+    def register(self, kind, handler):
+        """注册任务类型"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, params, server_id=None, title=None):
+        """提交任务，返回任务状态"""
+        if kind not in self._handlers:
+            raise Exception(f"不支持的任务类型: {kind}")
+
+        with self._lock:
+            if len(self._live) >= self.max_workers + self.max_queued:
+                raise JobQueueFull("任务队列已满，请稍后再试")
+            now = time.time()
+            job = {
+                'id': uuid.uuid4().hex,
+                'kind': kind,
+                'server_id': server_id,
+                'title': title or kind,
+                'status': 'queued',
+                'params': params,
+                'progress': {},
+                'result': None,
+                'error': None,
+                'result_file': None,
+                'cancel_requested': False,
+                'owner': process_owner(),
+                'created_at': now,
+                'started_at': None,
+                'finished_at': None,
+                'updated_at': now
+            }
+            self._live[job['id']] = job
+
+        self._write(job, insert=True)
+        self._executor.submit(self._run, job['id'])
+        self._maybe_cleanup()
+        return self.get(job['id'])
+
+    def get(self, job_id):
+        """获取任务状态，不存在时返回None"""
+        with self._lock:
+            job = self._live.get(job_id)
+            if job is not None:
+                return _public(job)
+        row = self._connect().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return _public(_from_row(row)) if row else None
+
+    def list(self, kind=None, active=False, limit=50):
+        """按创建时间倒序列出任务"""
+        where = []
+        params = []
+        if kind:
+            where.append("kind = ?")
+            params.append(kind)
+        if active:
+            where.append(f"status NOT IN ({', '.join('?' * len(FINISHED_STATUSES))})")
+            params.extend(FINISHED_STATUSES)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        rows = self._connect().execute(sql, params + [limit]).fetchall()
+
+        jobs = []
+        with self._lock:
+            for row in rows:
+                job = self._live.get(row[0]) or _from_row(row)
+                jobs.append(_public(job))
+        return jobs
+
+    def cancel(self, job_id):
+        """请求取消任务：排队中的任务直接取消，运行中的任务在下一次报告进度时停止"""
+        job = self.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return job
+
+        with self._lock:
+            self._cancelled.add(job_id)
+            live = self._live.get(job_id)
+            if live is not None:
+                live['cancel_requested'] = True
+                live['updated_at'] = time.time()
+                self._changed.notify_all()
+
+        # 任务在其他进程中时，由该进程在写入进度时读取此标记
+        conn = self._connect()
+        conn.execute("UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ?", (time.time(), job_id))
+        conn.commit()
+        return self.get(job_id)
+
+    def delete(self, job_id):
+        """删除已结束的任务及其结果文件，任务未结束时返回False"""
+        job = self.get(job_id)
+        if job is None:
+            return True
+        if job['status'] not in FINISHED_STATUSES:
+            return False
+        self._remove(job_id)
+        return True
+
+    def result_file(self, job_id):
+        """已成功任务的结果文件路径"""
+        row = self._connect().execute(
+            "SELECT result_file FROM jobs WHERE id = ? AND status = 'succeeded'", (job_id,)
+        ).fetchone()
+        if row and row[0] and os.path.exists(row[0]):
+            return row[0]
+        return None
+
+    def events(self, job_id=None, keepalive=15, poll_interval=1.0):
+        """任务状态变化的生成器（用于SSE）：有变化时产生任务状态，长时间无变化时产生None（心跳）
+
+        指定 job_id 时先产生一次当前状态，任务结束后停止；否则持续产生所有任务的变化。
+        """
+        seen = {}
+        last_poll = time.time()
+        last_event = time.monotonic()
+
+        if job_id is not None:
+            job = self.get(job_id)
+            if job is None:
+                return
+            yield job
+            if job['status'] in FINISHED_STATUSES:
+                return
+            seen[job_id] = _fingerprint(job)
+
+        while True:
+            with self._lock:
+                self._changed.wait(poll_interval)
+                live = [_public(job) for job in self._live.values() if job_id in (None, job['id'])]
+
+            # 其他进程中的任务、刚结束的任务从数据库读取
+            poll_started = time.time()
+            where = "updated_at >= ?"
+            params = [last_poll - poll_interval]
+            if job_id is not None:
+                where += " AND id = ?"
+                params.append(job_id)
+            rows = self._connect().execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE {where} ORDER BY updated_at", params
+            ).fetchall()
+            last_poll = poll_started
+
+            live_ids = {job['id'] for job in live}
+            changed = live + [_public(_from_row(row)) for row in rows if row[0] not in live_ids]
+            for job in changed:
+                fingerprint = _fingerprint(job)
+                if seen.get(job['id']) == fingerprint:
+                    continue
+                seen[job['id']] = fingerprint
+                last_event = time.monotonic()
+                yield job
+                if job_id is not None and job['status'] in FINISHED_STATUSES:
+                    return
+
+            if time.monotonic() - last_event >= keepalive:
+                last_event = time.monotonic()
+                yield None
+
+    def stats(self):
+        """本进程中排队和运行的任务数"""
+        with self._lock:
+            statuses = [job['status'] for job in self._live.values()]
+        return {'queued': statuses.count('queued'), 'running': statuses.count('running')}
+
+    def _run(self, job_id):
+        # 排队期间可能已由其他进程请求取消
+        row = self._connect().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        with self._lock:
+            if row and row[0]:
+                self._cancelled.add(job_id)
+            job = self._live[job_id]
+            if job_id in self._cancelled:
+                job['status'] = 'cancelled'
+            else:
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+            job['updated_at'] = time.time()
+            self._changed.notify_all()
+
+        if job['status'] == 'cancelled':
+            self._finish(job_id)
+            return
+
+        self._write(job)
+        context = JobContext(self, job_id)
+        try:
+            result = self._handlers[job['kind']](context, job['params'])
+            status, error = 'succeeded', None
+        except JobCancelled:
+            result, status, error = None, 'cancelled', None
+        except Exception as e:
+            result, status, error = None, 'failed', str(e)
+
+        if status != 'succeeded' and context.result_file:
+            _remove_tree(os.path.dirname(context.result_file))
+
+        with self._lock:
+            job['status'] = status
+            job['result'] = result
+            job['error'] = error
+            job['result_file'] = context.result_file if status == 'succeeded' else None
+            job['finished_at'] = time.time()
+            job['updated_at'] = job['finished_at']
+        self._finish(job_id)
+
+    def _finish(self, job_id):
+        with self._lock:
+            job = self._live[job_id]
+            if job['finished_at'] is None:
+                job['finished_at'] = job['updated_at']
+        self._write(job)
+        with self._lock:
+            # 写入数据库之后再移出内存，查询不会看到中间状态
+            self._live.pop(job_id, None)
+            self._cancelled.discard(job_id)
+            self._last_persist.pop(job_id, None)
+            self._changed.notify_all()
+
+    def _update_progress(self, job_id, fields):
+        now = time.time()
+        with self._lock:
+            job = self._live.get(job_id)
+            if job is None:
+                return
+            job['progress'] = dict(job['progress'], **fields)
+            job['updated_at'] = now
+            self._changed.notify_all()
+            if now - self._last_persist.get(job_id, 0) < self.progress_interval:
+                return
+            self._last_persist[job_id] = now
+
+        # 按间隔写入数据库，顺便读取其他进程发来的取消请求
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(job['progress'], ensure_ascii=False), now, job_id)
+        )
+        conn.commit()
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and row[0]:
+            with self._lock:
+                self._cancelled.add(job_id)
+                job['cancel_requested'] = True
+
+    def _cancel_requested(self, job_id):
+        with self._lock:
+            return job_id in self._cancelled
+
+    def _write(self, job, insert=False):
+        with self._lock:
+            values = [
+                job['id'], job['kind'], job['server_id'], job['title'], job['status'],
+                json.dumps(job['params'], ensure_ascii=False),
+                json.dumps(job['progress'], ensure_ascii=False),
+                json.dumps(job['result'], ensure_ascii=False) if job['result'] is not None else None,
+                job['error'], job['result_file'], int(job['cancel_requested']), job['owner'],
+                job['created_at'], job['started_at'], job['finished_at'], job['updated_at']
+            ]
+        conn = self._connect()
+        if insert:
+            conn.execute(f"INSERT INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", values)
+        else:
+            # 不覆盖其他进程写入的取消标记
+            assignments = ', '.join(f"{column} = ?" for column in COLUMNS[1:] if column != 'cancel_requested')
+            conn.execute(
+                f"UPDATE jobs SET {assignments}, cancel_requested = MAX(cancel_requested, ?) WHERE id = ?",
+                [v for column, v in zip(COLUMNS[1:], values[1:]) if column != 'cancel_requested']
+                + [values[COLUMNS.index('cancel_requested')], job['id']]
+            )
+        conn.commit()
+
+    def _remove(self, job_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        conn.commit()
+        _remove_tree(os.path.join(self.result_dir, job_id))
+
+    def _maybe_cleanup(self):
+        """删除超过保留期的已结束任务（每小时最多执行一次）"""
+        now = time.time()
+        if not self.retention or now - self._last_cleanup < 3600:
+            return
+        self._last_cleanup = now
+        rows = self._connect().execute(
+            f"SELECT id FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED_STATUSES))}) AND finished_at < ?",
+            list(FINISHED_STATUSES) + [now - self.retention]
+        ).fetchall()
+        for (job_id,) in rows:
+            self._remove(job_id)
+
+    def _fail_orphans(self, conn):
+        # 本机上已退出的进程留下的未完成任务视为失败（其他仍在运行的进程的任务不受影响）；
+        # 与本进程标识相同的任务来自使用了相同PID的上一个进程（如容器中的PID 1）
+        rows = conn.execute(
+            f"SELECT id, owner FROM jobs WHERE status NOT IN ({', '.join('?' * len(FINISHED_STATUSES))})",
+            FINISHED_STATUSES
+        ).fetchall()
+        now = time.time()
+        for job_id, owner in rows:
+            if owner_gone(owner):
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = '任务被中断（服务重启）', finished_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (now, now, job_id)
+                )
+
+    def _connect(self):
+        return self._db.get()
+
+
+def _from_row(row):
+    job = dict(zip(COLUMNS, row))
+    job['params'] = json.loads(job['params'])
+    job['progress'] = json.loads(job['progress']) if job['progress'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+def _public(job):
+    """对外返回的任务状态（不含内部字段）"""
+    return {
+        'id': job['id'],
+        'kind': job['kind'],
+        'server_id': job['server_id'],
+        'title': job['title'],
+        'status': job['status'],
+        'params': job['params'],
+        'progress': dict(job['progress']),
+        'result': job['result'],
+        'error': job['error'],
+        'has_result_file': bool(job['result_file']),
+        'cancel_requested': job['cancel_requested'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
+
+def _fingerprint(job):
+    return (job['status'], json.dumps(job['progress'], sort_keys=True), job['cancel_requested'])
+
+
+def _remove_tree(path):
+    if not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        try:
+            os.remove(os.path.join(path, name))
+        except OSError:
+            continue
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
@@ -0,0 +1,176 @@
+import time
+from array import array
+
+
+def format_size(size_bytes):
+    """格式化文件大小"""
+    if size_bytes == 0:
+        return "0 B"
+
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = 0
+    while size_bytes >= 1024 and i < len(size_names) - 1:
+        size_bytes /= 1024.0
+        i += 1
+
+    return f"{size_bytes:.1f} {size_names[i]}"
+
+
+class ListingPage:
+    """一次列表结果的紧凑表示
+
+    不为每个对象创建字典：文件夹在前、文件在后只保存对象键，
+    文件大小和修改时间（Unix秒）保存在整数数组中，格式化推迟到输出时。
+    构建后不再修改；首次按 records 格式输出时格式化的字符串保存在页面上，缓存命中时直接复用。
+    """
+
+    __slots__ = ('prefix', 'keys', 'folder_count', 'sizes', 'mtimes', '_formatted')
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.keys = []
+        self.folder_count = 0
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self._formatted = None
+
+    @classmethod
+    def from_pages(cls, pages, prefix='', sort=False):
+        """从 list_objects_v2 的一页或多页结果构建；sort 为 True 时文件夹、文件分别按名称排序"""
+        listing = cls(prefix)
+        folders = []
+        files = []
+        sizes = []
+        mtimes = []
+        prefix_folder = prefix.rstrip('/')
+
+        for page in pages:
+            # 文件夹（CommonPrefixes）
+            for folder in page.get('CommonPrefixes', []):
+                if folder['Prefix'].rstrip('/') != prefix_folder:
+                    folders.append(folder['Prefix'])
+
+            # 文件
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if key != prefix and not key.endswith('/'):
+                    files.append(key)
+                    sizes.append(obj['Size'])
+                    mtimes.append(int(obj['LastModified'].timestamp()))
+
+        if sort:
+            folders.sort(key=_folder_name)
+            order = sorted(range(len(files)), key=lambda i: _file_name(files[i]))
+            files = [files[i] for i in order]
+            sizes = [sizes[i] for i in order]
+            mtimes = [mtimes[i] for i in order]
+
+        listing.keys = folders + files
+        listing.folder_count = len(folders)
+        listing.sizes = array('q', sizes)
+        listing.mtimes = array('q', mtimes)
+        return listing
+
+    def __len__(self):
+        return len(self.keys)
+
+    def slice(self, start, end):
+        """按位置截取（页码模式分页）"""
+        start = max(0, min(start, len(self.keys)))
+        end = max(start, min(end, len(self.keys)))
+        part = ListingPage(self.prefix)
+        part.keys = self.keys[start:end]
+        part.folder_count = max(0, min(end, self.folder_count) - start)
+        file_start = max(start, self.folder_count) - self.folder_count
+        file_end = max(end, self.folder_count) - self.folder_count
+        part.sizes = self.sizes[file_start:file_end]
+        part.mtimes = self.mtimes[file_start:file_end]
+        return part
+
+    def names(self):
+        """显示名称（文件夹和文件分别取最后一段）"""
+        folder_count = self.folder_count
+        return [
+            _folder_name(key) if i < folder_count else _file_name(key)
+            for i, key in enumerate(self.keys)
+        ]
+
+    def to_records(self):
+        """转换为逐个对象的字典列表（原有的列表接口格式）"""
+        names, size_texts, date_texts = self._formatted_columns()
+        folder_count = self.folder_count
+        records = [
+            {'name': name, 'key': key, 'prefix': key, 'type': 'folder'}
+            for name, key in zip(names[:folder_count], self.keys[:folder_count])
+        ]
+        records.extend(
+            {
+                'name': name,
+                'key': key,
+                'size': size_text,
+                'size_bytes': size,
+                'last_modified': date_text,
+                'type': 'file'
+            }
+            for name, key, size_text, size, date_text in zip(
+                names[folder_count:], self.keys[folder_count:], size_texts, self.sizes, date_texts
+            )
+        )
+        return records
+
+    def to_columns(self):
+        """转换为列式格式：names 包含全部条目（前 folder_count 个是文件夹），
+        sizes/mtimes 只对应文件；对象键都等于 prefix + 名称（文件夹再加 '/'）时省略 keys"""
+        names = self.names()
+        prefix_length = len(self.prefix)
+        columns = {
+            'prefix': self.prefix,
+            'folder_count': self.folder_count,
+            'names': names,
+            'sizes': self.sizes.tolist(),
+            'mtimes': self.mtimes.tolist()
+        }
+
+        derivable = all(
+            key.startswith(self.prefix) and len(key) == prefix_length + len(name) + (i < self.folder_count)
+            for i, (key, name) in enumerate(zip(self.keys, names))
+        )
+        if not derivable:
+            columns['keys'] = self.keys
+        return columns
+
+    def _formatted_columns(self):
+        """显示名称、格式化的大小和修改时间；同一页面多次输出时只格式化一次"""
+        formatted = self._formatted
+        if formatted is None:
+            dates = {}
+            formatted = self._formatted = (
+                self.names(),
+                [format_size(size) for size in self.sizes],
+                [_format_timestamp(mtime, dates) for mtime in self.mtimes]
+            )
+        return formatted
+
+    def estimated_size(self):
+        """粗略估算占用的内存字节数（用于列表缓存的内存预算，包括按 records 格式输出后保存的字符串）"""
+        keys_size = sum(57 + len(key) for key in self.keys) + 8 * len(self.keys)
+        return 120 + 2 * keys_size + 16 * len(self.sizes) + 141 * len(self.sizes)
+
+
+def _format_timestamp(seconds, dates):
+    """Unix秒格式化为 UTC 的 YYYY-MM-DD HH:MM:SS；dates 缓存日期部分，同一天的对象只调用一次 strftime"""
+    day, seconds_of_day = divmod(seconds, 86400)
+    date = dates.get(day)
+    if date is None:
+        date = dates[day] = time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+    hours, remainder = divmod(seconds_of_day, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{date} {hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def _file_name(key):
+    return key.rpartition('/')[2]
+
+
+def _folder_name(key):
+    return key.rstrip('/').rpartition('/')[2]
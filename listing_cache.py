@@ -0,0 +1,123 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+
+
+class ListingCache:
+    """对象列表缓存：TTL过期 + 按内存预算的LRU淘汰"""
+
+    def __init__(self, ttl=30, max_bytes=64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size):
+        """写入缓存，超出内存预算时淘汰最久未使用的条目"""
+        if self.ttl <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_key(self, scope, bucket, key):
+        """对象写入/删除后，使能看到该对象的所有前缀列表失效"""
+        return self._invalidate(
+            lambda entry_scope, entry_bucket, entry_prefix:
+                entry_scope == scope and entry_bucket == bucket and key.startswith(entry_prefix)
+        )
+
+    def invalidate_keys(self, scope, bucket, keys):
+        """批量删除后，使能看到其中任一对象的前缀列表失效"""
+        sorted_keys = sorted(keys)
+
+        def has_key_under(prefix):
+            index = bisect.bisect_left(sorted_keys, prefix)
+            return index < len(sorted_keys) and sorted_keys[index].startswith(prefix)
+
+        return self._invalidate(
+            lambda entry_scope, entry_bucket, entry_prefix:
+                entry_scope == scope and entry_bucket == bucket and has_key_under(entry_prefix)
+        )
+
+    def invalidate_tree(self, scope, bucket, prefix):
+        """文件夹删除后，使其祖先前缀及所有子前缀的列表失效"""
+        return self._invalidate(
+            lambda entry_scope, entry_bucket, entry_prefix:
+                entry_scope == scope and entry_bucket == bucket and (
+                    prefix.startswith(entry_prefix) or entry_prefix.startswith(prefix)
+                )
+        )
+
+    def invalidate_scope(self, scope):
+        """使某个服务器的全部缓存失效"""
+        return self._invalidate(lambda entry_scope, entry_bucket, entry_prefix: entry_scope == scope)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """获取命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _invalidate(self, predicate):
+        # 缓存键约定为 (scope, bucket, prefix, ...)
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key[0], key[1], key[2])]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
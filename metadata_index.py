@@ -0,0 +1,511 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from shared_db import ThreadLocalConnection, owner_gone, process_owner
+
+SORT_COLUMNS = {'key': 'objects.key', 'size': 'size', 'last_modified': 'last_modified'}
+
+# 数据库结构版本（PRAGMA user_version）；旧版本的对象表在启动时重建
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_modified TEXT NOT NULL,
+    etag TEXT,
+    storage_class TEXT,
+    ext TEXT NOT NULL,
+    crawl_id INTEGER NOT NULL,
+    UNIQUE (scope, bucket, key)
+);
+CREATE INDEX IF NOT EXISTS idx_objects_size ON objects (scope, bucket, size);
+CREATE INDEX IF NOT EXISTS idx_objects_last_modified ON objects (scope, bucket, last_modified);
+CREATE INDEX IF NOT EXISTS idx_objects_ext ON objects (scope, bucket, ext, key);
+CREATE TABLE IF NOT EXISTS buckets (
+    scope TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    status TEXT NOT NULL,
+    objects INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    generation INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    PRIMARY KEY (scope, bucket)
+);
+"""
+
+# 对象键的三元组全文索引，子串搜索不必扫描整个存储桶（需要 SQLite 3.34+ 的 FTS5 trigram 分词器）
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS object_keys USING fts5(key, content='objects', content_rowid='id', tokenize='trigram');
+CREATE TRIGGER IF NOT EXISTS objects_fts_insert AFTER INSERT ON objects BEGIN
+    INSERT INTO object_keys (rowid, key) VALUES (new.id, new.key);
+END;
+CREATE TRIGGER IF NOT EXISTS objects_fts_delete AFTER DELETE ON objects BEGIN
+    INSERT INTO object_keys (object_keys, rowid, key) VALUES ('delete', old.id, old.key);
+END;
+"""
+
+# 按对象键删除时每条语句的键数量（低于旧版 SQLite 每条语句999个参数的上限）
+REMOVE_BATCH_SIZE = 500
+
+# 全文索引按三个字符切分，更短的搜索词只能逐行匹配
+FTS_MIN_QUERY_LENGTH = 3
+
+UPSERT_OBJECT = """
+INSERT INTO objects (scope, bucket, key, size, last_modified, etag, storage_class, ext, crawl_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (scope, bucket, key) DO UPDATE SET
+    size = excluded.size, last_modified = excluded.last_modified, etag = excluded.etag,
+    storage_class = excluded.storage_class, crawl_id = excluded.crawl_id
+"""
+
+
+class IndexSuperseded(Exception):
+    """爬取期间存储桶索引被删除或被新的全量爬取取代，本次结果不再写入"""
+
+
+class MetadataIndex:
+    """存储桶对象元数据索引（SQLite）：用于整桶搜索、按大小/时间排序和按扩展名筛选
+
+    只有显式建立索引的存储桶才会被收录。首次建立时在后台全量爬取；本应用的写操作
+    会把受影响的前缀标记为待刷新，由后台线程每隔 refresh_interval 秒增量重新列出；
+    每隔 recrawl_interval 秒全量重新爬取一次，以发现其他客户端的修改。
+
+    索引状态全部保存在数据库中，多个进程共享：哪些存储桶已建立索引、谁在爬取都以 buckets 表为准
+    （写入路径使用内存中的副本，每隔 refresh_interval 秒重新加载），
+    同一存储桶同时只有一个进程在全量爬取。每次全量爬取分配新的 generation，写入前核对，
+    爬取期间索引被删除或被新的爬取取代时，旧的爬取不再写入。
+    """
+
+    def __init__(self, db_path='metadata_index.db', refresh_interval=30, recrawl_interval=6 * 3600):
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self.recrawl_interval = recrawl_interval
+        self._db = ThreadLocalConnection(db_path)
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._managers = {}
+        self._refresher = None
+        # 已建立索引的存储桶 -> generation 的内存副本，写入路径据此判断而不查询数据库；
+        # 本进程建立/删除索引时立即更新，其他进程的修改最迟 refresh_interval 秒后重新加载
+        self._indexed = {}
+        self._indexed_loaded_at = None
+
+        conn = self._connect()
+        self._migrate(conn)
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite 未编译 FTS5 或版本过旧，子串搜索退回逐行匹配
+            self.fts = False
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._fail_orphans(conn)
+        conn.commit()
+
+    def is_indexed(self, scope, bucket):
+        """存储桶是否已启用索引（读取内存中的副本）"""
+        with self._lock:
+            if self._indexed_loaded_at is None or time.monotonic() - self._indexed_loaded_at >= self.refresh_interval:
+                self._load_indexed()
+            return (scope, bucket) in self._indexed
+
+    def start_crawl(self, manager, bucket, stale_before=None):
+        """在后台全量爬取存储桶（其他线程或进程已在爬取时直接返回当前状态）
+
+        stale_before 用于定期重新爬取：只有上次爬取完成时间早于它时才发起。
+        """
+        scope = manager.cache_scope
+        with self._lock:
+            self._managers[(scope, bucket)] = manager
+
+        generation = time.time_ns()
+        sql = (
+            "INSERT INTO buckets (scope, bucket, status, started_at, generation, owner) "
+            "VALUES (?, ?, 'crawling', ?, ?, ?) "
+            "ON CONFLICT (scope, bucket) DO UPDATE SET status = 'crawling', started_at = excluded.started_at, "
+            "generation = excluded.generation, owner = excluded.owner, error = NULL "
+            "WHERE buckets.status != 'crawling'"
+        )
+        params = [scope, bucket, time.time(), generation, process_owner()]
+        if stale_before is not None:
+            sql += " AND COALESCE(buckets.finished_at, 0) < ?"
+            params.append(stale_before)
+
+        conn = self._connect()
+        claimed = conn.execute(sql, params).rowcount > 0
+        conn.commit()
+
+        with self._lock:
+            if claimed:
+                self._indexed[(scope, bucket)] = generation
+            else:
+                # 其他线程或进程正在爬取，generation 以数据库为准
+                self._indexed_loaded_at = None
+
+        if claimed:
+            thread = threading.Thread(target=self._run_crawl, args=(manager, bucket, generation), daemon=True)
+            thread.start()
+        self._ensure_refresher()
+        return self.status(scope, bucket)
+
+    def attach(self, manager, bucket):
+        """记录存储桶对应的S3客户端，供后台刷新和定期全量爬取使用"""
+        scope = manager.cache_scope
+        if not self.is_indexed(scope, bucket):
+            return
+        with self._lock:
+            self._managers[(scope, bucket)] = manager
+        self._ensure_refresher()
+
+    def drop(self, scope, bucket):
+        """删除存储桶的索引（正在进行的爬取在写入下一页前发现并停止）"""
+        with self._lock:
+            self._managers.pop((scope, bucket), None)
+            self._indexed.pop((scope, bucket), None)
+            for dirty_key in [k for k in self._dirty if k[:2] == (scope, bucket)]:
+                del self._dirty[dirty_key]
+
+        conn = self._connect()
+        conn.execute("DELETE FROM buckets WHERE scope = ? AND bucket = ?", (scope, bucket))
+        conn.execute("DELETE FROM objects WHERE scope = ? AND bucket = ?", (scope, bucket))
+        conn.commit()
+
+    def status(self, scope, bucket):
+        """获取存储桶索引状态，未建立索引返回None"""
+        row = self._connect().execute(
+            "SELECT status, objects, bytes, started_at, finished_at, error FROM buckets WHERE scope = ? AND bucket = ?",
+            (scope, bucket)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'status': row[0],
+            'objects': row[1],
+            'bytes': row[2],
+            'started_at': row[3],
+            'finished_at': row[4],
+            'error': row[5],
+            'pending_refreshes': sum(1 for k in list(self._dirty) if k[:2] == (scope, bucket))
+        }
+
+    def search(self, scope, bucket, query=None, glob=None, ext=None, prefix=None,
+               sort='key', order='asc', limit=100, offset=0):
+        """在索引中搜索对象，返回 (结果列表, 是否还有更多)
+
+        query 为子串匹配（不区分大小写，三个字符以上走全文索引），glob 为通配符匹配（区分大小写），
+        ext 为扩展名（不含点），prefix 限定在某个前缀下。
+        """
+        if sort not in SORT_COLUMNS:
+            raise Exception(f"不支持的排序字段: {sort}")
+        direction = 'DESC' if order == 'desc' else 'ASC'
+
+        where = ["scope = ?", "bucket = ?"]
+        params = [scope, bucket]
+        if prefix:
+            prefix_where, prefix_params = _prefix_condition(prefix)
+            where.append(prefix_where)
+            params.extend(prefix_params)
+        if ext:
+            where.append("ext = ?")
+            params.append(ext.lower().lstrip('.'))
+        source = "objects"
+        if query and self.fts and len(query) >= FTS_MIN_QUERY_LENGTH:
+            # 从全文索引的匹配结果出发（CROSS JOIN 固定连接顺序），不逐行扫描存储桶
+            source = "object_keys CROSS JOIN objects ON objects.id = object_keys.rowid"
+            where.append("object_keys MATCH ?")
+            params.append('"' + query.replace('"', '""') + '"')
+        elif query:
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where.append("objects.key LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if glob:
+            where.append("objects.key GLOB ?")
+            params.append(glob)
+
+        column = SORT_COLUMNS[sort]
+        # 多取一行用于判断是否还有下一页，避免对大结果集执行 COUNT
+        sql = (
+            f"SELECT objects.key, size, last_modified, etag, storage_class FROM {source} "
+            f"WHERE {' AND '.join(where)} ORDER BY {column} {direction}, objects.key {direction} LIMIT ? OFFSET ?"
+        )
+        rows = self._connect().execute(sql, params + [limit + 1, offset]).fetchall()
+        results = [
+            {
+                'key': row[0],
+                'size': row[1],
+                'last_modified': row[2],
+                'etag': row[3],
+                'storage_class': row[4]
+            }
+            for row in rows[:limit]
+        ]
+        return results, len(rows) > limit
+
+    def mark_dirty(self, manager, bucket, key, recursive=False):
+        """对象写入后，把其所在前缀标记为待刷新（recursive 为 True 时刷新整个子树）"""
+        scope = manager.cache_scope
+        if not self.is_indexed(scope, bucket):
+            return
+        prefix = key if recursive else key[:key.rstrip('/').rfind('/') + 1]
+        with self._lock:
+            self._dirty[(scope, bucket, prefix, recursive)] = manager
+        self.attach(manager, bucket)
+
+    def remove_keys(self, scope, bucket, keys):
+        """对象删除后从索引中移除，存储桶的对象数和总大小减去被删除的行"""
+        if not keys or not self.is_indexed(scope, bucket):
+            return
+        keys = list(keys)
+        conn = self._connect()
+        try:
+            with self._transaction(conn, scope, bucket):
+                for start in range(0, len(keys), REMOVE_BATCH_SIZE):
+                    batch = keys[start:start + REMOVE_BATCH_SIZE]
+                    where = f"objects.key IN ({', '.join('?' * len(batch))})"
+                    self._delete_rows(conn, scope, bucket, where, batch)
+        except IndexSuperseded:
+            return
+
+    def remove_prefix(self, scope, bucket, prefix):
+        """文件夹删除后从索引中移除其全部对象"""
+        if not self.is_indexed(scope, bucket):
+            return
+        where, params = _prefix_condition(prefix)
+        conn = self._connect()
+        try:
+            with self._transaction(conn, scope, bucket):
+                self._delete_rows(conn, scope, bucket, where, params)
+        except IndexSuperseded:
+            return
+
+    def refresh_pending(self):
+        """重新列出所有待刷新的前缀，并对到期的存储桶发起全量爬取"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._load_indexed()
+
+        conn = self._connect()
+        refreshed = set()
+        for (scope, bucket, prefix, recursive), manager in dirty.items():
+            row = conn.execute(
+                "SELECT status, generation FROM buckets WHERE scope = ? AND bucket = ?", (scope, bucket)
+            ).fetchone()
+            # 索引已删除，或正在全量爬取（爬取会覆盖这次修改）
+            if row is None or row[0] == 'crawling':
+                continue
+            try:
+                self._crawl(manager, bucket, prefix, recursive, row[1])
+                refreshed.add((scope, bucket, row[1]))
+            except IndexSuperseded:
+                continue
+            except Exception:
+                # 刷新失败时保留标记，下一轮重试
+                with self._lock:
+                    self._dirty.setdefault((scope, bucket, prefix, recursive), manager)
+
+        # 增量刷新后按行重新统计存储桶的对象数和总大小
+        for scope, bucket, generation in refreshed:
+            try:
+                with self._transaction(conn, scope, bucket, generation):
+                    self._update_totals(conn, scope, bucket)
+            except IndexSuperseded:
+                continue
+
+        if self.recrawl_interval:
+            cutoff = time.time() - self.recrawl_interval
+            stale = conn.execute(
+                "SELECT scope, bucket FROM buckets WHERE status != 'crawling' AND COALESCE(finished_at, 0) < ?",
+                (cutoff,)
+            ).fetchall()
+            for scope, bucket in stale:
+                manager = self._managers.get((scope, bucket))
+                if manager is not None:
+                    self.start_crawl(manager, bucket, stale_before=cutoff)
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh_pending()
+            except Exception:
+                continue
+
+    def _run_crawl(self, manager, bucket, generation):
+        scope = manager.cache_scope
+        conn = self._connect()
+        try:
+            self._crawl(manager, bucket, '', True, generation)
+            with self._transaction(conn, scope, bucket, generation):
+                self._update_totals(conn, scope, bucket)
+                conn.execute(
+                    "UPDATE buckets SET status = 'ready', finished_at = ?, error = NULL WHERE scope = ? AND bucket = ?",
+                    (time.time(), scope, bucket)
+                )
+        except IndexSuperseded:
+            pass
+        except Exception as e:
+            conn.execute(
+                "UPDATE buckets SET status = 'error', error = ?, finished_at = ? "
+                "WHERE scope = ? AND bucket = ? AND generation = ?",
+                (str(e), time.time(), scope, bucket, generation)
+            )
+            conn.commit()
+
+    def _crawl(self, manager, bucket, prefix, recursive, generation):
+        """列出前缀下的对象写入索引，并删除本轮未出现的旧记录
+
+        每页在核对 generation 的同一事务中写入，索引已删除或被新的爬取取代时抛出 IndexSuperseded。
+        """
+        scope = manager.cache_scope
+        crawl_id = time.time_ns()
+        conn = self._connect()
+
+        params = {'Bucket': bucket, 'Prefix': prefix}
+        if not recursive:
+            params['Delimiter'] = '/'
+
+        paginator = manager.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(**params):
+            rows = [
+                (
+                    scope, bucket, obj['Key'], obj['Size'],
+                    obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S'),
+                    obj.get('ETag', '').strip('"'), obj.get('StorageClass'),
+                    _extension(obj['Key']), crawl_id
+                )
+                for obj in page.get('Contents', [])
+                if not obj['Key'].endswith('/')
+            ]
+            with self._transaction(conn, scope, bucket, generation):
+                conn.executemany(UPSERT_OBJECT, rows)
+
+        where, where_params = _prefix_condition(prefix)
+        if not recursive:
+            # 只列出了直接子对象，只清理这一层
+            where += " AND instr(substr(key, ?), '/') = 0"
+            where_params.append(len(prefix) + 1)
+        with self._transaction(conn, scope, bucket, generation):
+            conn.execute(
+                f"DELETE FROM objects WHERE scope = ? AND bucket = ? AND {where} AND crawl_id != ?",
+                [scope, bucket] + where_params + [crawl_id]
+            )
+
+    @contextmanager
+    def _transaction(self, conn, scope, bucket, generation=None):
+        """写事务：先取得写锁并核对存储桶的 generation，不一致时回滚并抛出 IndexSuperseded
+
+        generation 为 None 时只要求存储桶仍有索引。
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT generation FROM buckets WHERE scope = ? AND bucket = ?", (scope, bucket)
+            ).fetchone()
+            if row is None or (generation is not None and row[0] != generation):
+                raise IndexSuperseded()
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _delete_rows(self, conn, scope, bucket, where, params):
+        """删除匹配的行，并从存储桶的对象数和总大小中减去这些行（只统计被删除的行，不重新统计整个存储桶）"""
+        params = [scope, bucket] + list(params)
+        objects, total_bytes = conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE scope = ? AND bucket = ? AND {where}",
+            params
+        ).fetchone()
+        if not objects:
+            return
+        conn.execute(f"DELETE FROM objects WHERE scope = ? AND bucket = ? AND {where}", params)
+        conn.execute(
+            "UPDATE buckets SET objects = MAX(objects - ?, 0), bytes = MAX(bytes - ?, 0) WHERE scope = ? AND bucket = ?",
+            (objects, total_bytes, scope, bucket)
+        )
+
+    def _load_indexed(self):
+        # 调用方持有 self._lock
+        rows = self._connect().execute("SELECT scope, bucket, generation FROM buckets").fetchall()
+        self._indexed = {(scope, bucket): generation for scope, bucket, generation in rows}
+        self._indexed_loaded_at = time.monotonic()
+
+    def _update_totals(self, conn, scope, bucket):
+        """按索引中的行重新统计存储桶的对象数和总大小"""
+        objects, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects WHERE scope = ? AND bucket = ?",
+            (scope, bucket)
+        ).fetchone()
+        conn.execute(
+            "UPDATE buckets SET objects = ?, bytes = ? WHERE scope = ? AND bucket = ?",
+            (objects, total_bytes, scope, bucket)
+        )
+
+    def _migrate(self, conn):
+        """升级旧版本的数据库：对象表可以从S3重新爬取，直接重建；已建立索引的存储桶保留，等待重新爬取"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if version >= SCHEMA_VERSION or 'buckets' not in tables:
+            return
+        conn.execute("DROP TABLE IF EXISTS objects")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(buckets)")}
+        if 'generation' not in columns:
+            conn.execute("ALTER TABLE buckets ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+        if 'owner' not in columns:
+            conn.execute("ALTER TABLE buckets ADD COLUMN owner TEXT")
+        conn.execute(
+            "UPDATE buckets SET status = 'error', error = '索引格式已更新，需要重新爬取', "
+            "objects = 0, bytes = 0, finished_at = NULL"
+        )
+        conn.commit()
+
+    def _fail_orphans(self, conn):
+        # 本机上已退出的进程留下的未完成爬取视为失败（其他仍在运行的进程的爬取不受影响）
+        rows = conn.execute(
+            "SELECT scope, bucket, owner FROM buckets WHERE status = 'crawling'"
+        ).fetchall()
+        for scope, bucket, owner in rows:
+            if owner_gone(owner):
+                conn.execute(
+                    "UPDATE buckets SET status = 'error', error = '爬取被中断' WHERE scope = ? AND bucket = ?",
+                    (scope, bucket)
+                )
+
+    def _connect(self):
+        return self._db.get()
+
+
+def _extension(key):
+    name = key.rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+
+
+def _prefix_upper_bound(prefix):
+    """前缀范围的上界（不含），使前缀查询可以走主键索引"""
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _prefix_condition(prefix):
+    upper = _prefix_upper_bound(prefix)
+    if upper is None:
+        return "1 = 1", []
+    return "objects.key >= ? AND objects.key < ?", [prefix, upper]
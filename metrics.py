@@ -0,0 +1,235 @@
+"""进程内指标，按 Prometheus 文本格式输出（不依赖 prometheus_client）
+
+记录一次观测只需一次加锁和一次二分查找，可以在热路径上常开。
+多进程部署时每个进程各自统计，需分别抓取。
+"""
+import bisect
+import threading
+import time
+
+from request_timing import record_s3_request
+
+# 延迟直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """返回 [(名称后缀, 标签字典, 值)]"""
+        with self._lock:
+            items = list(self._values.items())
+        return [('', dict(zip(self.labelnames, labels)), value) for labels, value in items]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """分桶统计的分布（如延迟），输出累计桶计数、总和与次数"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # [各桶计数（最后一个为 +Inf）, 总和]
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+
+        samples = []
+        for labels, counts, total in items:
+            label_dict = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', dict(label_dict, le=_format_bound(bound)), cumulative))
+            samples.append(('_sum', label_dict, total))
+            samples.append(('_count', label_dict, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """指标注册表；collector 为抓取时调用的函数，返回 [(名称, 类型, 说明, [(标签字典, 值)])]"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception:
+                # 某个统计项出错不影响其他指标的输出
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    's3finder_http_request_duration_seconds', 'HTTP请求处理耗时（秒）', ('method', 'route'))
+HTTP_RESPONSES = REGISTRY.counter(
+    's3finder_http_responses_total', 'HTTP响应数', ('method', 'route', 'status'))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    's3finder_http_requests_in_flight', '正在处理的HTTP请求数')
+
+S3_REQUEST_SECONDS = REGISTRY.histogram(
+    's3finder_s3_request_duration_seconds', 'S3请求耗时（秒，含重试）', ('operation',))
+S3_IN_FLIGHT = REGISTRY.gauge(
+    's3finder_s3_requests_in_flight', '正在进行的S3请求数', ('operation',))
+S3_ERRORS = REGISTRY.counter(
+    's3finder_s3_errors_total', 'S3请求错误数（按错误码）', ('operation', 'code'))
+S3_BYTES_SENT = REGISTRY.counter(
+    's3finder_s3_sent_bytes_total', '发送到S3的字节数（上传）', ('operation',))
+S3_BYTES_RECEIVED = REGISTRY.counter(
+    's3finder_s3_received_bytes_total', '从S3接收的字节数（下载，按响应长度计）', ('operation',))
+
+
+def instrument_s3_client(client):
+    """通过 botocore 事件为S3客户端的每个操作计时、计数（同时计入当前请求的 Server-Timing）；同步客户端和 aiobotocore 客户端都适用"""
+    events = client.meta.events
+    events.register('before-call.s3', _before_call)
+    events.register('before-send.s3', _before_send)
+    events.register('after-call.s3', _after_call)
+    events.register('after-call-error.s3', _after_call_error)
+    return client
+
+
+# botocore 事件处理函数必须返回 None，否则会被当作短路响应
+
+def _before_call(event_name, context, **kwargs):
+    operation = event_name.rsplit('.', 1)[-1]
+    context['metrics_started_at'] = time.perf_counter()
+    S3_IN_FLIGHT.inc((operation,))
+
+
+def _before_send(event_name, request, **kwargs):
+    # 每次尝试（含重试）都会触发；分块编码上传时 Content-Length 不是原始大小
+    size = request.headers.get('X-Amz-Decoded-Content-Length') or request.headers.get('Content-Length')
+    if size:
+        S3_BYTES_SENT.inc((event_name.rsplit('.', 1)[-1],), int(size))
+
+
+def _after_call(event_name, http_response, parsed, context, **kwargs):
+    operation = event_name.rsplit('.', 1)[-1]
+    _finish(operation, context)
+    size = http_response.headers.get('content-length')
+    if size:
+        S3_BYTES_RECEIVED.inc((operation,), int(size))
+    if http_response.status_code >= 300:
+        code = parsed.get('Error', {}).get('Code') or str(http_response.status_code)
+        S3_ERRORS.inc((operation, code))
+
+
+def _after_call_error(event_name, exception, context, **kwargs):
+    operation = event_name.rsplit('.', 1)[-1]
+    _finish(operation, context)
+    # 连接失败、超时等没有S3错误码，按异常类型统计
+    S3_ERRORS.inc((operation, type(exception).__name__))
+
+
+def _finish(operation, context):
+    started_at = context.pop('metrics_started_at', None)
+    if started_at is None:
+        return
+    elapsed = time.perf_counter() - started_at
+    S3_IN_FLIGHT.dec((operation,))
+    S3_REQUEST_SECONDS.observe((operation,), elapsed)
+    # 计入当前请求的 Server-Timing
+    record_s3_request(elapsed)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
@@ -0,0 +1,431 @@
+"""对象内容的磁盘缓存：反复下载、预览的热点小对象直接从本地磁盘读取
+
+按 服务器/存储桶/对象键 缓存对象内容和元数据（ETag、类型、大小、修改时间）。总大小超出字节预算时
+淘汰最久未使用的对象，超过 max_object_bytes 的对象不缓存，避免少数大文件挤掉大量热点小文件。
+缓存的对象在 fresh_for 秒内直接使用，之后由调用方用 If-None-Match 向S3重新验证，
+对象未变化时S3返回304，不传输内容。
+
+每个对象保存为两个文件：<哈希>.json 记录元数据和内容文件名，<哈希>-<随机后缀>.obj 是内容。
+替换内容时先写新的内容文件再替换元数据文件，正在读取旧内容的请求不受影响。
+多个进程可以共享缓存目录，以元数据文件为准，内存中的索引只用于LRU排序和统计；
+按前缀或服务器失效时扫描目录中的元数据文件，其他进程缓存的对象同样会被删除。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# 启动时超过此时间（秒）的临时文件和无主内容文件视为遗留文件删除，较新的可能属于其他进程正在进行的写入
+STALE_FILE_AGE = 3600
+
+
+class CachedObject:
+    """缓存中的一个对象，内容文件已打开，使用后需关闭"""
+
+    __slots__ = ('name', 'path', 'file', 'etag', 'size', 'content_type', 'last_modified', 'validated_at')
+
+    def __init__(self, name, path, file, meta, validated_at):
+        self.name = name
+        self.path = path
+        self.file = file
+        self.etag = meta['etag']
+        self.size = meta['size']
+        self.content_type = meta.get('content_type')
+        self.last_modified = meta.get('last_modified')
+        self.validated_at = validated_at
+
+    def head(self):
+        """与 head_object 返回值形式相同的元数据"""
+        return {
+            'ETag': self.etag,
+            'ContentLength': self.size,
+            'ContentType': self.content_type,
+            'LastModified': (
+                datetime.fromtimestamp(self.last_modified, timezone.utc) if self.last_modified is not None else None
+            )
+        }
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CacheWriter:
+    """把一个对象的内容写入缓存：全部写完且大小与元数据一致时才生效"""
+
+    def __init__(self, cache, scope, bucket, key, head):
+        self.cache = cache
+        self.scope = scope
+        self.bucket = bucket
+        self.key = key
+        self.meta = {
+            'scope': scope,
+            'bucket': bucket,
+            'key': key,
+            'etag': head.get('ETag'),
+            'size': head['ContentLength'],
+            'content_type': head.get('ContentType'),
+            'last_modified': head['LastModified'].timestamp() if head.get('LastModified') else None
+        }
+        self.written = 0
+        fd, self._temp_path = tempfile.mkstemp(suffix='.tmp', dir=cache.directory)
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self._file.write(data)
+        self.written += len(data)
+
+    def commit(self):
+        """写入完成，返回已打开的 CachedObject；内容不完整时放弃写入并返回None"""
+        self._file.close()
+        if self.written != self.meta['size']:
+            self.abort()
+            return None
+        return self.cache._commit(self.scope, self.bucket, self.key, self.meta, self._temp_path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+    def tee(self, chunks):
+        """转发数据块的同时写入缓存；迭代提前结束（如客户端断开）时放弃写入"""
+        completed = False
+        try:
+            for chunk in chunks:
+                self.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                entry = self.commit()
+                if entry is not None:
+                    entry.close()
+            else:
+                self.abort()
+
+
+class ObjectCache:
+    """磁盘对象缓存，max_bytes 为0时关闭
+
+    失效接口与 ListingCache 相同（invalidate_key/invalidate_keys/invalidate_tree/invalidate_scope），
+    S3ClientManager 的写操作会直接调用。
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_object_bytes=32 * 1024 * 1024, fresh_for=30):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.fresh_for = fresh_for
+        # {名称: (作用域, 存储桶, 对象键, 大小)}，按最近使用排序
+        self._entries = OrderedDict()
+        # 本进程重新验证过的时间：{名称: (内容文件名, 时间)}
+        self._validated = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.stores = 0
+        self.evictions = 0
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def admits(self, size):
+        """该大小的对象是否可以缓存"""
+        return self.enabled and size is not None and size <= min(self.max_object_bytes, self.max_bytes)
+
+    def get(self, scope, bucket, key):
+        """打开缓存的对象，未缓存时返回None；返回的对象可能已超过新鲜期，见 is_fresh"""
+        if not self.enabled:
+            return None
+        entry = self._open(self._name(scope, bucket, key))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def contains(self, scope, bucket, key):
+        """是否已缓存（不打开、不计入命中统计）"""
+        return self.enabled and os.path.exists(os.path.join(self.directory, self._name(scope, bucket, key) + '.json'))
+
+    def is_fresh(self, entry):
+        """是否可以不经S3验证直接使用"""
+        return time.time() - entry.validated_at < self.fresh_for
+
+    def mark_validated(self, entry):
+        """S3确认对象未变化（304）后调用"""
+        now = time.time()
+        entry.validated_at = now
+        with self._lock:
+            self._validated[entry.name] = (os.path.basename(entry.path), now)
+            self.revalidations += 1
+
+    def writer(self, scope, bucket, key, head):
+        """按 head（get_object/head_object 的返回值）创建写入器，对象大小不允许缓存时返回None"""
+        if not self.admits(head.get('ContentLength')):
+            return None
+        return CacheWriter(self, scope, bucket, key, head)
+
+    def tee(self, scope, bucket, key, head, chunks):
+        """转发数据块的同时写入缓存
+
+        写入器（临时文件）在第一次迭代时才创建：响应体没有被读取时（如HEAD请求、发送前客户端已断开）
+        不会留下打开的文件。
+        """
+        writer = self.writer(scope, bucket, key, head)
+        if writer is None:
+            yield from chunks
+            return
+        yield from writer.tee(chunks)
+
+    def put(self, scope, bucket, key, head, data):
+        """缓存已读入内存的完整对象"""
+        writer = self.writer(scope, bucket, key, head)
+        if writer is None:
+            return False
+        writer.write(data)
+        entry = writer.commit()
+        if entry is None:
+            return False
+        entry.close()
+        return True
+
+    def invalidate_key(self, scope, bucket, key):
+        """对象写入/删除后删除其缓存"""
+        self._remove(self._name(scope, bucket, key))
+        return 1
+
+    def invalidate_keys(self, scope, bucket, keys):
+        for key in keys:
+            self._remove(self._name(scope, bucket, key))
+        return len(keys)
+
+    def invalidate_tree(self, scope, bucket, prefix):
+        """删除前缀下所有对象的缓存"""
+        return self._remove_matching(
+            lambda entry_scope, entry_bucket, entry_key:
+                entry_scope == scope and entry_bucket == bucket and entry_key.startswith(prefix)
+        )
+
+    def invalidate_scope(self, scope):
+        """删除某个服务器的全部缓存"""
+        return self._remove_matching(lambda entry_scope, entry_bucket, entry_key: entry_scope == scope)
+
+    def clear(self):
+        """清空缓存"""
+        return self._remove_matching(lambda entry_scope, entry_bucket, entry_key: True)
+
+    def stats(self):
+        """获取命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'max_object_bytes': self.max_object_bytes,
+                'fresh_for': self.fresh_for,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'revalidations': self.revalidations,
+                'stores': self.stores,
+                'evictions': self.evictions
+            }
+
+    def _open(self, name):
+        meta_path = os.path.join(self.directory, name + '.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            path = os.path.join(self.directory, meta['data'])
+            file = open(path, 'rb')
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._forget(name)
+            return None
+
+        with self._lock:
+            # 其他进程可能已缓存或替换了该对象（大小可能不同），按元数据文件更新字节统计
+            known = self._entries.get(name)
+            if known is None or known[3] != meta['size']:
+                if known is not None:
+                    self._bytes -= known[3]
+                self._entries[name] = (meta['scope'], meta['bucket'], meta['key'], meta['size'])
+                self._bytes += meta['size']
+            self._entries.move_to_end(name)
+            validated_at = meta['stored_at']
+            data_name, revalidated_at = self._validated.get(name, (None, 0))
+            if data_name == meta['data']:
+                validated_at = max(validated_at, revalidated_at)
+
+        # 更新修改时间，重启后仍能按使用顺序淘汰
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return CachedObject(name, path, file, meta, validated_at)
+
+    def _commit(self, scope, bucket, key, meta, temp_path):
+        name = self._name(scope, bucket, key)
+        meta_path = os.path.join(self.directory, name + '.json')
+        data_name = f"{name}-{uuid.uuid4().hex[:8]}.obj"
+        previous = self._read_data_name(meta_path)
+
+        meta = dict(meta, data=data_name, stored_at=time.time())
+        fd, meta_temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            os.replace(temp_path, os.path.join(self.directory, data_name))
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(meta_temp_path, meta_path)
+        except BaseException:
+            for path in (temp_path, meta_temp_path, os.path.join(self.directory, data_name)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            raise
+        if previous and previous != data_name:
+            _remove_file(os.path.join(self.directory, previous))
+
+        entry = self._open(name)
+        with self._lock:
+            self.stores += 1
+            if name in self._entries:
+                self._bytes -= self._entries.pop(name)[3]
+            self._entries[name] = (scope, bucket, key, meta['size'])
+            self._bytes += meta['size']
+            evicted = []
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                oldest, (_, _, _, size) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self._validated.pop(oldest, None)
+                self.evictions += 1
+                evicted.append(oldest)
+        for oldest in evicted:
+            self._delete_files(oldest)
+        return entry
+
+    def _remove(self, name):
+        with self._lock:
+            self._forget(name)
+        self._delete_files(name)
+
+    def _remove_matching(self, predicate):
+        """按缓存目录中的元数据文件匹配：其他进程缓存的对象不在本进程的索引中，也要删除"""
+        with self._lock:
+            known = {name: entry[:3] for name, entry in self._entries.items()}
+
+        names = []
+        for file_entry in os.scandir(self.directory):
+            if not file_entry.name.endswith('.json'):
+                continue
+            name = file_entry.name[:-len('.json')]
+            # 名称由作用域、存储桶和对象键的哈希得到，本进程已知的条目不必读取元数据文件
+            identity = known.get(name)
+            if identity is None:
+                try:
+                    with open(file_entry.path, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    identity = (meta['scope'], meta['bucket'], meta['key'])
+                except (OSError, ValueError, KeyError):
+                    continue
+            if predicate(*identity):
+                names.append(name)
+
+        with self._lock:
+            for name in names:
+                self._forget(name)
+        for name in names:
+            self._delete_files(name)
+        return len(names)
+
+    def _forget(self, name):
+        # 调用方需持有 self._lock
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+        self._validated.pop(name, None)
+
+    def _delete_files(self, name):
+        # 先删元数据文件，其他进程随即视为未缓存；已打开内容文件的读取不受影响
+        meta_path = os.path.join(self.directory, name + '.json')
+        data_name = self._read_data_name(meta_path)
+        _remove_file(meta_path)
+        if data_name:
+            _remove_file(os.path.join(self.directory, data_name))
+
+    def _read_data_name(self, meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('data')
+        except (OSError, ValueError):
+            return None
+
+    def _load(self):
+        """启动时按修改时间重建LRU顺序，清理遗留的临时文件和无主内容文件"""
+        now = time.time()
+        metas = []
+        others = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    metas.append((entry.stat().st_mtime, entry.name[:-len('.json')], meta))
+                except (OSError, ValueError):
+                    continue
+            else:
+                others.append(entry)
+
+        referenced = set()
+        for _, name, meta in sorted(metas, key=lambda item: item[0]):
+            if not meta.get('data') or not os.path.exists(os.path.join(self.directory, meta['data'])):
+                continue
+            referenced.add(meta['data'])
+            self._entries[name] = (meta['scope'], meta['bucket'], meta['key'], meta['size'])
+            self._bytes += meta['size']
+
+        for entry in others:
+            if entry.name in referenced:
+                continue
+            try:
+                if now - entry.stat().st_mtime > STALE_FILE_AGE:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+    def _name(self, scope, bucket, key):
+        raw = '\0'.join((scope, bucket, key)).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
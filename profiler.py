@@ -0,0 +1,89 @@
+"""单个请求的采样分析器
+
+后台线程按固定间隔读取目标线程的调用栈并计数，结果保存为 folded stacks 格式
+（每行 "调用栈;...;最内层函数 次数"），可用 speedscope 或 flamegraph.pl 查看。
+采样不修改被分析的代码，开销与采样间隔成正比，只在明确请求时开启。
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+class SamplingProfiler:
+    """采样指定线程的调用栈"""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_at = None
+        self.duration = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.perf_counter() - self._started_at
+
+    def folded(self):
+        """folded stacks 格式的文本，按采样次数从多到少排列"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.samples.most_common())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[tuple(stack)] += 1
+            self.sample_count += 1
+
+
+def profile_filename(label):
+    """生成分析结果文件名（时间-标签-随机后缀.folded）"""
+    safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label).strip('_')[:80]
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{uuid.uuid4().hex[:8]}.folded"
+
+
+def write_profile(profiler, directory, filename, max_files=200):
+    """把分析结果写入目录；目录中的文件超过 max_files 时删除最早的"""
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{filename}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(profiler.folded())
+    os.replace(temp_path, os.path.join(directory, filename))
+
+    _prune(directory, max_files)
+
+
+def _prune(directory, max_files):
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.name.endswith('.folded')]
+    except OSError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            continue
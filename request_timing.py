@@ -0,0 +1,94 @@
+"""按请求统计耗时构成，输出 Server-Timing 响应头
+
+每个请求的耗时分为：
+    s3         S3请求（由 botocore 事件记录，含重试；读取响应体的部分由调用方用 phase('s3') 记录）
+    serialize  JSON序列化
+    disk       临时文件、磁盘缓存的读写
+    app        其余的本地处理（排序、格式化等），等于总耗时减去以上各项
+
+统计对象保存在 contextvars 中，同一请求的线程（Flask）或任务（ASGI）内有效；
+线程池中并行发起的S3请求不计入，其等待时间会计入 app。
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+PHASES = ('s3', 'serialize', 'disk')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """一个请求的耗时统计"""
+
+    __slots__ = ('started_at', 'durations', 's3_requests', 'active')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.s3_requests = 0
+        # 正在计时的阶段；阶段嵌套时只计最外层，避免重复计算
+        self.active = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def header_value(self):
+        """Server-Timing 响应头的值（毫秒）"""
+        total = self.elapsed()
+        app_time = max(0.0, total - sum(self.durations.values()))
+        s3 = _metric('s3', self.durations['s3'])
+        if self.s3_requests:
+            s3 += f';desc="requests={self.s3_requests}"'
+        return ', '.join([
+            s3,
+            _metric('app', app_time),
+            _metric('serialize', self.durations['serialize']),
+            _metric('disk', self.durations['disk']),
+            _metric('total', total)
+        ])
+
+
+def begin_request():
+    """开始统计当前请求"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def end_request():
+    _current.set(None)
+
+
+def current_timings():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """把代码块的耗时计入指定阶段"""
+    timings = _current.get()
+    if timings is None or timings.active is not None:
+        yield
+        return
+
+    timings.active = name
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active = None
+        timings.durations[name] += time.perf_counter() - started_at
+
+
+def record_s3_request(seconds):
+    """记录一次S3请求的耗时（由 botocore 事件调用）"""
+    timings = _current.get()
+    if timings is None or timings.active is not None:
+        return
+    timings.durations['s3'] += seconds
+    timings.s3_requests += 1
+
+
+def _metric(name, seconds):
+    return f"{name};dur={seconds * 1000:.1f}"
@@ -1,29 +1,141 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 import os
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from urllib.parse import quote
+from listing import ListingPage, format_size
+from metrics import instrument_s3_client
+
+# S3分片上传限制：除最后一片外每片至少5MB，最多10000片
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# delete_objects 每次最多删除1000个对象
+DELETE_BATCH_SIZE = 1000
+
+# copy_object 单次最多复制5GB，更大的对象用 upload_part_copy 分片复制
+MAX_COPY_SIZE = 5 * 1024 * 1024 * 1024
+COPY_PART_SIZE = 512 * 1024 * 1024
+
+
+# 默认连接参数（botocore默认连接池只有10个连接）
+DEFAULT_TRANSPORT = {
+    'max_pool_connections': 50,
+    'connect_timeout': 10,
+    'read_timeout': 60,
+    'retry_mode': 'standard',
+    'max_attempts': 5,
+    'tcp_keepalive': True
+}
+
+
+class InvalidRangeError(Exception):
+    """请求的字节范围超出对象大小"""
+
+
+class InvalidCursorError(Exception):
+    """分页游标无法解析（格式错误或被篡改）"""
+
+
+class ObjectNotFoundError(Exception):
+    """对象不存在（可能已被其他客户端删除）"""
+
+
+class NotModifiedError(Exception):
+    """条件请求命中：对象自上次获取后未修改"""
+
+    def __init__(self, etag=None):
+        super().__init__("对象未修改")
+        self.etag = etag
+
+
+def raise_for_get_object_error(error, byte_range=None):
+    """将 get_object 的 ClientError 转换为对应的异常"""
+    code = error.response.get('Error', {}).get('Code')
+    if code == 'InvalidRange':
+        raise InvalidRangeError(f"请求范围无效: {byte_range}")
+    if code in ('304', 'NotModified'):
+        headers = error.response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+        raise NotModifiedError(headers.get('etag'))
+    if code in ('404', 'NoSuchKey', 'NotFound'):
+        raise ObjectNotFoundError(f"下载文件失败: {str(error)}")
+    raise Exception(f"下载文件失败: {str(error)}")
+
+
+def raise_for_head_object_error(error):
+    """将 head_object 的 ClientError 转换为对应的异常"""
+    if error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+        raise ObjectNotFoundError(f"获取对象信息失败: {str(error)}")
+    raise Exception(f"获取对象信息失败: {str(error)}")
+
 
 class S3ClientManager:
-    def __init__(self, access_key, secret_key, endpoint_url, region='us-east-1'):
+    def __init__(self, access_key, secret_key, endpoint_url, region='us-east-1', listing_cache=None, transport=None,
+                 metadata_index=None, usage_cache=None, object_cache=None):
         self.access_key = access_key
         self.secret_key = secret_key
         self.endpoint_url = endpoint_url
         self.region = region
+        self.listing_cache = listing_cache
+        self.metadata_index = metadata_index
+        self.usage_cache = usage_cache
+        self.object_cache = object_cache
+        self.transport = dict(DEFAULT_TRANSPORT, **(transport or {}))
+        # 缓存作用域：同一服务器（端点+凭证）共享列表缓存
+        self.cache_scope = f"{endpoint_url}|{access_key}"
         self.client = self._create_client()
 
     def _create_client(self):
         """创建S3客户端"""
         try:
-            return boto3.client(
+            config = Config(
+                max_pool_connections=self.transport['max_pool_connections'],
+                connect_timeout=self.transport['connect_timeout'],
+                read_timeout=self.transport['read_timeout'],
+                retries={
+                    'mode': self.transport['retry_mode'],
+                    'max_attempts': self.transport['max_attempts']
+                },
+                tcp_keepalive=self.transport['tcp_keepalive']
+            )
+            client = boto3.client(
                 's3',
                 aws_access_key_id=self.access_key,
                 aws_secret_access_key=self.secret_key,
                 endpoint_url=self.endpoint_url,
-                region_name=self.region
+                region_name=self.region,
+                config=config
             )
+            return instrument_s3_client(client)
         except Exception as e:
             raise Exception(f"创建S3客户端失败: {str(e)}")
 
+    def pool_stats(self):
+        """获取底层连接池的使用情况（依赖botocore内部结构，获取失败时返回空列表）"""
+        try:
+            manager = self.client._endpoint.http_session._manager
+            stats = []
+            for pool_key in list(manager.pools.keys()):
+                pool = manager.pools.get(pool_key)
+                if pool is None:
+                    continue
+                max_size = pool.pool.maxsize
+                in_use = max_size - pool.pool.qsize()
+                stats.append({
+                    'host': pool.host,
+                    'max_size': max_size,
+                    'in_use': in_use,
+                    'saturation': round(in_use / max_size, 4) if max_size else 0.0,
+                    'connections_created': pool.num_connections,
+                    'requests': pool.num_requests
+                })
+            return stats
+        except AttributeError:
+            return []
+
     def list_buckets(self):
         """列出所有存储桶"""
         try:
@@ -38,53 +150,269 @@ class S3ClientManager:
         except ClientError as e:
             raise Exception(f"列出存储桶失败: {str(e)}")
 
-    def list_objects(self, bucket_name, prefix='', delimiter='/'):
-        """列出存储桶中的对象"""
+    def list_objects(self, bucket_name, prefix='', delimiter='/', use_cache=True):
+        """列出存储桶中的对象，返回 ListingPage"""
+        cache_key = (self.cache_scope, bucket_name, prefix, 'all', delimiter)
+        if use_cache and self.listing_cache:
+            cached = self.listing_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         try:
             paginator = self.client.get_paginator('list_objects_v2')
             pages = paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter=delimiter)
+            listing = ListingPage.from_pages(pages, prefix, sort=True)
+            if self.listing_cache:
+                self.listing_cache.set(cache_key, listing, listing.estimated_size())
+            return listing
+        except ClientError as e:
+            raise Exception(f"列出对象失败: {str(e)}")
 
-            folders = []
-            files = []
+    def list_objects_page(self, bucket_name, prefix='', delimiter='/', max_keys=100, cursor=None,
+                          start_after=None, use_cache=True):
+        """按游标分页列出对象，每页只请求一次S3"""
+        cache_key = (self.cache_scope, bucket_name, prefix, 'page', delimiter, max_keys, cursor, start_after)
+        if use_cache and self.listing_cache:
+            cached = self.listing_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-            for page in pages:
-                # 文件夹（CommonPrefixes）
-                for folder in page.get('CommonPrefixes', []):
-                    folder_name = folder['Prefix'].rstrip('/')
-                    if folder_name != prefix.rstrip('/'):
-                        folders.append({
-                            'name': os.path.basename(folder_name),
-                            'key': folder['Prefix'],
-                            'prefix': folder['Prefix'],
-                            'type': 'folder'
-                        })
-
-                # 文件
-                for obj in page.get('Contents', []):
-                    if obj['Key'] != prefix and not obj['Key'].endswith('/'):
-                        files.append({
-                            'name': os.path.basename(obj['Key']),
-                            'key': obj['Key'],
-                            'size': self._format_size(obj['Size']),
-                            'last_modified': obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S'),
-                            'type': 'file'
-                        })
+        try:
+            params = self._page_params(bucket_name, prefix, delimiter, max_keys, cursor, start_after)
+            page = self.client.list_objects_v2(**params)
+            result = self._parse_page(page, prefix)
+            if self.listing_cache:
+                self.listing_cache.set(cache_key, result, result[0].estimated_size())
+            return result
+        except ClientError as e:
+            raise Exception(f"列出对象失败: {str(e)}")
+
+    def _page_params(self, bucket_name, prefix, delimiter, max_keys, cursor, start_after):
+        """根据游标生成 list_objects_v2 参数"""
+        params = {
+            'Bucket': bucket_name,
+            'Prefix': prefix,
+            'Delimiter': delimiter,
+            'MaxKeys': max_keys
+        }
+        state = self._decode_cursor(cursor)
+        if state.get('token'):
+            params['ContinuationToken'] = state['token']
+        elif state.get('after') or start_after:
+            params['StartAfter'] = state.get('after') or start_after
+        return params
+
+    def _parse_page(self, page, prefix):
+        """将一页 list_objects_v2 结果转换为 (ListingPage, 下一页游标)"""
+        next_cursor = None
+        if page.get('IsTruncated') and page.get('NextContinuationToken'):
+            next_cursor = self._encode_cursor({'token': page['NextContinuationToken']})
+
+        # S3按字典序返回，页内保持文件夹在前
+        return ListingPage.from_pages([page], prefix), next_cursor
+
+    def _encode_cursor(self, state):
+        """将分页状态编码为不透明游标"""
+        raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
 
-            return sorted(folders, key=lambda x: x['name']) + sorted(files, key=lambda x: x['name'])
+    def _decode_cursor(self, cursor):
+        """解析游标，空游标表示第一页"""
+        if not cursor:
+            return {}
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        except (ValueError, TypeError):
+            raise InvalidCursorError("无效的分页游标")
+        if not isinstance(state, dict) or not all(
+            isinstance(state.get(name), str) for name in ('token', 'after') if name in state
+        ):
+            raise InvalidCursorError("无效的分页游标")
+        return state
+
+    def iter_objects(self, bucket_name, prefix=''):
+        """递归遍历前缀下的所有对象（惰性分页，不一次性加载）"""
+        try:
+            paginator = self.client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                for obj in page.get('Contents', []):
+                    yield obj
         except ClientError as e:
             raise Exception(f"列出对象失败: {str(e)}")
 
-    def upload_file(self, bucket_name, file_path, object_name=None):
-        """上传文件"""
+    def upload_file(self, bucket_name, file_path, object_name=None, callback=None):
+        """上传文件；callback 在每次传输一部分数据后以本次字节数调用（抛出异常可中止上传）"""
         if object_name is None:
             object_name = os.path.basename(file_path)
 
         try:
-            self.client.upload_file(file_path, bucket_name, object_name)
+            self.client.upload_file(file_path, bucket_name, object_name, Callback=callback)
+            self._invalidate_listing(bucket_name, object_name)
             return True
         except ClientError as e:
             raise Exception(f"上传文件失败: {str(e)}")
 
+    def upload_stream(self, bucket_name, object_name, stream, part_size=8 * 1024 * 1024, max_concurrency=4):
+        """从输入流边读边分片上传，内存占用约为 max_concurrency+1 个分片"""
+        part_size = max(part_size, MIN_PART_SIZE)
+        chunk = self._read_chunk(stream, part_size)
+
+        # 不足一个分片的小文件直接 put_object
+        if len(chunk) < part_size:
+            try:
+                self.client.put_object(Bucket=bucket_name, Key=object_name, Body=chunk)
+                self._invalidate_listing(bucket_name, object_name)
+                return len(chunk)
+            except ClientError as e:
+                raise Exception(f"上传文件失败: {str(e)}")
+
+        try:
+            upload_id = self.client.create_multipart_upload(Bucket=bucket_name, Key=object_name)['UploadId']
+        except ClientError as e:
+            raise Exception(f"上传文件失败: {str(e)}")
+
+        total_size = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                pending = set()
+                futures = []
+                part_number = 1
+                while chunk:
+                    if part_number > MAX_PARTS:
+                        raise Exception(f"分片数量超过上限 {MAX_PARTS}")
+
+                    # 在途分片达到上限时等待，限制内存占用并对客户端形成背压
+                    if len(pending) >= max_concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+
+                    future = pool.submit(self._upload_part, bucket_name, object_name, upload_id, part_number, chunk)
+                    pending.add(future)
+                    futures.append(future)
+                    total_size += len(chunk)
+                    part_number += 1
+                    chunk = self._read_chunk(stream, part_size)
+
+                parts = [future.result() for future in futures]
+
+            self.client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=object_name,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            self._invalidate_listing(bucket_name, object_name)
+            return total_size
+        except BaseException as e:
+            # 任何失败（包括客户端断开）都中止分片上传，避免残留分片产生费用
+            try:
+                self.client.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+            except ClientError:
+                pass
+            if isinstance(e, ClientError):
+                raise Exception(f"上传文件失败: {str(e)}")
+            raise
+
+    def _upload_part(self, bucket_name, object_name, upload_id, part_number, data):
+        """上传单个分片，返回 complete_multipart_upload 所需的分片信息"""
+        response = self.client.upload_part(
+            Bucket=bucket_name,
+            Key=object_name,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def create_multipart_upload(self, bucket_name, object_name):
+        """创建分片上传，返回 upload_id"""
+        try:
+            response = self.client.create_multipart_upload(Bucket=bucket_name, Key=object_name)
+            return response['UploadId']
+        except ClientError as e:
+            raise Exception(f"创建分片上传失败: {str(e)}")
+
+    def upload_part(self, bucket_name, object_name, upload_id, part_number, data):
+        """上传分片，返回分片ETag"""
+        if part_number < 1 or part_number > MAX_PARTS:
+            raise Exception(f"分片编号必须在 1 到 {MAX_PARTS} 之间")
+        try:
+            return self._upload_part(bucket_name, object_name, upload_id, part_number, data)['ETag']
+        except ClientError as e:
+            raise Exception(f"上传分片失败: {str(e)}")
+
+    def list_parts(self, bucket_name, object_name, upload_id):
+        """列出分片上传中S3已收到的全部分片"""
+        try:
+            parts = []
+            paginator = self.client.get_paginator('list_parts')
+            pages = paginator.paginate(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+            for page in pages:
+                for part in page.get('Parts', []):
+                    parts.append({
+                        'part_number': part['PartNumber'],
+                        'etag': part['ETag'],
+                        'size': part['Size']
+                    })
+            return parts
+        except ClientError as e:
+            raise Exception(f"列出分片失败: {str(e)}")
+
+    def complete_multipart_upload(self, bucket_name, object_name, upload_id, parts=None):
+        """完成分片上传；未指定分片时使用S3已收到的全部分片"""
+        if parts is None:
+            parts = self.list_parts(bucket_name, object_name, upload_id)
+        try:
+            self.client.complete_multipart_upload(
+                Bucket=bucket_name,
+                Key=object_name,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': [
+                    {'PartNumber': part['part_number'], 'ETag': part['etag']}
+                    for part in sorted(parts, key=lambda p: p['part_number'])
+                ]}
+            )
+            self._invalidate_listing(bucket_name, object_name)
+            return True
+        except ClientError as e:
+            raise Exception(f"完成分片上传失败: {str(e)}")
+
+    def abort_multipart_upload(self, bucket_name, object_name, upload_id):
+        """中止分片上传并清理已上传的分片"""
+        try:
+            self.client.abort_multipart_upload(Bucket=bucket_name, Key=object_name, UploadId=upload_id)
+            return True
+        except ClientError as e:
+            raise Exception(f"中止分片上传失败: {str(e)}")
+
+    def list_multipart_uploads(self, bucket_name, prefix=''):
+        """列出前缀下未完成的分片上传"""
+        try:
+            uploads = []
+            paginator = self.client.get_paginator('list_multipart_uploads')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                for upload in page.get('Uploads', []):
+                    uploads.append({
+                        'key': upload['Key'],
+                        'upload_id': upload['UploadId'],
+                        'initiated': upload['Initiated'].strftime('%Y-%m-%d %H:%M:%S')
+                    })
+            return uploads
+        except ClientError as e:
+            raise Exception(f"列出分片上传失败: {str(e)}")
+
+    def _read_chunk(self, stream, size):
+        """从流中读满 size 字节（流结束时可能更少）"""
+        buffer = bytearray()
+        while len(buffer) < size:
+            data = stream.read(size - len(buffer))
+            if not data:
+                break
+            buffer += data
+        return bytes(buffer)
+
     def download_file(self, bucket_name, object_name, download_path):
         """下载文件"""
         try:
@@ -94,10 +422,93 @@ class S3ClientManager:
         except ClientError as e:
             raise Exception(f"下载文件失败: {str(e)}")
 
+    def head_object(self, bucket_name, object_name):
+        """获取对象元数据"""
+        try:
+            return self.client.head_object(Bucket=bucket_name, Key=object_name)
+        except ClientError as e:
+            raise_for_head_object_error(e)
+
+    def object_exists(self, bucket_name, object_name):
+        """对象是否存在"""
+        try:
+            self.client.head_object(Bucket=bucket_name, Key=object_name)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise Exception(f"获取对象信息失败: {str(e)}")
+
+    def prefix_exists(self, bucket_name, prefix):
+        """前缀下是否有任何对象（包括文件夹占位对象）"""
+        try:
+            response = self.client.list_objects_v2(Bucket=bucket_name, Prefix=prefix, MaxKeys=1)
+            return response.get('KeyCount', len(response.get('Contents', []))) > 0
+        except ClientError as e:
+            raise Exception(f"列出对象失败: {str(e)}")
+
+    def get_object(self, bucket_name, object_name, byte_range=None, if_none_match=None, if_modified_since=None):
+        """获取对象（流式），返回的 Body 需由调用方关闭
+
+        传入 if_none_match/if_modified_since 时由S3判断对象是否变化，未变化时抛出
+        NotModifiedError，不传输对象内容。
+        """
+        try:
+            params = {'Bucket': bucket_name, 'Key': object_name}
+            if byte_range:
+                params['Range'] = byte_range
+            if if_none_match:
+                params['IfNoneMatch'] = if_none_match
+            elif if_modified_since:
+                params['IfModifiedSince'] = if_modified_since
+            return self.client.get_object(**params)
+        except ClientError as e:
+            raise_for_get_object_error(e, byte_range)
+
+    def generate_presigned_download_url(self, bucket_name, object_name, expires_in=3600, disposition=None):
+        """生成预签名GET地址，浏览器可直接从S3下载"""
+        try:
+            params = {'Bucket': bucket_name, 'Key': object_name}
+            if disposition:
+                params['ResponseContentDisposition'] = disposition
+            return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+        except ClientError as e:
+            raise Exception(f"生成下载地址失败: {str(e)}")
+
+    def generate_presigned_upload_url(self, bucket_name, object_name, expires_in=3600):
+        """生成预签名PUT地址，浏览器可直接上传到S3"""
+        try:
+            return self.client.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': bucket_name, 'Key': object_name},
+                ExpiresIn=expires_in
+            )
+        except ClientError as e:
+            raise Exception(f"生成上传地址失败: {str(e)}")
+
+    def generate_presigned_part_url(self, bucket_name, object_name, upload_id, part_number, expires_in=3600):
+        """生成分片上传的预签名PUT地址"""
+        if part_number < 1 or part_number > MAX_PARTS:
+            raise Exception(f"分片编号必须在 1 到 {MAX_PARTS} 之间")
+        try:
+            return self.client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': bucket_name,
+                    'Key': object_name,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number
+                },
+                ExpiresIn=expires_in
+            )
+        except ClientError as e:
+            raise Exception(f"生成分片上传地址失败: {str(e)}")
+
     def delete_object(self, bucket_name, object_name):
         """删除对象"""
         try:
             self.client.delete_object(Bucket=bucket_name, Key=object_name)
+            self._invalidate_listing(bucket_name, object_name)
             return True
         except ClientError as e:
             raise Exception(f"删除对象失败: {str(e)}")
@@ -110,42 +521,309 @@ class S3ClientManager:
                 folder_name += '/'
 
             self.client.put_object(Bucket=bucket_name, Key=folder_name)
+            self._invalidate_listing(bucket_name, folder_name)
             return True
         except ClientError as e:
             raise Exception(f"创建文件夹失败: {str(e)}")
 
-    def delete_folder(self, bucket_name, folder_prefix):
-        """删除文件夹及其内容"""
+    def delete_keys(self, bucket_name, keys, max_workers=8, progress=None):
+        """按每批1000个并行批量删除对象，返回删除数量和逐个对象的错误
+
+        progress 在每批完成后以累计结果调用，抛出异常时等在途批次完成后停止。
+        """
+        result = None
+        try:
+            batches = (keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE))
+            result = self._delete_batches(bucket_name, batches, max_workers, progress)
+            return result
+        finally:
+            for cache in self._caches():
+                if keys:
+                    cache.invalidate_keys(self.cache_scope, bucket_name, keys)
+            if self.metadata_index and keys:
+                # 删除失败或结果未知的对象交给后台刷新确认
+                failed = {error['key'] for error in result['errors']} if result else set(keys)
+                self.metadata_index.remove_keys(self.cache_scope, bucket_name, [k for k in keys if k not in failed])
+                for key in failed:
+                    self.metadata_index.mark_dirty(self, bucket_name, key)
+
+    def delete_folder(self, bucket_name, folder_prefix, max_workers=8, progress=None):
+        """删除文件夹及其内容
+
+        边分页列出边删除：每页（最多1000个键）作为一批交给有界线程池，
+        内存占用与文件夹大小无关。返回删除数量和逐个对象的错误；progress 同 delete_keys。
+        """
+        result = None
         try:
-            # 列出文件夹中的所有对象
-            objects_to_delete = []
             paginator = self.client.get_paginator('list_objects_v2')
             pages = paginator.paginate(Bucket=bucket_name, Prefix=folder_prefix)
+            batches = (
+                [obj['Key'] for obj in page.get('Contents', [])]
+                for page in pages
+            )
+            result = self._delete_batches(bucket_name, batches, max_workers, progress)
+            return result
+        except ClientError as e:
+            raise Exception(f"删除文件夹失败: {str(e)}")
+        finally:
+            # 无论删除成功与否都让缓存失效，避免部分删除后显示旧列表
+            for cache in self._caches():
+                cache.invalidate_tree(self.cache_scope, bucket_name, folder_prefix)
+            if self.metadata_index:
+                if result and not result['errors']:
+                    self.metadata_index.remove_prefix(self.cache_scope, bucket_name, folder_prefix)
+                else:
+                    self.metadata_index.mark_dirty(self, bucket_name, folder_prefix, recursive=True)
 
-            for page in pages:
-                for obj in page.get('Contents', []):
-                    objects_to_delete.append({'Key': obj['Key']})
+    def _delete_batches(self, bucket_name, batches, max_workers, progress=None):
+        """并行执行批量删除，在途批次数量有上限"""
+        result = {'deleted': 0, 'errors': []}
+
+        def collect(future):
+            deleted, errors = future.result()
+            result['deleted'] += deleted
+            result['errors'].extend(errors)
+            if progress:
+                progress(result)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending = set()
+            for batch in batches:
+                if not batch:
+                    continue
+                if len(pending) >= max_workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                pending.add(pool.submit(self._delete_batch, bucket_name, batch))
+
+            for future in pending:
+                collect(future)
+
+        return result
+
+    def _delete_batch(self, bucket_name, keys):
+        """调用一次 delete_objects 删除一批对象（不超过1000个）"""
+        try:
+            response = self.client.delete_objects(
+                Bucket=bucket_name,
+                Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+            )
+        except ClientError as e:
+            error = e.response.get('Error', {})
+            return 0, [
+                {'key': key, 'code': error.get('Code', ''), 'message': error.get('Message', str(e))}
+                for key in keys
+            ]
 
-            # 批量删除
-            if objects_to_delete:
-                self.client.delete_objects(
-                    Bucket=bucket_name,
-                    Delete={'Objects': objects_to_delete}
-                )
+        errors = [
+            {'key': error.get('Key'), 'code': error.get('Code', ''), 'message': error.get('Message', '')}
+            for error in response.get('Errors', [])
+        ]
+        return len(keys) - len(errors), errors
 
+    def copy_object(self, source_bucket, source_key, dest_bucket, dest_key, size=None, max_workers=8):
+        """在服务端复制单个对象，超过5GB时使用分片复制"""
+        try:
+            self._server_copy(source_bucket, source_key, dest_bucket, dest_key, size, max_workers)
+            self._invalidate_listing(dest_bucket, dest_key)
             return True
         except ClientError as e:
-            raise Exception(f"删除文件夹失败: {str(e)}")
+            raise Exception(f"复制对象失败: {str(e)}")
 
-    def _format_size(self, size_bytes):
-        """格式化文件大小"""
-        if size_bytes == 0:
-            return "0 B"
+    def copy_keys(self, source_bucket, pairs, dest_bucket=None, move=False, max_workers=8, progress=None):
+        """并行复制一组对象，pairs 为 (源对象键, 目标对象键) 列表
+
+        move 为 True 时只删除复制成功的源对象，每凑满1000个批量删除一次。
+        返回复制数量、删除数量和逐个对象的错误；progress 在每个对象完成后以累计结果调用，
+        抛出异常时等在途的复制完成后停止。
+        """
+        dest_bucket = dest_bucket or source_bucket
+        result = None
+        try:
+            result = self._copy_pairs(
+                source_bucket, dest_bucket, ((src, dst, None) for src, dst in pairs), move, max_workers, progress
+            )
+            return result
+        finally:
+            for cache in self._caches():
+                cache.invalidate_keys(self.cache_scope, dest_bucket, [dst for _, dst in pairs])
+                if move:
+                    cache.invalidate_keys(self.cache_scope, source_bucket, [src for src, _ in pairs])
+            if self.metadata_index:
+                for src, dst in pairs:
+                    self.metadata_index.mark_dirty(self, dest_bucket, dst)
+                    if move:
+                        self.metadata_index.mark_dirty(self, source_bucket, src)
 
-        size_names = ["B", "KB", "MB", "GB", "TB"]
-        i = 0
-        while size_bytes >= 1024 and i < len(size_names) - 1:
-            size_bytes /= 1024.0
-            i += 1
+    def copy_prefix(self, source_bucket, source_prefix, dest_bucket, dest_prefix, move=False, max_workers=8,
+                    progress=None):
+        """复制（或移动）文件夹：边分页列出边并行复制，source_prefix 下的相对路径保持不变"""
+        dest_bucket = dest_bucket or source_bucket
+        if source_bucket == dest_bucket and dest_prefix.startswith(source_prefix):
+            raise Exception("不能复制或移动到文件夹自身或其子文件夹中")
 
-        return f"{size_bytes:.1f} {size_names[i]}"
\ No newline at end of file
+        result = None
+        try:
+            paginator = self.client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(Bucket=source_bucket, Prefix=source_prefix)
+            pairs = (
+                (obj['Key'], dest_prefix + obj['Key'][len(source_prefix):], obj['Size'])
+                for page in pages
+                for obj in page.get('Contents', [])
+            )
+            result = self._copy_pairs(source_bucket, dest_bucket, pairs, move, max_workers, progress)
+            return result
+        except ClientError as e:
+            raise Exception(f"复制文件夹失败: {str(e)}")
+        finally:
+            for cache in self._caches():
+                cache.invalidate_tree(self.cache_scope, dest_bucket, dest_prefix)
+                if move:
+                    cache.invalidate_tree(self.cache_scope, source_bucket, source_prefix)
+            if self.metadata_index:
+                self.metadata_index.mark_dirty(self, dest_bucket, dest_prefix, recursive=True)
+                if move:
+                    if result and not result['errors']:
+                        self.metadata_index.remove_prefix(self.cache_scope, source_bucket, source_prefix)
+                    else:
+                        self.metadata_index.mark_dirty(self, source_bucket, source_prefix, recursive=True)
+
+    def _copy_pairs(self, source_bucket, dest_bucket, pairs, move, max_workers, progress=None):
+        """并行执行复制，在途数量有上限；move 时复制成功的源对象按批删除"""
+        result = {'copied': 0, 'deleted': 0, 'errors': []}
+        to_delete = []
+        pending = set()
+
+        def delete_sources():
+            deleted, errors = self._delete_batch(source_bucket, to_delete)
+            result['deleted'] += deleted
+            result['errors'].extend(errors)
+            to_delete.clear()
+
+        def record(future):
+            pending.discard(future)
+            source_key, error = future.result()
+            if error:
+                result['errors'].append(error)
+            else:
+                result['copied'] += 1
+                if move:
+                    to_delete.append(source_key)
+                    if len(to_delete) >= DELETE_BATCH_SIZE:
+                        delete_sources()
+
+        def collect(future):
+            record(future)
+            if progress:
+                progress(result)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for source_key, dest_key, size in pairs:
+                    if source_bucket == dest_bucket and source_key == dest_key:
+                        result['errors'].append({'key': source_key, 'code': '', 'message': '源对象与目标对象相同'})
+                        continue
+                    if len(pending) >= max_workers * 2:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future)
+                    pending.add(pool.submit(
+                        self._copy_one, source_bucket, source_key, dest_bucket, dest_key, size, max_workers
+                    ))
+
+                for future in list(pending):
+                    collect(future)
+        finally:
+            # 列出失败或任务被取消时，线程池已等在途的复制完成：记下这些结果，
+            # 复制成功的源对象仍然删除，不留下复制了一半的移动
+            for future in list(pending):
+                record(future)
+            if to_delete:
+                delete_sources()
+        return result
+
+    def _copy_one(self, source_bucket, source_key, dest_bucket, dest_key, size, max_workers):
+        """复制一个对象，返回 (源对象键, 错误)，成功时错误为None"""
+        try:
+            self._server_copy(source_bucket, source_key, dest_bucket, dest_key, size, max_workers)
+            return source_key, None
+        except ClientError as e:
+            error = e.response.get('Error', {})
+            return source_key, {'key': source_key, 'code': error.get('Code', ''), 'message': error.get('Message', str(e))}
+        except Exception as e:
+            # 网络错误（BotoCoreError）等也只记为该对象的错误，不中断其余对象的复制和源对象的删除
+            return source_key, {'key': source_key, 'code': '', 'message': str(e)}
+
+    def _server_copy(self, source_bucket, source_key, dest_bucket, dest_key, size, max_workers):
+        """不超过5GB的对象用一次 copy_object，更大的对象分片复制；size 未知时先查询"""
+        if size is None:
+            size = self.client.head_object(Bucket=source_bucket, Key=source_key)['ContentLength']
+        if size > MAX_COPY_SIZE:
+            self._multipart_copy(source_bucket, source_key, dest_bucket, dest_key, size, max_workers)
+        else:
+            self.client.copy_object(
+                Bucket=dest_bucket,
+                Key=dest_key,
+                CopySource={'Bucket': source_bucket, 'Key': source_key}
+            )
+
+    def _multipart_copy(self, source_bucket, source_key, dest_bucket, dest_key, size, max_workers):
+        """用 upload_part_copy 并行分片复制大对象，保留内容类型和用户元数据"""
+        head = self.client.head_object(Bucket=source_bucket, Key=source_key)
+        params = {'Bucket': dest_bucket, 'Key': dest_key, 'Metadata': head.get('Metadata', {})}
+        for field in ('ContentType', 'ContentEncoding', 'ContentDisposition', 'ContentLanguage', 'CacheControl'):
+            if head.get(field):
+                params[field] = head[field]
+        upload_id = self.client.create_multipart_upload(**params)['UploadId']
+
+        part_size = max(COPY_PART_SIZE, -(-size // MAX_PARTS))
+        ranges = [
+            (part_number, start, min(start + part_size, size) - 1)
+            for part_number, start in enumerate(range(0, size, part_size), start=1)
+        ]
+
+        def copy_part(part):
+            part_number, first, last = part
+            response = self.client.upload_part_copy(
+                Bucket=dest_bucket,
+                Key=dest_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                CopySource={'Bucket': source_bucket, 'Key': source_key},
+                CopySourceRange=f"bytes={first}-{last}",
+                CopySourceIfMatch=head['ETag']
+            )
+            return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                parts = list(pool.map(copy_part, ranges))
+            self.client.complete_multipart_upload(
+                Bucket=dest_bucket,
+                Key=dest_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except BaseException:
+            # 任一分片失败都中止分片上传，避免残留分片产生费用
+            try:
+                self.client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+            except ClientError:
+                pass
+            raise
+
+    def _invalidate_listing(self, bucket_name, key):
+        """写操作后使受影响前缀的列表缓存、文件夹大小缓存和对象缓存失效，并让元数据索引刷新该前缀"""
+        for cache in self._caches():
+            cache.invalidate_key(self.cache_scope, bucket_name, key)
+        if self.metadata_index:
+            self.metadata_index.mark_dirty(self, bucket_name, key)
+
+    def _caches(self):
+        """写操作后需要失效的缓存：对象列表缓存、文件夹大小缓存和对象内容缓存"""
+        return [cache for cache in (self.listing_cache, self.usage_cache, self.object_cache) if cache]
+
+    def _format_size(self, size_bytes):
+        """格式化文件大小"""
+        return format_size(size_bytes)
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""多个工作进程共享的SQLite状态（后台任务表、元数据索引）的公共部分：进程标识、存活检查和每线程连接"""
+import os
+import socket
+import sqlite3
+import threading
+
+
+def process_owner():
+    """本进程的标识（主机名:PID）
+
+    每次调用时取PID：应用可能在 fork 出工作进程之前导入。
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_gone(owner):
+    """记录中的所有者进程是否已不存在
+
+    没有所有者、本机上已退出的进程都视为不存在；与本进程标识相同的记录来自使用了相同PID的
+    上一个进程（如容器中的PID 1）。其他主机上的进程无法检查，视为仍在运行。
+    """
+    if not owner or owner == process_owner():
+        return True
+    host, _, pid = owner.rpartition(':')
+    return host == socket.gethostname() and pid.isdigit() and not pid_alive(int(pid))
+
+
+def pid_alive(pid):
+    """本机上的进程是否仍在运行"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ThreadLocalConnection:
+    """sqlite3 连接不能跨线程使用，每个线程一个连接；WAL 模式下多个进程可以同时读写"""
+
+    def __init__(self, db_path, timeout=30):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.db_path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,389 @@
+"""本地目录与存储桶前缀之间的同步
+
+push 把本地目录上传到前缀，pull 把前缀下载到本地目录，只传输新增或变化的文件。
+
+命令行用法：
+    python sync.py push --server 1 --bucket my-bucket --prefix releases/v1/ --local ./build --delete --dry-run
+    python sync.py pull --server 1 --bucket my-bucket --prefix datasets/ --local ./data --compare checksum
+"""
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from listing import format_size
+
+# 比较方式：size-mtime 按大小和修改时间（快），checksum 按本地MD5与ETag（准确，需读取本地文件）
+COMPARE_MODES = ('size-mtime', 'checksum')
+
+# 分片上传的ETag是各分片MD5再取MD5，需要知道分片大小才能在本地算出。
+# 依次尝试常见的分片大小（本应用和 boto3/aws cli 默认都是8MB）
+MULTIPART_PART_SIZES = [size * 1024 * 1024 for size in (8, 5, 16, 15, 32, 64, 100, 128, 256, 512)]
+
+# 修改时间比较的容差（秒），兼容只精确到2秒的文件系统
+MTIME_TOLERANCE = 2
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 同步接口返回的计划最多包含的条目数
+PLAN_PREVIEW_LIMIT = 1000
+
+
+def scan_local(root):
+    """列出本地目录下的全部文件，返回 {相对路径: 文件信息}，相对路径统一使用 /"""
+    files = {}
+    root = os.path.abspath(root)
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            files[relative] = {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    return files
+
+
+def scan_remote(manager, bucket, prefix):
+    """列出前缀下的全部对象，返回 {相对路径: 对象信息}（跳过文件夹占位对象）"""
+    objects = {}
+    for obj in manager.iter_objects(bucket, prefix):
+        relative = obj['Key'][len(prefix):]
+        if not relative or relative.endswith('/'):
+            continue
+        objects[relative] = {
+            'key': obj['Key'],
+            'size': obj['Size'],
+            'mtime': obj['LastModified'].timestamp(),
+            'etag': obj.get('ETag', '').strip('"')
+        }
+    return objects
+
+
+def file_matches_etag(path, size, etag):
+    """本地文件内容是否与ETag一致；分片上传的ETag（形如 md5-分片数）按候选分片大小逐个尝试"""
+    if '-' not in etag:
+        return _file_md5(path) == etag
+
+    digest, _, count = etag.partition('-')
+    if not count.isdigit():
+        return False
+    part_count = int(count)
+
+    candidates = [part_size for part_size in MULTIPART_PART_SIZES if -(-size // part_size) == part_count]
+    # 分片大小不在常见值中时，按 1MB 取整猜测一次
+    guessed = -(-size // part_count)
+    guessed = -(-guessed // (1024 * 1024)) * 1024 * 1024
+    if guessed not in candidates and -(-size // guessed) == part_count:
+        candidates.append(guessed)
+
+    for part_size in candidates:
+        if _multipart_md5(path, part_size) == digest:
+            return True
+    return False
+
+
+def plan_sync(manager, bucket, prefix, local_root, direction='push', compare='size-mtime', delete=False, max_workers=8):
+    """对比本地目录和前缀，生成传输计划
+
+    计划中的每个操作为 {'action': upload/download/delete, 'path', 'key', 'size', 'reason'}，
+    reason 为 new（对方不存在）、size（大小不同）、newer（源更新）、checksum（内容不同）或 extraneous（源中不存在）。
+    """
+    if direction not in ('push', 'pull'):
+        raise Exception("同步方向必须是 push 或 pull")
+    if compare not in COMPARE_MODES:
+        raise Exception(f"比较方式必须是 {' 或 '.join(COMPARE_MODES)}")
+
+    prefix = _normalize_prefix(prefix)
+    # 解析符号链接，之后按真实路径判断下载目标是否在本地目录之内
+    local_root = os.path.realpath(local_root)
+    if direction == 'push' and not os.path.isdir(local_root):
+        raise Exception(f"本地目录不存在: {local_root}")
+
+    local_files = scan_local(local_root) if os.path.isdir(local_root) else {}
+    remote_objects = scan_remote(manager, bucket, prefix)
+
+    # 对象键可以包含 .. 等路径片段，下载时会写到本地目录之外，这样的对象不参与 pull
+    rejected = []
+    if direction == 'pull':
+        for relative in sorted(remote_objects):
+            if _local_path(local_root, relative) is None:
+                rejected.append({'path': relative, 'key': remote_objects.pop(relative)['key'],
+                                 'message': '对象键指向本地目录之外，已跳过'})
+
+    transfer = 'upload' if direction == 'push' else 'download'
+    sources, targets = (local_files, remote_objects) if direction == 'push' else (remote_objects, local_files)
+
+    actions = []
+    to_verify = []
+    for relative in sorted(sources):
+        source = sources[relative]
+        target = targets.get(relative)
+        remote = remote_objects.get(relative)
+
+        if target is None:
+            reason = 'new'
+        elif source['size'] != target['size']:
+            reason = 'size'
+        elif compare == 'checksum':
+            to_verify.append(relative)
+            continue
+        elif source['mtime'] > target['mtime'] + MTIME_TOLERANCE:
+            reason = 'newer'
+        else:
+            continue
+        actions.append(_action(transfer, relative, prefix, local_root, source['size'], reason, remote))
+
+    # 大小相同的文件计算本地MD5与ETag比较（hashlib 计算时释放GIL，可以并行）
+    if to_verify:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(
+                    file_matches_etag, local_files[relative]['path'],
+                    local_files[relative]['size'], remote_objects[relative]['etag']
+                ): relative
+                for relative in to_verify
+            }
+            for future in as_completed(futures):
+                if not future.result():
+                    relative = futures[future]
+                    actions.append(_action(
+                        transfer, relative, prefix, local_root,
+                        sources[relative]['size'], 'checksum', remote_objects.get(relative)
+                    ))
+        actions.sort(key=lambda action: action['path'])
+
+    if delete:
+        for relative in sorted(set(targets) - set(sources)):
+            actions.append(_action(
+                'delete', relative, prefix, local_root,
+                targets[relative]['size'], 'extraneous', remote_objects.get(relative)
+            ))
+
+    totals = {}
+    for action in actions:
+        total = totals.setdefault(action['action'], {'files': 0, 'bytes': 0})
+        total['files'] += 1
+        total['bytes'] += action['size']
+
+    return {
+        'direction': direction,
+        'bucket': bucket,
+        'prefix': prefix,
+        'local_root': local_root,
+        'compare': compare,
+        'scanned': {'local': len(local_files), 'remote': len(remote_objects) + len(rejected)},
+        'actions': actions,
+        'rejected': rejected,
+        'totals': totals
+    }
+
+
+def execute_plan(manager, plan, max_workers=8, on_progress=None):
+    """按计划并行传输，然后删除多余的文件，返回传输数量、字节数和逐个文件的错误"""
+    bucket = plan['bucket']
+    result = {'uploaded': 0, 'downloaded': 0, 'deleted': 0, 'bytes': 0, 'errors': []}
+    result['errors'].extend({'path': item['path'], 'message': item['message']} for item in plan.get('rejected', []))
+    transfers = [action for action in plan['actions'] if action['action'] in ('upload', 'download')]
+    deletes = [action for action in plan['actions'] if action['action'] == 'delete']
+
+    def run(action):
+        if action['action'] == 'upload':
+            manager.upload_file(bucket, action['local_path'], action['key'])
+        else:
+            # 计划生成后目录中可能新建了指向外部的符号链接，写入前再确认一次
+            if _local_path(plan['local_root'], action['path']) is None:
+                raise Exception("对象键指向本地目录之外，已跳过")
+            manager.download_file(bucket, action['key'], action['local_path'])
+            # 本地修改时间设为对象的修改时间，下次按 size-mtime 比较时不会重复下载
+            os.utime(action['local_path'], (action['remote_mtime'], action['remote_mtime']))
+        return action
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run, action): action for action in transfers}
+        for future in as_completed(futures):
+            action = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                result['errors'].append({'path': action['path'], 'message': str(e)})
+                continue
+            result['uploaded' if action['action'] == 'upload' else 'downloaded'] += 1
+            result['bytes'] += action['size']
+            if on_progress:
+                on_progress(action, result)
+
+    if deletes and plan['direction'] == 'push':
+        deleted = manager.delete_keys(bucket, [action['key'] for action in deletes], max_workers)
+        result['deleted'] += deleted['deleted']
+        result['errors'].extend({'path': error['key'], 'message': f"{error['code']} {error['message']}".strip()}
+                                for error in deleted['errors'])
+    else:
+        for action in deletes:
+            try:
+                os.remove(action['local_path'])
+                result['deleted'] += 1
+            except OSError as e:
+                result['errors'].append({'path': action['path'], 'message': str(e)})
+
+    return result
+
+
+def sync(manager, bucket, prefix, local_root, direction='push', compare='size-mtime', delete=False,
+         dry_run=False, max_workers=8, on_progress=None):
+    """生成计划并执行（dry_run 时只返回计划），返回 (计划, 执行结果)"""
+    plan = plan_sync(manager, bucket, prefix, local_root, direction, compare, delete, max_workers)
+    if dry_run:
+        return plan, None
+    return plan, execute_plan(manager, plan, max_workers, on_progress)
+
+
+def summarize_plan(plan, limit=PLAN_PREVIEW_LIMIT):
+    """接口返回用的计划摘要：去掉本地绝对路径，操作条目最多 limit 个"""
+    return {
+        'direction': plan['direction'],
+        'compare': plan['compare'],
+        'scanned': plan['scanned'],
+        'totals': {
+            name: dict(total, size=format_size(total['bytes']))
+            for name, total in plan['totals'].items()
+        },
+        'action_count': len(plan['actions']),
+        'actions': [
+            {'action': action['action'], 'path': action['path'], 'size': action['size'], 'reason': action['reason']}
+            for action in plan['actions'][:limit]
+        ],
+        'rejected': [{'path': item['path'], 'message': item['message']} for item in plan['rejected'][:limit]]
+    }
+
+
+def format_plan(plan):
+    """命令行输出用的计划文本"""
+    lines = []
+    for action in plan['actions']:
+        lines.append(f"{action['action']:<8} {format_size(action['size']):>10}  {action['path']}  ({action['reason']})")
+    for item in plan['rejected']:
+        lines.append(f"{'skip':<8} {'':>10}  {item['path']}  ({item['message']})")
+    for name in ('upload', 'download', 'delete'):
+        total = plan['totals'].get(name)
+        if total:
+            lines.append(f"{name}: {total['files']} 个文件，{format_size(total['bytes'])}")
+    if not plan['actions'] and not plan['rejected']:
+        lines.append("已是最新，无需同步")
+    return '\n'.join(lines)
+
+
+def _action(name, relative, prefix, local_root, size, reason, remote):
+    action = {
+        'action': name,
+        'path': relative,
+        'key': prefix + relative,
+        'local_path': os.path.join(local_root, *relative.split('/')),
+        'size': size,
+        'reason': reason
+    }
+    if remote is not None:
+        action['remote_mtime'] = remote['mtime']
+    return action
+
+
+def _local_path(local_root, relative):
+    """相对路径对应的本地路径（解析 .. 和符号链接）；不在 local_root（真实路径）之内时返回None"""
+    path = os.path.realpath(os.path.join(local_root, *relative.split('/')))
+    if path == local_root or os.path.commonpath([path, local_root]) != local_root:
+        return None
+    return path
+
+
+def _normalize_prefix(prefix):
+    prefix = (prefix or '').lstrip('/')
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    return prefix
+
+
+def _file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _multipart_md5(path, part_size):
+    part_digests = []
+    with open(path, 'rb') as f:
+        while True:
+            md5 = hashlib.md5()
+            remaining = part_size
+            while remaining > 0:
+                chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                md5.update(chunk)
+                remaining -= len(chunk)
+            if remaining == part_size:
+                break
+            part_digests.append(md5.digest())
+    return hashlib.md5(b''.join(part_digests)).hexdigest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='在本地目录和存储桶前缀之间同步文件')
+    parser.add_argument('direction', choices=['push', 'pull'], help='push 上传本地目录，pull 下载到本地目录')
+    parser.add_argument('--server', type=int, required=True, help='服务器ID（见 s3_config.json）')
+    parser.add_argument('--bucket', required=True, help='存储桶名称')
+    parser.add_argument('--prefix', default='', help='存储桶中的前缀（文件夹）')
+    parser.add_argument('--local', required=True, help='本地目录')
+    parser.add_argument('--compare', choices=COMPARE_MODES, default='size-mtime', help='比较方式')
+    parser.add_argument('--delete', action='store_true', help='删除目标中源不存在的文件')
+    parser.add_argument('--dry-run', action='store_true', help='只输出传输计划，不实际传输')
+    parser.add_argument('--workers', type=int, default=8, help='并行传输数')
+    parser.add_argument('--config', default='s3_config.json', help='配置文件路径')
+    args = parser.parse_args(argv)
+
+    from config import ConfigManager
+    from s3_client import S3ClientManager
+
+    server = ConfigManager(args.config).get_server(args.server)
+    if not server:
+        print(f"服务器配置不存在: {args.server}", file=sys.stderr)
+        return 2
+
+    transport = dict(server.get('transport') or {})
+    transport.setdefault('max_pool_connections', max(args.workers * 2, 10))
+    manager = S3ClientManager(
+        server['access_key'],
+        server['secret_key'],
+        server['endpoint_url'],
+        server['region'],
+        transport=transport
+    )
+
+    def on_progress(action, result):
+        done = result['uploaded'] + result['downloaded']
+        print(f"[{done}] {action['action']} {action['path']}", flush=True)
+
+    try:
+        plan = plan_sync(manager, args.bucket, args.prefix, args.local, args.direction,
+                         args.compare, args.delete, args.workers)
+        print(format_plan(plan))
+        if args.dry_run or not plan['actions']:
+            return 0
+
+        result = execute_plan(manager, plan, args.workers, on_progress)
+    except Exception as e:
+        print(f"同步失败: {str(e)}", file=sys.stderr)
+        return 1
+
+    print(f"完成：上传 {result['uploaded']}，下载 {result['downloaded']}，删除 {result['deleted']}，"
+          f"传输 {format_size(result['bytes'])}")
+    for error in result['errors']:
+        print(f"失败 {error['path']}: {error['message']}", file=sys.stderr)
+    return 1 if result['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""测试夹具：在临时目录中导入应用，S3请求由 moto 在进程内模拟"""
+import json
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BUCKET = 'test-bucket'
+SERVER_ID = 1
+
+
+@pytest.fixture(scope='session')
+def web(tmp_path_factory):
+    """应用模块；导入时在当前目录创建上传目录、缓存目录和数据库，因此先切换到临时目录"""
+    workdir = tmp_path_factory.mktemp('app')
+    (workdir / 's3_config.json').write_text(json.dumps({'servers': [{
+        'id': SERVER_ID,
+        'name': 'moto',
+        'endpoint_url': None,
+        'access_key': 'testing',
+        'secret_key': 'testing',
+        'region': 'us-east-1',
+        'bucket_cdn_configs': {}
+    }]}))
+
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app as web
+        web.app.config['TESTING'] = True
+        yield web
+    finally:
+        os.chdir(previous)
+
+
+@pytest.fixture
+def s3(web):
+    """模拟的S3，每个测试一个空的存储桶；测试结束后清空应用的缓存"""
+    with mock_aws():
+        client = boto3.client(
+            's3', region_name='us-east-1',
+            aws_access_key_id='testing', aws_secret_access_key='testing'
+        )
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    web.listing_cache.clear()
+    web.usage_cache.clear()
+    web.object_cache.clear()
+
+
+@pytest.fixture
+def client(web, s3):
+    return web.app.test_client()
+
+
+def api(path):
+    return f"/api/servers/{SERVER_ID}{path}"
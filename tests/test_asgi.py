@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from conftest import SERVER_ID
+
+
+@pytest.fixture
+def asgi(web):
+    import asgi
+    return asgi
+
+
+def call(asgi, method, path, query=b''):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': []}
+    asyncio.run(asgi.application(scope, receive, send))
+    return messages[0]['status']
+
+
+def test_async_routes_match_flask_rules(asgi, web):
+    flask_rules = {(method, rule.rule) for rule in web.app.url_map.iter_rules() for method in rule.methods}
+    for method, rule, pattern, _ in asgi.ROUTES:
+        assert (method, rule) in flask_rules
+        assert pattern.match(rule.replace('<int:server_id>', str(SERVER_ID)))
+
+
+def test_async_route_metrics_use_flask_rule(asgi):
+    rule = '/api/servers/<int:server_id>/objects'
+    before = asgi.HTTP_RESPONSES._values.get(('GET', rule, '400'), 0)
+
+    assert call(asgi, 'GET', f"/api/servers/{SERVER_ID}/objects") == 400
+
+    assert asgi.HTTP_RESPONSES._values[('GET', rule, '400')] == before + 1
+    assert not any(labels[1].startswith('^') for labels in asgi.HTTP_RESPONSES._values)
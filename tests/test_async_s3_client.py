@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from async_s3_client import AsyncS3ClientManager, AsyncS3ClientRegistry
+
+
+class FakeRegistry:
+    """同步注册表：替换 manager 相当于配置变更后重建了同步客户端"""
+
+    def __init__(self):
+        self.manager = self.new_manager()
+
+    @staticmethod
+    def new_manager():
+        return SimpleNamespace(listing_cache=None, cache_scope='scope')
+
+    def get(self, server_id):
+        return self.manager
+
+
+@pytest.fixture
+def closed(monkeypatch):
+    closed = []
+
+    async def start(self):
+        self.client = object()
+        return self
+
+    async def close(self):
+        closed.append(self)
+        self.client = None
+
+    monkeypatch.setattr(AsyncS3ClientManager, 'start', start)
+    monkeypatch.setattr(AsyncS3ClientManager, 'close', close)
+    return closed
+
+
+def test_rebuilt_client_is_closed_after_in_flight_requests(closed):
+    async def scenario():
+        sync_registry = FakeRegistry()
+        registry = AsyncS3ClientRegistry(sync_registry)
+
+        async with registry.lease(1) as old:
+            async with registry.lease(1) as same:
+                assert same is old
+
+            sync_registry.manager = sync_registry.new_manager()
+            async with registry.lease(1) as new:
+                assert new is not old
+            # 旧客户端仍在被使用，不能关闭
+            assert closed == [] and old.client is not None
+
+        assert closed == [old]
+
+        await registry.close()
+        assert closed == [old, new]
+
+    asyncio.run(scenario())
+
+
+def test_idle_client_is_closed_on_rebuild(closed):
+    async def scenario():
+        sync_registry = FakeRegistry()
+        registry = AsyncS3ClientRegistry(sync_registry)
+        async with registry.lease(1) as old:
+            pass
+
+        sync_registry.manager = sync_registry.new_manager()
+        async with registry.lease(1):
+            assert closed == [old]
+
+    asyncio.run(scenario())
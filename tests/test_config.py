@@ -0,0 +1,50 @@
+import json
+import multiprocessing
+
+import pytest
+
+from config import ConfigManager
+
+ADDS_PER_PROCESS = 10
+
+
+def add_servers(config_file, worker):
+    manager = ConfigManager(config_file)
+    for i in range(ADDS_PER_PROCESS):
+        manager.add_server(f"w{worker}-{i}", 'ak', 'sk', None)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='需要 fork')
+def test_concurrent_add_server_across_processes_gets_unique_ids(tmp_path):
+    config_file = str(tmp_path / 's3_config.json')
+    ConfigManager(config_file).save_config()
+
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=add_servers, args=(config_file, worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(30)
+        assert process.exitcode == 0
+
+    with open(config_file, encoding='utf-8') as f:
+        servers = json.load(f)['servers']
+    ids = [server['id'] for server in servers]
+    assert len(servers) == 4 * ADDS_PER_PROCESS
+    assert len(set(ids)) == len(ids)
+
+
+def test_reload_keeps_unchanged_server_dicts(tmp_path):
+    config_file = str(tmp_path / 's3_config.json')
+    manager = ConfigManager(config_file, reload_interval=0)
+    first = manager.add_server('a', 'ak', 'sk', None)
+    second = manager.add_server('b', 'ak', 'sk', None)
+
+    # 另一个进程修改了其中一个服务器
+    other = ConfigManager(config_file)
+    other.update_server(second['id'], name='b2')
+
+    assert manager.reload_if_changed(force=True)
+    assert manager.get_server(first['id']) is first
+    assert manager.get_server(second['id']) is not second
+    assert manager.get_server(second['id'])['name'] == 'b2'
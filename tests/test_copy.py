@@ -0,0 +1,95 @@
+from botocore.exceptions import EndpointConnectionError
+
+from conftest import BUCKET, SERVER_ID, api
+
+
+def keys_in(s3, bucket=BUCKET):
+    return sorted(obj['Key'] for obj in s3.list_objects_v2(Bucket=bucket).get('Contents', []))
+
+
+def body(s3, key):
+    return s3.get_object(Bucket=BUCKET, Key=key)['Body'].read()
+
+
+def test_copy_files_and_folders(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='a.txt', Body=b'a')
+    s3.put_object(Bucket=BUCKET, Key='dir/x.txt', Body=b'x')
+    s3.put_object(Bucket=BUCKET, Key='dir/sub/y.txt', Body=b'y')
+
+    response = client.post(api('/copy'), json={'bucket': BUCKET, 'keys': ['a.txt', 'dir/'], 'dest_prefix': 'out'})
+
+    assert response.get_json() == {'success': True, 'copied': 3}
+    assert keys_in(s3) == ['a.txt', 'dir/sub/y.txt', 'dir/x.txt', 'out/a.txt', 'out/dir/sub/y.txt', 'out/dir/x.txt']
+    assert body(s3, 'out/dir/sub/y.txt') == b'y'
+
+
+def test_copy_into_itself_is_rejected(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='dir/x.txt', Body=b'x')
+
+    response = client.post(api('/copy'), json={'bucket': BUCKET, 'keys': ['dir/'], 'dest_prefix': 'dir/inner/'})
+
+    assert response.status_code == 500
+    assert keys_in(s3) == ['dir/x.txt']
+
+
+def test_move_deletes_only_copied_sources(web, client, s3, monkeypatch):
+    for name in ('a', 'b', 'c'):
+        s3.put_object(Bucket=BUCKET, Key=f"dir/{name}.txt", Body=name.encode())
+    manager = web.get_s3_client(SERVER_ID)
+    server_copy = manager._server_copy
+
+    def flaky_copy(source_bucket, source_key, *args):
+        if source_key == 'dir/b.txt':
+            raise EndpointConnectionError(endpoint_url='http://s3.invalid')
+        return server_copy(source_bucket, source_key, *args)
+
+    monkeypatch.setattr(manager, '_server_copy', flaky_copy)
+
+    response = client.post(api('/move'), json={'bucket': BUCKET, 'keys': ['dir/'], 'dest_prefix': 'moved/'})
+
+    assert response.status_code == 500
+    data = response.get_json()
+    assert (data['copied'], data['error_count']) == (2, 1)
+    assert 'dir/b.txt' in data['error']
+    # 复制失败的对象保留在原处，其余对象已移走
+    assert keys_in(s3) == ['dir/b.txt', 'moved/dir/a.txt', 'moved/dir/c.txt']
+
+
+def test_move_removes_queued_sources_when_cancelled(web, s3):
+    manager = web.get_s3_client(SERVER_ID)
+    for name in ('a', 'b'):
+        s3.put_object(Bucket=BUCKET, Key=f"{name}.txt", Body=b'x')
+
+    class Cancelled(Exception):
+        pass
+
+    def cancel(result):
+        raise Cancelled()
+
+    try:
+        manager.copy_keys(BUCKET, [('a.txt', 'new/a.txt'), ('b.txt', 'new/b.txt')], move=True, progress=cancel)
+    except Cancelled:
+        pass
+
+    # 每个对象要么仍在原处，要么已经完整移动，不会两边都有
+    remaining = keys_in(s3)
+    for name in ('a.txt', 'b.txt'):
+        assert (name in remaining) != (f"new/{name}" in remaining)
+
+
+def test_rename_file_and_folder(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='docs/old.txt', Body=b'1')
+    s3.put_object(Bucket=BUCKET, Key='docs/taken.txt', Body=b'2')
+    s3.put_object(Bucket=BUCKET, Key='docs/folder/inner.txt', Body=b'3')
+
+    response = client.post(api('/rename'), json={'bucket': BUCKET, 'key': 'docs/old.txt', 'new_name': 'new.txt'})
+    assert response.get_json() == {'success': True, 'key': 'docs/new.txt', 'copied': 1}
+
+    response = client.post(api('/rename'), json={'bucket': BUCKET, 'key': 'docs/new.txt', 'new_name': 'taken.txt'})
+    assert response.status_code == 409
+
+    response = client.post(api('/rename'), json={'bucket': BUCKET, 'key': 'docs/folder/', 'new_name': 'renamed'})
+    assert response.get_json() == {'success': True, 'key': 'docs/renamed/', 'copied': 1}
+
+    assert keys_in(s3) == ['docs/new.txt', 'docs/renamed/inner.txt', 'docs/taken.txt']
+    assert body(s3, 'docs/new.txt') == b'1'
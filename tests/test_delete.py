@@ -0,0 +1,110 @@
+import threading
+import time
+
+from conftest import BUCKET, SERVER_ID, api
+from s3_client import DELETE_BATCH_SIZE
+
+
+def record_batches(monkeypatch, manager, fail=()):
+    """记录每次 delete_objects 的批大小；fail 中的对象键以 Errors 条目返回"""
+    sizes = []
+    delete_objects = manager.client.delete_objects
+
+    def spy(**kwargs):
+        keys = [obj['Key'] for obj in kwargs['Delete']['Objects']]
+        sizes.append(len(keys))
+        response = delete_objects(**kwargs)
+        errors = [{'Key': key, 'Code': 'AccessDenied', 'Message': 'Access Denied'} for key in keys if key in fail]
+        if errors:
+            response['Errors'] = errors
+        return response
+
+    monkeypatch.setattr(manager.client, 'delete_objects', spy)
+    return sizes
+
+
+def keys_under(s3, prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    return [obj['Key'] for page in paginator.paginate(Bucket=BUCKET, Prefix=prefix) for obj in page.get('Contents', [])]
+
+
+def test_delete_keys_sends_batches_of_1000(web, s3, monkeypatch):
+    manager = web.get_s3_client(SERVER_ID)
+    sizes = record_batches(monkeypatch, manager)
+    keys = [f"k{i:05}" for i in range(DELETE_BATCH_SIZE * 2 + 500)]
+
+    result = manager.delete_keys(BUCKET, keys)
+
+    assert sorted(sizes) == [500, DELETE_BATCH_SIZE, DELETE_BATCH_SIZE]
+    assert result == {'deleted': len(keys), 'errors': []}
+
+
+def test_delete_folder_pages_beyond_1000_keys(web, s3, monkeypatch):
+    for i in range(DELETE_BATCH_SIZE + 5):
+        s3.put_object(Bucket=BUCKET, Key=f"big/{i:05}", Body=b'')
+    s3.put_object(Bucket=BUCKET, Key='keep.txt', Body=b'')
+    manager = web.get_s3_client(SERVER_ID)
+    sizes = record_batches(monkeypatch, manager)
+
+    result = manager.delete_folder(BUCKET, 'big/')
+
+    assert sorted(sizes) == [5, DELETE_BATCH_SIZE]
+    assert result == {'deleted': DELETE_BATCH_SIZE + 5, 'errors': []}
+    assert keys_under(s3, '') == ['keep.txt']
+
+
+def test_partial_errors_are_reported_per_key(web, s3, monkeypatch):
+    for name in ('a', 'b', 'c'):
+        s3.put_object(Bucket=BUCKET, Key=f"dir/{name}", Body=b'')
+    manager = web.get_s3_client(SERVER_ID)
+    record_batches(monkeypatch, manager, fail={'dir/b'})
+
+    result = manager.delete_folder(BUCKET, 'dir/')
+
+    assert result['deleted'] == 2
+    assert result['errors'] == [{'key': 'dir/b', 'code': 'AccessDenied', 'message': 'Access Denied'}]
+
+
+def test_in_flight_batches_are_bounded(web, s3, monkeypatch):
+    manager = web.get_s3_client(SERVER_ID)
+    lock = threading.Lock()
+    counts = {'pulled': 0, 'finished': 0, 'ahead': 0}
+
+    def slow_delete(bucket_name, keys):
+        time.sleep(0.005)
+        with lock:
+            counts['finished'] += 1
+        return len(keys), []
+
+    def batches():
+        for i in range(40):
+            with lock:
+                counts['pulled'] += 1
+                counts['ahead'] = max(counts['ahead'], counts['pulled'] - counts['finished'])
+            yield [f"k{i}"]
+
+    monkeypatch.setattr(manager, '_delete_batch', slow_delete)
+    result = manager._delete_batches(BUCKET, batches(), max_workers=2)
+
+    assert result == {'deleted': 40, 'errors': []}
+    # 提交前会先取出下一批，因此最多比在途上限多一批
+    assert counts['ahead'] <= 2 * 2 + 1
+
+
+def test_folder_delete_invalidates_cached_listings(client, s3):
+    for name in ('a', 'b'):
+        s3.put_object(Bucket=BUCKET, Key=f"dir/sub/{name}", Body=b'')
+    s3.put_object(Bucket=BUCKET, Key='dir/top.txt', Body=b'')
+
+    def listed(prefix):
+        data = client.get(api(f"/objects?bucket={BUCKET}&prefix={prefix}")).get_json()
+        return [obj['key'] for obj in data['objects']]
+
+    assert listed('dir/sub/') == ['dir/sub/a', 'dir/sub/b']
+    assert 'dir/sub/' in listed('dir/')
+
+    response = client.delete(api('/delete'), json={'bucket': BUCKET, 'keys': ['dir/sub/']})
+
+    assert response.get_json() == {'success': True, 'deleted': 2}
+    assert listed('dir/sub/') == []
+    assert listed('dir/') == ['dir/top.txt']
@@ -0,0 +1,74 @@
+from conftest import BUCKET, api
+
+DATA = bytes(range(256)) * 40
+
+
+def download(client, key, **headers):
+    return client.get(api(f"/download?bucket={BUCKET}&key={key}"), headers=headers)
+
+
+def test_full_download(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='data.bin', Body=DATA)
+
+    response = download(client, 'data.bin')
+
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Length'] == str(len(DATA))
+
+
+def test_single_range(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='data.bin', Body=DATA)
+
+    response = download(client, 'data.bin', Range='bytes=100-199')
+
+    assert response.status_code == 206
+    assert response.data == DATA[100:200]
+    assert response.headers['Content-Range'] == f"bytes 100-199/{len(DATA)}"
+
+
+def test_suffix_range(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='data.bin', Body=DATA)
+
+    response = download(client, 'data.bin', Range='bytes=-10')
+
+    assert response.status_code == 206
+    assert response.data == DATA[-10:]
+
+
+def test_unsatisfiable_range_returns_416(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='data.bin', Body=DATA)
+
+    response = download(client, 'data.bin', Range=f"bytes={len(DATA) + 10}-")
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f"bytes */{len(DATA)}"
+
+
+def test_multiple_ranges(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='data.bin', Body=DATA)
+
+    response = download(client, 'data.bin', Range='bytes=0-9,100-109')
+
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert DATA[0:10] in response.data
+    assert DATA[100:110] in response.data
+    assert 'Content-Range: bytes 100-109/' in response.get_data(as_text=False).decode('latin-1')
+
+
+def test_if_range_mismatch_returns_full_object(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='data.bin', Body=DATA)
+
+    response = download(client, 'data.bin', Range='bytes=0-9', **{'If-Range': '"stale-etag"'})
+
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_missing_object_returns_404(client, s3):
+    assert download(client, 'gone.bin').status_code == 404
+    # If-Range 和多段范围会先 head_object
+    assert download(client, 'gone.bin', Range='bytes=0-9', **{'If-Range': '"abc"'}).status_code == 404
+    assert download(client, 'gone.bin', Range='bytes=0-9,20-29').status_code == 404
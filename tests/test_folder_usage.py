@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from conftest import BUCKET
+from folder_usage import walk_usage
+from listing_cache import ListingCache
+
+
+def usage(manager, prefix, cache):
+    events = list(walk_usage(manager, BUCKET, prefix, usage_cache=cache, progress_interval=60))
+    return events[-1]
+
+
+def test_subtree_cached_by_parent_walk_keeps_its_breakdown(s3):
+    for key, size in (('a/x/1', 1), ('a/x/2', 2), ('a/y/3', 4), ('a/top', 8), ('b/4', 16)):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b'x' * size)
+    manager = SimpleNamespace(cache_scope='scope', client=s3)
+    cache = ListingCache(ttl=60, max_bytes=1024 * 1024)
+
+    root = usage(manager, '', cache)
+    assert (root['bytes'], root['objects']) == (31, 5)
+    assert {child['prefix']: child['bytes'] for child in root['children']} == {'a/': 15, 'b/': 16}
+
+    sub = usage(manager, 'a/', cache)
+    assert sub['from_cache']
+    assert (sub['bytes'], sub['objects']) == (15, 4)
+    assert [(child['prefix'], child['bytes']) for child in sub['children']] == [('a/y/', 4), ('a/x/', 3)]
+
+
+def test_entry_without_breakdown_is_walked_again(s3):
+    s3.put_object(Bucket=BUCKET, Key='a/x/1', Body=b'xx')
+    manager = SimpleNamespace(cache_scope='scope', client=s3)
+    cache = ListingCache(ttl=60, max_bytes=1024 * 1024)
+    cache.set(('scope', BUCKET, 'a/', 'usage'), {'bytes': 2, 'objects': 1, 'computed_at': 0}, 256)
+
+    result = usage(manager, 'a/', cache)
+
+    assert not result['from_cache']
+    assert [child['prefix'] for child in result['children']] == ['a/x/']
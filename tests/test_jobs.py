@@ -0,0 +1,124 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import BUCKET, SERVER_ID
+from jobs import JobManager, JobCancelled, FINISHED_STATUSES
+
+# 不会被分配给任何进程的PID（超过 Linux 的 pid_max 上限）
+DEAD_PID = 2 ** 22 + 1
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(str(tmp_path / 'jobs.db'), max_workers=4, result_dir=str(tmp_path / 'results'),
+                         progress_interval=0)
+    manager.register('echo', lambda context, params: {'value': params['value']})
+    return manager
+
+
+def wait_finished(manager, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['status'] in FINISHED_STATUSES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError('任务未结束')
+
+
+def test_concurrent_submissions_get_distinct_ids(manager):
+    ids = []
+    lock = threading.Lock()
+
+    def submit(value):
+        job = manager.submit('echo', {'value': value})
+        with lock:
+            ids.append(job['id'])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(40)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(ids)) == 40
+    results = {wait_finished(manager, job_id)['result']['value'] for job_id in ids}
+    assert results == set(range(40))
+    listed = [job['id'] for job in manager.list(limit=100)]
+    assert sorted(listed) == sorted(ids)
+
+
+def test_jobs_from_another_process_are_listed_once(manager, tmp_path):
+    other = JobManager(manager.db_path, result_dir=manager.result_dir)
+    other.register('echo', lambda context, params: params)
+
+    mine = manager.submit('echo', {'value': 1})['id']
+    theirs = other.submit('echo', {'value': 2})['id']
+    wait_finished(manager, mine)
+    wait_finished(other, theirs)
+
+    listed = [job['id'] for job in manager.list()]
+    assert sorted(listed) == sorted([mine, theirs])
+
+
+def test_job_events_do_not_repeat_states(manager):
+    release = threading.Event()
+
+    def slow(context, params):
+        release.wait(5)
+        return {}
+
+    manager.register('slow', slow)
+    job_id = manager.submit('slow', {})['id']
+
+    states = []
+    for job in manager.events(job_id, poll_interval=0.05):
+        if job is None:
+            continue
+        states.append((job['status'], sorted(job['progress'].items()), job['cancel_requested']))
+        if job['status'] == 'running':
+            release.set()
+
+    assert states[-1][0] == 'succeeded'
+    assert all(previous != current for previous, current in zip(states, states[1:]))
+    assert [state[0] for state in states].count('succeeded') == 1
+
+
+def test_orphaned_jobs_from_dead_processes_fail(manager):
+    conn = manager._connect()
+    job_id = manager.submit('echo', {'value': 1})['id']
+    wait_finished(manager, job_id)
+    for owner, status in ((f"{socket.gethostname()}:{DEAD_PID}", 'running'), ('other-host:1', 'queued')):
+        conn.execute("UPDATE jobs SET status = ?, owner = ? WHERE id = ?", (status, owner, job_id))
+        conn.commit()
+        JobManager(manager.db_path, result_dir=manager.result_dir)
+        expected = 'failed' if status == 'running' else 'queued'
+        assert manager.get(job_id)['status'] == expected
+
+
+def test_usage_job_without_result_is_not_reported_as_success(web, monkeypatch):
+    def no_result(*args, **kwargs):
+        yield {'type': 'progress', 'bytes': 1, 'objects': 1}
+
+    class Context:
+        cancelled = False
+
+        def progress(self, **fields):
+            pass
+
+        def check_cancelled(self):
+            if self.cancelled:
+                raise JobCancelled()
+
+    monkeypatch.setattr(web, 'walk_usage', no_result)
+    params = {'server_id': SERVER_ID, 'bucket': BUCKET, 'prefix': '', 'refresh': False}
+    context = Context()
+
+    with pytest.raises(Exception, match='统计未完成'):
+        web.run_usage_job(context, params)
+    context.cancelled = True
+    with pytest.raises(JobCancelled):
+        web.run_usage_job(context, params)
@@ -0,0 +1,61 @@
+import base64
+
+import listing
+from conftest import BUCKET, api
+
+
+def put_files(s3, count, prefix='docs/'):
+    for i in range(count):
+        s3.put_object(Bucket=BUCKET, Key=f"{prefix}f{i:02}.txt", Body=b'x')
+
+
+def test_cursor_pagination_walks_all_pages(client, s3):
+    put_files(s3, 5)
+
+    keys = []
+    cursor = None
+    while True:
+        url = api(f"/objects?bucket={BUCKET}&prefix=docs/&per_page=2")
+        if cursor:
+            url += f"&cursor={cursor}"
+        data = client.get(url).get_json()
+        keys.extend(obj['key'] for obj in data['objects'])
+        cursor = data['pagination']['next_cursor']
+        if not cursor:
+            break
+
+    assert keys == [f"docs/f{i:02}.txt" for i in range(5)]
+
+
+def test_malformed_cursor_returns_400(client, s3):
+    put_files(s3, 1)
+
+    response = client.get(api(f"/objects?bucket={BUCKET}&prefix=docs/&cursor=%%%not-base64"))
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': '无效的分页游标'}
+
+
+def test_tampered_cursor_returns_400(client, s3):
+    put_files(s3, 1)
+
+    for state in (b'[1, 2]', b'{"token": 5}', b'not json'):
+        cursor = base64.urlsafe_b64encode(state).decode('ascii').rstrip('=')
+        response = client.get(api(f"/objects?bucket={BUCKET}&prefix=docs/&cursor={cursor}"))
+        assert response.status_code == 400, state
+
+
+def test_cached_page_formats_records_once(client, s3, monkeypatch):
+    put_files(s3, 3)
+    s3.put_object(Bucket=BUCKET, Key='docs/sub/x.txt', Body=b'x')
+    calls = []
+    format_size = listing.format_size
+    monkeypatch.setattr(listing, 'format_size', lambda size: calls.append(size) or format_size(size))
+
+    first = client.get(api(f"/objects?bucket={BUCKET}&prefix=docs/")).get_json()['objects']
+    second = client.get(api(f"/objects?bucket={BUCKET}&prefix=docs/")).get_json()['objects']
+
+    assert first == second
+    assert first[0] == {'name': 'sub', 'key': 'docs/sub/', 'prefix': 'docs/sub/', 'type': 'folder'}
+    assert first[1]['size'] == '1.0 B' and first[1]['last_modified']
+    assert len(calls) == 3
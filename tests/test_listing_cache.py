@@ -0,0 +1,70 @@
+import listing_cache
+from listing_cache import ListingCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(listing_cache.time, 'monotonic', clock)
+    return ListingCache(**kwargs), clock
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache, clock = make_cache(monkeypatch, ttl=30)
+    cache.set(('s', 'b', ''), 'page', 10)
+
+    clock.now += 29
+    assert cache.get(('s', 'b', '')) == 'page'
+    clock.now += 1
+    assert cache.get(('s', 'b', '')) is None
+    assert cache.stats()['bytes'] == 0
+
+
+def test_byte_budget_evicts_least_recently_used(monkeypatch):
+    cache, _ = make_cache(monkeypatch, max_bytes=100)
+    cache.set(('s', 'b', 'a/'), 'a', 40)
+    cache.set(('s', 'b', 'b/'), 'b', 40)
+    assert cache.get(('s', 'b', 'a/')) == 'a'
+
+    cache.set(('s', 'b', 'c/'), 'c', 40)
+    assert cache.get(('s', 'b', 'b/')) is None
+    assert cache.get(('s', 'b', 'a/')) == 'a'
+    assert cache.get(('s', 'b', 'c/')) == 'c'
+    assert cache.stats()['bytes'] == 80
+    assert cache.stats()['evictions'] == 1
+
+    # 超过整个预算的条目不缓存
+    cache.set(('s', 'b', 'd/'), 'd', 101)
+    assert cache.get(('s', 'b', 'd/')) is None
+
+
+def test_invalidate_tree_drops_ancestors_and_descendants(monkeypatch):
+    cache, _ = make_cache(monkeypatch)
+    for prefix in ('', 'a/', 'a/b/', 'a/b/c/', 'a/x/', 'z/'):
+        cache.set(('s', 'b', prefix, None), prefix, 1)
+    cache.set(('s', 'other', 'a/b/', None), 'other bucket', 1)
+
+    assert cache.invalidate_tree('s', 'b', 'a/b/') == 4
+    remaining = {prefix for prefix in ('', 'a/', 'a/b/', 'a/b/c/', 'a/x/', 'z/')
+                 if cache.get(('s', 'b', prefix, None)) is not None}
+    assert remaining == {'a/x/', 'z/'}
+    assert cache.get(('s', 'other', 'a/b/', None)) == 'other bucket'
+
+
+def test_invalidate_scope_only_touches_that_server(monkeypatch):
+    cache, _ = make_cache(monkeypatch)
+    cache.set(('s1', 'b', ''), 'one', 1)
+    cache.set(('s1', 'c', 'x/'), 'two', 1)
+    cache.set(('s2', 'b', ''), 'three', 1)
+
+    assert cache.invalidate_scope('s1') == 2
+    assert cache.get(('s1', 'b', '')) is None
+    assert cache.get(('s2', 'b', '')) == 'three'
+    assert cache.stats()['invalidations'] == 2
@@ -0,0 +1,151 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import BUCKET
+from metadata_index import MetadataIndex
+
+SCOPE = 'test-scope'
+
+
+@pytest.fixture
+def index(tmp_path):
+    return MetadataIndex(str(tmp_path / 'index.db'), refresh_interval=3600, recrawl_interval=0)
+
+
+@pytest.fixture
+def manager(s3):
+    return SimpleNamespace(cache_scope=SCOPE, client=s3)
+
+
+def wait_ready(index, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = index.status(SCOPE, BUCKET)
+        if status and status['status'] != 'crawling':
+            return status
+        time.sleep(0.02)
+    raise AssertionError('爬取未完成')
+
+
+def put(s3, key, size=1):
+    s3.put_object(Bucket=BUCKET, Key=key, Body=b'x' * size)
+
+
+def test_crawl_and_substring_search(index, manager, s3):
+    put(s3, 'logs/Report-2024.PDF', 10)
+    put(s3, 'logs/other.txt', 5)
+    put(s3, 'a/b.md', 1)
+
+    index.start_crawl(manager, BUCKET)
+    status = wait_ready(index)
+
+    assert (status['status'], status['objects'], status['bytes']) == ('ready', 3, 16)
+    rows, _ = index.search(SCOPE, BUCKET, query='report')
+    assert [row['key'] for row in rows] == ['logs/Report-2024.PDF']
+    # 短于三个字符的搜索词逐行匹配
+    rows, _ = index.search(SCOPE, BUCKET, query='b.')
+    assert [row['key'] for row in rows] == ['a/b.md']
+
+
+def test_incremental_refresh_recomputes_totals(index, manager, s3):
+    put(s3, 'docs/a.txt', 10)
+    index.start_crawl(manager, BUCKET)
+    wait_ready(index)
+
+    put(s3, 'docs/b.txt', 20)
+    index.mark_dirty(manager, BUCKET, 'docs/b.txt')
+    index.refresh_pending()
+
+    status = index.status(SCOPE, BUCKET)
+    assert (status['objects'], status['bytes']) == (2, 30)
+
+    index.remove_keys(SCOPE, BUCKET, ['docs/a.txt'])
+    status = index.status(SCOPE, BUCKET)
+    assert (status['objects'], status['bytes']) == (1, 20)
+
+
+def test_deletes_subtract_removed_rows_from_totals(index, manager, s3):
+    for i in range(3):
+        put(s3, f"docs/{i}.txt", 10)
+    put(s3, 'docs/sub/x.bin', 100)
+    put(s3, 'keep.txt', 1000)
+    index.start_crawl(manager, BUCKET)
+    wait_ready(index)
+
+    index.remove_keys(SCOPE, BUCKET, ['docs/0.txt', 'docs/missing.txt'])
+    status = index.status(SCOPE, BUCKET)
+    assert (status['objects'], status['bytes']) == (4, 1120)
+
+    index.remove_prefix(SCOPE, BUCKET, 'docs/')
+    status = index.status(SCOPE, BUCKET)
+    assert (status['objects'], status['bytes']) == (1, 1000)
+    rows, _ = index.search(SCOPE, BUCKET)
+    assert [row['key'] for row in rows] == ['keep.txt']
+
+
+def test_write_path_does_not_query_database(index, manager, s3, monkeypatch):
+    put(s3, 'a.txt')
+    index.start_crawl(manager, BUCKET)
+    wait_ready(index)
+    assert index.is_indexed(SCOPE, BUCKET)
+
+    def no_database():
+        raise AssertionError('写入路径不应查询数据库')
+
+    monkeypatch.setattr(index, '_connect', no_database)
+    index.mark_dirty(manager, BUCKET, 'docs/new.txt')
+    index.mark_dirty(manager, 'other-bucket', 'docs/new.txt')
+    index.remove_keys(SCOPE, 'other-bucket', ['x'])
+    assert list(index._dirty) == [(SCOPE, BUCKET, 'docs/', False)]
+
+
+def test_indexed_state_is_shared_between_processes(index, manager, s3, tmp_path):
+    put(s3, 'a.txt')
+    index.start_crawl(manager, BUCKET)
+    wait_ready(index)
+
+    other = MetadataIndex(index.db_path, refresh_interval=3600, recrawl_interval=0)
+    assert other.is_indexed(SCOPE, BUCKET)
+
+    # 另一个进程正在爬取时不会重复爬取
+    conn = index._connect()
+    conn.execute("UPDATE buckets SET status = 'crawling', owner = 'elsewhere:1' WHERE bucket = ?", (BUCKET,))
+    conn.commit()
+    generation = conn.execute("SELECT generation FROM buckets").fetchone()[0]
+    assert other.start_crawl(manager, BUCKET)['status'] == 'crawling'
+    assert conn.execute("SELECT generation FROM buckets").fetchone()[0] == generation
+
+    # 其他进程删除索引后，最迟在下一轮刷新时重新加载
+    index.drop(SCOPE, BUCKET)
+    other.refresh_pending()
+    assert not other.is_indexed(SCOPE, BUCKET)
+
+
+def test_drop_during_crawl_leaves_no_rows(index, s3):
+    for i in range(5):
+        put(s3, f"k{i}")
+
+    class DroppingPaginator:
+        """第一页写入后删除索引，模拟爬取期间用户删除了索引"""
+
+        def paginate(self, **params):
+            for number, page in enumerate(s3.get_paginator('list_objects_v2').paginate(PaginationConfig={'PageSize': 2}, **params)):
+                if number == 1:
+                    index.drop(SCOPE, BUCKET)
+                yield page
+
+    manager = SimpleNamespace(cache_scope=SCOPE, client=SimpleNamespace(get_paginator=lambda name: DroppingPaginator()))
+    crawled = []
+    original = index._run_crawl
+    index._run_crawl = lambda *args: crawled.append(original(*args))
+    index.start_crawl(manager, BUCKET)
+    deadline = time.time() + 10
+    while not crawled and time.time() < deadline:
+        time.sleep(0.02)
+
+    assert crawled
+    count = index._connect().execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+    assert count == 0
+    assert not index.is_indexed(SCOPE, BUCKET)
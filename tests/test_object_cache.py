@@ -0,0 +1,121 @@
+import os
+
+import pytest
+
+from conftest import BUCKET, SERVER_ID, api
+from object_cache import ObjectCache
+
+DATA = b'0123456789' * 100
+
+
+@pytest.fixture
+def cache(web, s3):
+    return web.object_cache
+
+
+def download(client, key, method='GET', **headers):
+    return client.open(api(f"/download?bucket={BUCKET}&key={key}"), method=method, headers=headers)
+
+
+def temp_files(cache):
+    return [name for name in os.listdir(cache.directory) if name.endswith('.tmp')]
+
+
+def scope(web):
+    return web.get_s3_client(SERVER_ID).cache_scope
+
+
+def test_download_fills_cache_and_serves_hits_locally(web, client, s3, cache):
+    s3.put_object(Bucket=BUCKET, Key='a.bin', Body=DATA)
+
+    assert download(client, 'a.bin').data == DATA
+    assert cache.contains(scope(web), BUCKET, 'a.bin')
+
+    hits = cache.stats()['hits']
+    response = download(client, 'a.bin', Range='bytes=10-19')
+    assert (response.status_code, response.data) == (206, DATA[10:20])
+    response = download(client, 'a.bin', Range='bytes=5000-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f"bytes */{len(DATA)}"
+    assert cache.stats()['hits'] == hits + 2
+
+
+def test_stale_entry_is_revalidated_with_etag(web, client, s3, cache, monkeypatch):
+    s3.put_object(Bucket=BUCKET, Key='a.bin', Body=DATA)
+    assert download(client, 'a.bin').data == DATA
+    monkeypatch.setattr(cache, 'fresh_for', 0)
+
+    revalidations = cache.stats()['revalidations']
+    assert download(client, 'a.bin').data == DATA
+    assert cache.stats()['revalidations'] == revalidations + 1
+
+    # 其他客户端修改了对象：重新验证得到新内容
+    s3.put_object(Bucket=BUCKET, Key='a.bin', Body=b'changed')
+    assert download(client, 'a.bin').data == b'changed'
+
+
+def test_revalidating_deleted_object_returns_404_and_evicts(web, client, s3, cache, monkeypatch):
+    s3.put_object(Bucket=BUCKET, Key='a.bin', Body=DATA)
+    assert download(client, 'a.bin').data == DATA
+    assert cache.contains(scope(web), BUCKET, 'a.bin')
+    monkeypatch.setattr(cache, 'fresh_for', 0)
+    s3.delete_object(Bucket=BUCKET, Key='a.bin')
+
+    response = download(client, 'a.bin')
+
+    assert response.status_code == 404
+    assert not cache.contains(scope(web), BUCKET, 'a.bin')
+
+
+def test_missing_object_returns_404(client, s3):
+    assert download(client, 'missing.bin').status_code == 404
+
+
+def test_unread_response_leaves_no_temp_file(web, client, s3, cache):
+    s3.put_object(Bucket=BUCKET, Key='a.bin', Body=DATA)
+
+    response = download(client, 'a.bin', method='HEAD')
+    response.close()
+    # 测试客户端会缓冲响应体，直接调用视图并在读取前关闭，模拟发送前断开的客户端
+    with web.app.test_request_context(api(f"/download?bucket={BUCKET}&key=a.bin")):
+        unread = web.download_file(SERVER_ID)
+        unread.close()
+
+    assert response.status_code == 200
+    assert temp_files(cache) == []
+    assert not cache.contains(scope(web), BUCKET, 'a.bin')
+
+
+def put(cache, key, data, scope='s1', bucket=BUCKET):
+    return cache.put(scope, bucket, key, {'ContentLength': len(data), 'ETag': '"e"'}, data)
+
+
+def test_invalidation_removes_entries_cached_by_other_processes(tmp_path):
+    # 两个实例共享同一目录，模拟多个工作进程
+    ours = ObjectCache(str(tmp_path))
+    other = ObjectCache(str(tmp_path))
+    put(other, 'dir/a.bin', b'a')
+    put(other, 'dir/sub/b.bin', b'b')
+    put(other, 'keep.bin', b'k')
+    put(other, 'x.bin', b'x', scope='s2')
+
+    assert ours.invalidate_tree('s1', BUCKET, 'dir/') == 2
+    assert not ours.contains('s1', BUCKET, 'dir/a.bin')
+    assert not ours.contains('s1', BUCKET, 'dir/sub/b.bin')
+    assert ours.contains('s1', BUCKET, 'keep.bin')
+
+    assert ours.invalidate_scope('s2') == 1
+    assert not other.contains('s2', BUCKET, 'x.bin')
+    assert ours.clear() == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_open_tracks_size_of_entry_replaced_by_other_process(tmp_path):
+    ours = ObjectCache(str(tmp_path))
+    other = ObjectCache(str(tmp_path))
+    put(ours, 'a.bin', b'x' * 10)
+    put(other, 'a.bin', b'y' * 300)
+
+    with ours.get('s1', BUCKET, 'a.bin') as entry:
+        assert entry.file.read() == b'y' * 300
+    assert ours.stats()['bytes'] == 300
@@ -0,0 +1,63 @@
+from urllib.parse import quote
+
+from conftest import BUCKET, api
+
+NOTE = '内容过长'
+
+
+def preview(client, key):
+    response = client.get(api(f"/preview?bucket={BUCKET}&key={key}"))
+    assert response.status_code == 200
+    return response.get_json()['preview']
+
+
+def test_text_shorter_than_read_limit_has_no_note(web, client, s3):
+    # 比旧的50000字符截断长、但在读取上限以内的文本应完整显示
+    text = 'a' * (web.app.config['PREVIEW_TEXT_BYTES'] - 100)
+    s3.put_object(Bucket=BUCKET, Key='notes.txt', Body=text.encode('utf-8'))
+
+    content = preview(client, 'notes.txt')
+
+    assert content == text
+    assert NOTE not in content
+
+
+def test_text_longer_than_read_limit_is_truncated_with_note(web, client, s3):
+    limit = web.app.config['PREVIEW_TEXT_BYTES']
+    s3.put_object(Bucket=BUCKET, Key='big.txt', Body=b'b' * (limit * 2))
+
+    content = preview(client, 'big.txt')
+
+    assert content.startswith('b' * limit)
+    assert NOTE in content
+
+
+def test_multibyte_text_is_not_cut_mid_character(web, client, s3):
+    limit = web.app.config['PREVIEW_TEXT_BYTES']
+    s3.put_object(Bucket=BUCKET, Key='cn.txt', Body=('中' * limit).encode('utf-8'))
+
+    content = preview(client, 'cn.txt')
+
+    assert content.split('\n')[0] == '中' * (limit // 3)
+    assert NOTE in content
+
+
+def test_download_url_quotes_key(web, client, s3):
+    s3.put_object(Bucket=BUCKET, Key='dir/a b&c#1.txt', Body=b'x')
+
+    response = client.get(api(f"/preview?bucket={BUCKET}&key={quote('dir/a b&c#1.txt')}"))
+
+    download_url = response.get_json()['download_url']
+    assert download_url.endswith(f"bucket={BUCKET}&key=dir/a%20b%26c%231.txt")
+    assert client.get(download_url).data == b'x'
+
+
+def test_embedded_preview_urls_quote_key(web, client, s3):
+    for key in ('dir/a b&c#1.pdf', 'dir/a b&c#1.mp4'):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=b'x')
+        response = client.get(api(f"/preview?bucket={BUCKET}&key={quote(key)}"))
+        data = response.get_json()
+
+        assert data['preview_url'].startswith(data['download_url'] + '&')
+        assert data['download_url'].endswith(f"key={quote(key)}")
+        assert client.get(data['preview_url']).data == b'x'
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from conftest import BUCKET, SERVER_ID
+from sync import sync
+
+
+@pytest.fixture
+def manager(web, s3):
+    return web.get_s3_client(SERVER_ID)
+
+
+def test_pull_skips_keys_that_escape_local_root(manager, s3, tmp_path):
+    local_root = tmp_path / 'root' / 'dst'
+    local_root.mkdir(parents=True)
+    s3.put_object(Bucket=BUCKET, Key='p/ok.txt', Body=b'ok')
+    s3.put_object(Bucket=BUCKET, Key='p/../x', Body=b'evil')
+    s3.put_object(Bucket=BUCKET, Key='p/a/../../../y', Body=b'evil')
+
+    plan, result = sync(manager, BUCKET, 'p/', str(local_root), direction='pull')
+
+    assert [action['path'] for action in plan['actions']] == ['ok.txt']
+    assert sorted(item['path'] for item in plan['rejected']) == ['../x', 'a/../../../y']
+    assert (local_root / 'ok.txt').read_bytes() == b'ok'
+    assert not (tmp_path / 'root' / 'x').exists()
+    assert not (tmp_path / 'y').exists()
+    assert result['downloaded'] == 1
+    assert sorted(error['path'] for error in result['errors']) == ['../x', 'a/../../../y']
+
+
+def test_pull_does_not_follow_symlinks_out_of_local_root(manager, s3, tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    local_root = tmp_path / 'dst'
+    local_root.mkdir()
+    os.symlink(outside, local_root / 'link')
+    s3.put_object(Bucket=BUCKET, Key='p/link/file.txt', Body=b'evil')
+
+    plan, result = sync(manager, BUCKET, 'p/', str(local_root), direction='pull')
+
+    assert plan['actions'] == []
+    assert [item['path'] for item in plan['rejected']] == ['link/file.txt']
+    assert not (outside / 'file.txt').exists()
+
+
+def test_push_then_pull_round_trip(manager, s3, tmp_path):
+    source = tmp_path / 'src'
+    (source / 'sub').mkdir(parents=True)
+    (source / 'a.txt').write_bytes(b'a')
+    (source / 'sub' / 'b.txt').write_bytes(b'bb')
+
+    _, pushed = sync(manager, BUCKET, 'backup', str(source), direction='push')
+    target = tmp_path / 'dst'
+    _, pulled = sync(manager, BUCKET, 'backup/', str(target), direction='pull')
+
+    assert (pushed['uploaded'], pulled['downloaded']) == (2, 2)
+    assert (target / 'sub' / 'b.txt').read_bytes() == b'bb'
+    plan, _ = sync(manager, BUCKET, 'backup/', str(target), direction='pull', dry_run=True)
+    assert plan['actions'] == []
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+from conftest import BUCKET, SERVER_ID
+from s3_client import MIN_PART_SIZE
+
+
+class FailingStream:
+    """读出 limit 字节后模拟客户端断开"""
+
+    def __init__(self, limit):
+        self.remaining = limit
+
+    def read(self, size):
+        if self.remaining <= 0:
+            raise OSError('client disconnected')
+        size = min(size, self.remaining)
+        self.remaining -= size
+        return b'x' * size
+
+
+def test_upload_stream_assembles_parts(web, s3):
+    client = web.get_s3_client(SERVER_ID)
+    data = bytes(range(256)) * (MIN_PART_SIZE * 2 // 256 + 1)
+
+    size = client.upload_stream(BUCKET, 'big.bin', io.BytesIO(data), part_size=MIN_PART_SIZE)
+
+    assert size == len(data)
+    assert s3.get_object(Bucket=BUCKET, Key='big.bin')['Body'].read() == data
+
+
+def test_upload_stream_aborts_multipart_upload_when_stream_fails(web, s3):
+    client = web.get_s3_client(SERVER_ID)
+
+    with pytest.raises(OSError):
+        client.upload_stream(BUCKET, 'broken.bin', FailingStream(MIN_PART_SIZE * 2 + 10),
+                             part_size=MIN_PART_SIZE)
+
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert s3.list_objects_v2(Bucket=BUCKET).get('KeyCount') == 0
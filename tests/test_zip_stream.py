@@ -0,0 +1,119 @@
+import io
+import threading
+import time
+import zipfile
+
+from conftest import BUCKET, api
+from zip_stream import stream_zip
+
+
+class FakeBody:
+    """按块返回数据；fail_after 个块之后抛出异常，模拟读取中断"""
+
+    def __init__(self, data, fail_after=None):
+        self.data = data
+        self.fail_after = fail_after
+        self.produced = 0
+
+    def iter_chunks(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            if self.fail_after is not None and self.produced >= self.fail_after:
+                raise ConnectionError('connection reset')
+            self.produced += 1
+            yield self.data[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+
+class FakeClient:
+    def __init__(self, objects, fail_after=None):
+        self.objects = objects
+        self.fail_after = fail_after or {}
+        self.bodies = {}
+        self.lock = threading.Lock()
+        self.started = []
+
+    def get_object(self, bucket, key):
+        with self.lock:
+            self.started.append(key)
+        if key not in self.objects:
+            raise Exception(f"下载文件失败: NoSuchKey {key}")
+        body = FakeBody(self.objects[key], self.fail_after.get(key))
+        self.bodies[key] = body
+        return {'Body': body, 'ContentLength': len(self.objects[key])}
+
+
+def read_archive(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def test_download_zip_round_trips(client, s3):
+    s3.put_object(Bucket=BUCKET, Key='docs/a.txt', Body=b'alpha')
+    s3.put_object(Bucket=BUCKET, Key='docs/sub/b.bin', Body=bytes(range(256)) * 100)
+
+    response = client.post(api('/zip'), json={'bucket': BUCKET, 'keys': ['docs/']})
+
+    archive = read_archive([response.data])
+    assert archive.testzip() is None
+    assert archive.read('docs/a.txt') == b'alpha'
+    assert archive.read('docs/sub/b.bin') == bytes(range(256)) * 100
+
+
+def test_zip64_entries_on_unseekable_sink(monkeypatch):
+    # 调低阈值，用小数据走ZIP64分支；输出目标不可 seek，大小写入数据描述符
+    monkeypatch.setattr(zipfile, 'ZIP64_LIMIT', 1000)
+    data = b'z' * 5000
+    fake = FakeClient({'big.bin': data, 'small.txt': b'hi'})
+
+    chunks = list(stream_zip(fake, BUCKET, [('big.bin', 'big.bin'), ('small.txt', 'small.txt')], chunk_size=512))
+    monkeypatch.undo()
+
+    archive = read_archive(chunks)
+    big = archive.getinfo('big.bin')
+    assert big.flag_bits & 0x08
+    assert big.extract_version >= zipfile.ZIP64_VERSION
+    assert archive.read('big.bin') == data
+    assert archive.read('small.txt') == b'hi'
+
+
+def test_failed_objects_are_listed_in_errors_txt():
+    fake = FakeClient(
+        {'ok.txt': b'fine', 'broken.bin': b'x' * 4096},
+        fail_after={'broken.bin': 2}
+    )
+    entries = [('ok.txt', 'ok.txt'), ('missing.txt', 'missing.txt'), ('broken.bin', 'broken.bin')]
+
+    archive = read_archive(list(stream_zip(fake, BUCKET, entries, chunk_size=1024)))
+
+    assert archive.testzip() is None
+    assert archive.read('ok.txt') == b'fine'
+    # 中断前已输出的部分保留为完整可读的条目
+    assert archive.read('broken.bin') == b'x' * 2048
+    assert 'missing.txt' not in archive.namelist()
+    errors = archive.read('_errors.txt').decode('utf-8').splitlines()
+    assert errors[0].startswith('missing.txt: ')
+    assert errors[1].startswith('broken.bin: ') and 'connection reset' in errors[1]
+
+
+def test_prefetch_is_bounded():
+    objects = {f"f{i}": bytes([i]) * 64 * 100 for i in range(10)}
+    fake = FakeClient(objects)
+    pulled = []
+
+    def entries():
+        for key in objects:
+            pulled.append(key)
+            yield key, key
+
+    archive = stream_zip(fake, BUCKET, entries(), chunk_size=64, read_ahead=2, queue_size=3)
+    next(archive)
+    time.sleep(0.2)
+    try:
+        # 正在输出第一个对象：最多再预读 read_ahead 个对象，每个对象最多读出 queue_size 个块（外加一个等待入队的块）
+        assert len(pulled) <= 1 + 2
+        assert len(fake.started) <= 1 + 2
+        waiting = [fake.bodies[key] for key in fake.started[1:]]
+        assert waiting and all(body.produced <= 3 + 1 for body in waiting)
+    finally:
+        archive.close()
@@ -0,0 +1,165 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    from PIL import Image, features
+except ImportError:  # 缩略图为可选功能，未安装 Pillow 时接口返回 501
+    Image = None
+    features = None
+
+# 支持的缩略图边长（像素），固定几档以提高缓存命中率
+THUMBNAIL_SIZES = (128, 256, 512)
+
+# 可以生成缩略图的图片扩展名
+THUMBNAIL_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+THUMBNAIL_MIMETYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def thumbnails_available():
+    """是否安装了 Pillow"""
+    return Image is not None
+
+
+def webp_supported():
+    """Pillow 是否编译了 WebP 支持"""
+    return Image is not None and features.check('webp')
+
+
+def render_thumbnail(data, size, fmt='webp', quality=80):
+    """将图片缩放到 size×size 以内（保持比例），返回编码后的字节"""
+    image = Image.open(io.BytesIO(data))
+    # JPEG 可以在解码时直接按比例缩小，大图省去大部分解码开销
+    image.draft('RGB', (size, size))
+    image.seek(0)
+    image.thumbnail((size, size))
+
+    output = io.BytesIO()
+    if fmt == 'webp':
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        image.save(output, 'WEBP', quality=quality, method=4)
+    else:
+        if image.mode != 'RGB':
+            # JPEG 不支持透明度，透明区域铺白底
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.split()[3])
+        image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    """磁盘缩略图缓存：按 服务器/存储桶/对象/ETag/尺寸/格式 存储，超出字节预算时淘汰最久未使用的文件"""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def get(self, cache_key):
+        """读取缓存的缩略图，未命中返回None"""
+        name = self._file_name(cache_key)
+        path = os.path.join(self.directory, name)
+        # 多进程共享缓存目录：以文件是否存在为准，索引只用于LRU排序
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = None
+
+        with self._lock:
+            if data is None:
+                if name in self._entries:
+                    self._bytes -= self._entries.pop(name)
+                self.misses += 1
+                return None
+            if name not in self._entries:
+                self._entries[name] = len(data)
+                self._bytes += len(data)
+            self._entries.move_to_end(name)
+            self.hits += 1
+
+        # 更新修改时间，重启后仍能按使用顺序淘汰
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, cache_key, data):
+        """写入缓存（先写临时文件再替换）"""
+        name = self._file_name(cache_key)
+        path = os.path.join(self.directory, name)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if name in self._entries:
+                self._bytes -= self._entries.pop(name)
+            self._entries[name] = len(data)
+            self._bytes += len(data)
+
+            while self._bytes > self.max_bytes and self._entries:
+                oldest, size = self._entries.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(self.directory, oldest))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """获取命中率等统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+    def _load(self):
+        """启动时按修改时间重建LRU顺序，清理遗留的临时文件"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith('.tmp'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._bytes += size
+
+    def _file_name(self, cache_key):
+        raw = '\0'.join(str(part) for part in cache_key).encode('utf-8')
+        return hashlib.sha256(raw).hexdigest() + '.thumb'
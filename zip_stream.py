@@ -0,0 +1,160 @@
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+# ZIP格式不支持1980年以前的时间
+ZIP_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class _ZipSink:
+    """zipfile 的只写输出目标，写入的数据暂存后由生成器取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _ObjectPrefetch:
+    """在后台线程中读取一个对象，读到的块放入有界队列（队列满时阻塞，限制预读内存）"""
+
+    def __init__(self, client, bucket, key, chunk_size, queue_size, cancelled):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.chunk_size = chunk_size
+        self.cancelled = cancelled
+        self.chunks = queue.Queue(maxsize=queue_size)
+        self.ready = threading.Event()
+        self.response = None
+        self.error = None
+
+    def run(self):
+        body = None
+        try:
+            self.response = self.client.get_object(self.bucket, self.key)
+            body = self.response['Body']
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+        if body is None:
+            return
+
+        try:
+            for chunk in body.iter_chunks(self.chunk_size):
+                if not self._put(chunk):
+                    return
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+        finally:
+            body.close()
+
+    def _put(self, item):
+        # 定期检查取消标志，避免客户端断开后线程一直阻塞
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def iter_chunks(self):
+        while True:
+            item = self.chunks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def stream_zip(client, bucket, entries, chunk_size=256 * 1024, read_ahead=4, queue_size=8, compress=False):
+    """将对象流式打包为ZIP（需要时使用ZIP64），边从S3读取边输出
+
+    entries 为 (key, arcname) 的可迭代对象，可以是惰性生成器。最多同时预读
+    read_ahead 个对象，每个对象最多缓存 queue_size 个块，内存占用与归档大小无关。
+    读取失败的对象会被跳过、读到一半中断的对象只保留已读部分，均记录在归档末尾的 _errors.txt 中。
+    """
+    sink = _ZipSink()
+    cancelled = threading.Event()
+    compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=read_ahead) as pool:
+        window = []
+        entries = iter(entries)
+
+        def fill_window():
+            while len(window) < read_ahead:
+                entry = next(entries, None)
+                if entry is None:
+                    return
+                key, arcname = entry
+                prefetch = _ObjectPrefetch(client, bucket, key, chunk_size, queue_size, cancelled)
+                pool.submit(prefetch.run)
+                window.append((prefetch, arcname))
+
+        try:
+            with zipfile.ZipFile(sink, mode='w', compression=compress_type, allowZip64=True) as archive:
+                fill_window()
+                while window:
+                    prefetch, arcname = window.pop(0)
+                    fill_window()
+
+                    prefetch.ready.wait()
+                    if prefetch.error is not None:
+                        errors.append(f"{prefetch.key}: {prefetch.error}")
+                        continue
+
+                    info = zipfile.ZipInfo(arcname, date_time=_zip_date_time(prefetch.response.get('LastModified')))
+                    info.compress_type = compress_type
+                    info.external_attr = 0o644 << 16
+                    info.file_size = prefetch.response.get('ContentLength') or 0
+
+                    # 条目写到一半时读取失败无法回退已输出的数据：按已写入的内容结束该条目
+                    # （数据描述符记录实际大小和CRC，归档仍然有效），并在 _errors.txt 中注明
+                    with archive.open(info, mode='w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as dest:
+                        try:
+                            for chunk in prefetch.iter_chunks():
+                                dest.write(chunk)
+                                data = sink.drain()
+                                if data:
+                                    yield data
+                        except Exception as e:
+                            errors.append(f"{prefetch.key}: 读取中断，文件不完整: {e}")
+
+                    data = sink.drain()
+                    if data:
+                        yield data
+
+                if errors:
+                    archive.writestr('_errors.txt', '\n'.join(errors) + '\n')
+
+            data = sink.drain()
+            if data:
+                yield data
+        finally:
+            cancelled.set()
+
+
+def _zip_date_time(last_modified):
+    """将对象修改时间转换为ZIP条目时间"""
+    if last_modified is None:
+        return ZIP_MIN_DATE_TIME
+    date_time = last_modified.timetuple()[:6]
+    return max(date_time, ZIP_MIN_DATE_TIME)